@@ -25,6 +25,7 @@ def _run_main(commands: Sequence[str]) -> None:
         ["check"],
         ["background", "-c", "image", "-a", "binary_area_threshold=500"],
         ["copy", "-wk", "2", "-s", "[:,:,40:240,40:240]"],
+        ["copy", "-pf", "2", "-mpb", "1e9"],
         ["deconv", "-c", "image", "-m", "lr", "-bp", "wb", "-i", "3"],
         ["deconv", "-c", "image", "-m", "admm", "-w"],
         ["denoise", "-c", "image"],
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from arbol import aprint
+
+from dexp.cli.dexp_main import LAZY_COMMANDS, cli
+from dexp.datasets import ZDataset
+
+# Startup benchmark, runs a command in a fresh interpreter and reports the time spent and the heavy modules imported:
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from dexp.cli.dexp_main import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+heavy = ["dask_cuda", "distributed", "napari", "skimage", "cupy", "GPUtil", "dexp.datasets.operations"]
+print(json.dumps({"elapsed": elapsed, "imported": [module for module in heavy if module in sys.modules]}))
+"""
+
+
+def _startup(args) -> dict:
+    result = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT] + args, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("command", ["info", "check"])
+def test_cli_startup(command: str, tmp_path: Path):
+    path = str(tmp_path / "dataset.zarr")
+    dataset = ZDataset(path, mode="w")
+    dataset.add_channel("image", shape=(2, 4, 8, 8), dtype="uint16")
+    dataset.close()
+
+    report = _startup([command, path])
+    aprint(f"'dexp {command}' took {report['elapsed']:.3f} seconds")
+
+    # only the invoked command is imported, and GPUs are not probed:
+    assert report["imported"] == []
+
+
+def test_cli_lazy_commands():
+    assert sorted(cli.list_commands(None)) == sorted(LAZY_COMMANDS)
+    for name in LAZY_COMMANDS:
+        assert cli.get_command(None, name).name == name
@@ -5,9 +5,11 @@ from arbol.arbol import aprint, asection
 
 from dexp.cli.defaults import DEFAULT_WORKERS_BACKEND
 from dexp.cli.parsing import (
+    cache_option,
     channels_option,
     input_dataset_argument,
     output_dataset_options,
+    prefetch_option,
     slicing_option,
     workers_option,
 )
@@ -21,6 +23,8 @@ from dexp.datasets.zarr_dataset import ZDataset
 @output_dataset_options()
 @channels_option()
 @slicing_option()
+@prefetch_option()
+@cache_option()
 @workers_option()
 @click.option(
     "--zerolevel",
@@ -8,6 +8,7 @@ from dexp.cli.parsing import (
     input_dataset_argument,
     multi_devices_option,
     output_dataset_options,
+    prefetch_option,
     slicing_option,
     tilesize_option,
     tuple_callback,
@@ -23,6 +24,7 @@ from dexp.datasets.zarr_dataset import ZDataset
 @channels_option()
 @multi_devices_option()
 @slicing_option()
+@prefetch_option()
 @tilesize_option()
 @click.option(
     "--method",
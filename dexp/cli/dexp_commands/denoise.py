@@ -23,15 +23,44 @@ from dexp.datasets.zarr_dataset import ZDataset
 @multi_devices_option()
 @slicing_option()
 @tilesize_option()
+@click.option(
+    "--calibration-interval",
+    "-ci",
+    type=int,
+    default=1,
+    help="Calibrates one time point every this many time points (and the last one), "
+    "parameters of the other time points are interpolated.",
+    show_default=True,
+)
+@click.option(
+    "--warm-start",
+    "-ws",
+    is_flag=True,
+    default=False,
+    help="Each calibration starts from the parameters of the previous one, calibrations are then sequential.",
+    show_default=True,
+)
+@click.option(
+    "--smoothing",
+    "-sm",
+    type=int,
+    default=0,
+    help="Calibrated parameters are averaged over this many calibrations before and after.",
+    show_default=True,
+)
 def denoise(
     input_dataset: BaseDataset,
     output_dataset: ZDataset,
     channels: Sequence[str],
     tilesize: int,
     devices: Union[str, Sequence[int]],
+    calibration_interval: int,
+    warm_start: bool,
+    smoothing: int,
 ):
     """Denoises input image using butterworth filter, parameters are estimated automatically
     using noise2self j-invariant cross-validation loss.
+    Calibrated parameters are stored in the output dataset and reused when resuming.
     """
     with asection(f"Denoising data to {output_dataset.path} for channels {channels}"):
         dataset_denoise(
@@ -40,6 +69,9 @@ def denoise(
             channels=channels,
             tilesize=tilesize,
             devices=devices,
+            calibration_interval=calibration_interval,
+            warm_start=warm_start,
+            smoothing=smoothing,
         )
 
     input_dataset.close()
@@ -4,10 +4,12 @@ import click
 from arbol.arbol import aprint, asection
 
 from dexp.cli.parsing import (
+    cache_option,
     channels_option,
     input_dataset_argument,
     multi_devices_option,
     output_dataset_options,
+    prefetch_option,
     slicing_option,
     tuple_callback,
 )
@@ -20,6 +22,8 @@ from dexp.datasets.operations.fuse import dataset_fuse
 @output_dataset_options()
 @channels_option()
 @slicing_option()
+@cache_option()
+@prefetch_option()
 @multi_devices_option()
 @click.option(
     "--microscope",
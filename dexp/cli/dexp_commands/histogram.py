@@ -1,13 +1,22 @@
 import click
+from arbol.arbol import aprint
 
-from dexp.cli.parsing import channels_option, device_option, input_dataset_argument
+from dexp.cli.parsing import (
+    channels_option,
+    device_option,
+    input_dataset_argument,
+    workers_option,
+)
+from dexp.datasets import ZDataset
 from dexp.datasets.operations.histogram import dataset_histogram
+from dexp.datasets.statistics import DEFAULT_NUM_BINS
 
 
 @click.command()
 @input_dataset_argument()
 @channels_option()
 @device_option()
+@workers_option()
 @click.option("--output-directory", "-o", default="histogram", show_default=True, type=str)
 @click.option(
     "--minimum-count",
@@ -25,8 +34,35 @@ from dexp.datasets.operations.histogram import dataset_histogram
     type=float,
     help="Maximum count to clip histogram and improve visualization.",
 )
-def histogram(input_dataset, output_directory, channels, device, minimum_count, maximum_count):
-    """Computes histogram of selected channel."""
+@click.option(
+    "--bins",
+    "-b",
+    default=DEFAULT_NUM_BINS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of histogram bins of floating point and 32/64 bits integer channels, 8/16 bits channels get one bin "
+    + "per value.",
+)
+@click.option("--plot/--no-plot", default=True, show_default=True, help="Plots the histograms into a pdf per channel.")
+@click.option(
+    "--in-dataset",
+    "-id",
+    is_flag=True,
+    help="Stores the statistics in the zarr dataset itself, opened for writing, where other commands (view, deconv) "
+    + "use them.",
+)
+def histogram(
+    input_dataset, output_directory, channels, device, workers, minimum_count, maximum_count, bins, plot, in_dataset
+):
+    """Computes histogram, quantiles, min, max, mean and standard deviation of each time point of selected channels.
+    Statistics are stored in the output directory, or in zarr datasets with --in-dataset.
+    """
+    if in_dataset:
+        if isinstance(input_dataset, ZDataset):
+            input_dataset = ZDataset(input_dataset.path, mode="r+")
+        else:
+            aprint("Statistics can only be stored in zarr datasets, they are stored in the output directory.")
+
     dataset_histogram(
         dataset=input_dataset,
         output_dir=output_directory,
@@ -34,4 +70,7 @@ def histogram(input_dataset, output_directory, channels, device, minimum_count,
         device=device,
         minimum_count=minimum_count,
         maximum_count=maximum_count,
+        workers=workers,
+        num_bins=bins,
+        plot=plot,
     )
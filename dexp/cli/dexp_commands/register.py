@@ -4,6 +4,7 @@ import click
 from arbol.arbol import aprint, asection
 
 from dexp.cli.parsing import (
+    cache_option,
     channels_option,
     input_dataset_argument,
     multi_devices_option,
@@ -16,6 +17,7 @@ from dexp.datasets.operations.register import dataset_register
 @click.command()
 @input_dataset_argument()
 @slicing_option()
+@cache_option()
 @channels_option()
 @multi_devices_option()
 @click.option("--out-model-path", "-o", default="registration_models.txt", show_default=True)
@@ -1,9 +1,10 @@
-from typing import Sequence, Tuple
+from typing import Optional, Sequence, Tuple
 
 import click
 from arbol.arbol import aprint, asection
 
 from dexp.cli.parsing import (
+    cache_option,
     channels_option,
     empty_channels_callback,
     input_dataset_argument,
@@ -16,6 +17,7 @@ from dexp.datasets.operations.view import dataset_view
 @click.command()
 @input_dataset_argument()
 @channels_option()
+@cache_option()
 @click.option(
     "--downscale", "-d", type=int, default=1, help="Downscale value to speedup visualization", show_default=True
 )
@@ -24,9 +26,10 @@ from dexp.datasets.operations.view import dataset_view
     "-cl",
     type=str,
     default="0,512",
-    help="Sets the contrast limits, i.e. -cl 0,1000 sets the contrast limits to [0,1000]",
+    help="Sets the contrast limits, i.e. -cl 0,1000 sets the contrast limits to [0,1000], "
+    + "'auto' reads them from the statistics computed by 'dexp histogram'.",
     show_default=True,
-    callback=lambda x, y, clim: tuple(float(v.strip()) for v in clim.split(",")),
+    callback=lambda x, y, clim: None if clim == "auto" else tuple(float(v.strip()) for v in clim.split(",")),
 )
 @click.option(
     "--colormap",
@@ -60,7 +63,7 @@ from dexp.datasets.operations.view import dataset_view
 def view(
     input_dataset: BaseDataset,
     channels: Sequence[str],
-    clim: Tuple[float],
+    clim: Optional[Tuple[float]],
     downscale: int,
     colormap: str,
     windowsize: int,
@@ -1,29 +1,7 @@
 import click
 from arbol.arbol import aprint, asection
 
-from dexp.cli.dexp_commands.add import add
-from dexp.cli.dexp_commands.background import background
-from dexp.cli.dexp_commands.check import check
-from dexp.cli.dexp_commands.copy import copy
-from dexp.cli.dexp_commands.crop import crop
-from dexp.cli.dexp_commands.deconv import deconv
-from dexp.cli.dexp_commands.denoise import denoise
-from dexp.cli.dexp_commands.deskew import deskew
-from dexp.cli.dexp_commands.extract_psf import extract_psf
-from dexp.cli.dexp_commands.fastcopy import fastcopy
-from dexp.cli.dexp_commands.fromraw import fromraw
-from dexp.cli.dexp_commands.fuse import fuse
-from dexp.cli.dexp_commands.generic import generic
-from dexp.cli.dexp_commands.histogram import histogram
-from dexp.cli.dexp_commands.info import info
-from dexp.cli.dexp_commands.projrender import projrender
-from dexp.cli.dexp_commands.register import register
-from dexp.cli.dexp_commands.segment import segment
-from dexp.cli.dexp_commands.speedtest import speedtest
-from dexp.cli.dexp_commands.stabilize import stabilize
-from dexp.cli.dexp_commands.tiff import tiff
-from dexp.cli.dexp_commands.view import view
-from dexp.cli.video_commands.volrender import volrender
+from dexp.cli.lazy_group import LazyGroup
 from dexp.processing.utils.mkl_util import set_mkl_threads
 
 set_mkl_threads()
@@ -31,9 +9,40 @@ set_mkl_threads()
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
+# Commands are imported only when invoked, importing all of them (dask, dask_cuda, scikit-image, ...) is slow:
+LAZY_COMMANDS = {
+    "add": "dexp.cli.dexp_commands.add:add",
+    "background": "dexp.cli.dexp_commands.background:background",
+    "check": "dexp.cli.dexp_commands.check:check",
+    "copy": "dexp.cli.dexp_commands.copy:copy",
+    "crop": "dexp.cli.dexp_commands.crop:crop",
+    "deconv": "dexp.cli.dexp_commands.deconv:deconv",
+    "denoise": "dexp.cli.dexp_commands.denoise:denoise",
+    "deskew": "dexp.cli.dexp_commands.deskew:deskew",
+    "extract-psf": "dexp.cli.dexp_commands.extract_psf:extract_psf",
+    "fastcopy": "dexp.cli.dexp_commands.fastcopy:fastcopy",
+    "fromraw": "dexp.cli.dexp_commands.fromraw:fromraw",
+    "fuse": "dexp.cli.dexp_commands.fuse:fuse",
+    "generic": "dexp.cli.dexp_commands.generic:generic",
+    "histogram": "dexp.cli.dexp_commands.histogram:histogram",
+    "info": "dexp.cli.dexp_commands.info:info",
+    "projrender": "dexp.cli.dexp_commands.projrender:projrender",
+    "register": "dexp.cli.dexp_commands.register:register",
+    "segment": "dexp.cli.dexp_commands.segment:segment",
+    "speedtest": "dexp.cli.dexp_commands.speedtest:speedtest",
+    "stabilize": "dexp.cli.dexp_commands.stabilize:stabilize",
+    "tiff": "dexp.cli.dexp_commands.tiff:tiff",
+    "view": "dexp.cli.dexp_commands.view:view",
+    "volrender": "dexp.cli.video_commands.volrender:volrender",
+}
 
-@click.group()
-def cli():
+# Names of the options of the commands that run on GPU devices:
+DEVICE_OPTIONS = ("device", "devices")
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
+@click.pass_context
+def cli(ctx: click.Context):
     aprint("__________________________________________")
     aprint("  DEXP -- Data EXploration & Processing   ")
     aprint("  Dataset processing dexp_commands             ")
@@ -41,6 +50,11 @@ def cli():
     aprint("__________________________________________")
     aprint("")
 
+    # GPUs are only probed for the commands that can run on them:
+    command = ctx.command.get_command(ctx, ctx.invoked_subcommand) if ctx.invoked_subcommand else None
+    if command is None or not any(param.name in DEVICE_OPTIONS for param in command.params):
+        return
+
     try:
         from dexp.utils.backends import CupyBackend
 
@@ -57,28 +71,3 @@ def cli():
 
     except (ModuleNotFoundError, NotImplementedError):
         aprint("'cupy' module not found! ignored!")
-
-
-cli.add_command(add)
-cli.add_command(background)
-cli.add_command(check)
-cli.add_command(copy)
-cli.add_command(crop)
-cli.add_command(deconv)
-cli.add_command(denoise)
-cli.add_command(deskew)
-cli.add_command(extract_psf)
-cli.add_command(fastcopy)
-cli.add_command(fromraw)
-cli.add_command(fuse)
-cli.add_command(generic)
-cli.add_command(histogram)
-cli.add_command(info)
-cli.add_command(projrender)
-cli.add_command(register)
-cli.add_command(segment)
-cli.add_command(speedtest)
-cli.add_command(stabilize)
-cli.add_command(tiff)
-cli.add_command(view)
-cli.add_command(volrender)
@@ -0,0 +1,28 @@
+import importlib
+from typing import Dict, List, Optional
+
+import click
+
+
+class LazyGroup(click.Group):
+    def __init__(self, *args, lazy_commands: Optional[Dict[str, str]] = None, **kwargs):
+        """Click group that imports the module of a command only when that command is invoked.
+
+        Parameters
+        ----------
+        lazy_commands : mapping from command name to '<module>:<attribute>' of the click command.
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(":")
+            command = getattr(importlib.import_module(module_name), attribute)
+            if not isinstance(command, click.Command):
+                raise ValueError(f"'{self.lazy_commands[cmd_name]}' is not a click command.")
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
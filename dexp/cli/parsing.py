@@ -11,6 +11,8 @@ from toolz import curry
 from dexp.cli.defaults import DEFAULT_CLEVEL, DEFAULT_CODEC, DEFAULT_STORE
 from dexp.datasets import ZDataset
 from dexp.datasets.open_dataset import glob_datasets
+from dexp.datasets.stack_cache import StackCache
+from dexp.datasets.storage_tuning import ACCESS_PATTERNS
 from dexp.utils import overwrite2mode
 
 
@@ -59,9 +61,11 @@ def _parse_channels(input_dataset, channels):
 
 
 def parse_devices(devices: str) -> Union[str, Sequence[int]]:
+    from dexp.utils.dask import is_cpu_devices, is_thread_devices
+
     aprint(f"Requested devices    :  '{'--All--' if 'all' in devices else devices}' ")
 
-    if devices.endswith(".json"):
+    if devices.endswith(".json") or is_cpu_devices(devices) or is_thread_devices(devices):
         return devices
 
     elif "all" in devices:
@@ -75,9 +79,9 @@ def parse_devices(devices: str) -> Union[str, Sequence[int]]:
     return devices
 
 
-def _parse_chunks(chunks: Optional[str]) -> Optional[Tuple[int]]:
-    if chunks is not None:
-        chunks = (int(c) for c in chunks.split(","))
+def _parse_chunks(chunks: Optional[str]) -> Optional[Union[Tuple[int], str]]:
+    if chunks is not None and chunks not in ACCESS_PATTERNS:
+        chunks = tuple(int(c) for c in chunks.strip("()").split(","))
     return chunks
 
 
@@ -92,7 +96,10 @@ def multi_devices_option() -> Callable:
             "-d",
             type=str,
             default="all",
-            help="Sets the CUDA devices id, e.g. 0,1,2 or ‘all’",
+            help="Sets the CUDA devices id, e.g. 0,1,2 or ‘all’, ‘cpu’ or ‘cpu:N’ for a pool of N CPU worker processes, "
+            "‘threads’ or ‘threads:N’ for N threads of the current process (required by --prefetch, --write-behind, "
+            "--lazy-projections and --codec auto, which worker processes ignore), "
+            "or the path of a dask scheduler file (.json) to run on a, possibly multi-node, dask cluster",
             show_default=True,
             callback=devices_callback,
         )(f)
@@ -147,6 +154,72 @@ def slicing_option() -> Callable:
     return decorator
 
 
+def _set_prefetch(ctx: click.Context) -> None:
+    prefetch = ctx.meta.get("prefetch", 0)
+    max_prefetch_bytes = ctx.meta.get("max_prefetch_bytes")
+    # reports once both options are parsed:
+    if prefetch > 0 and "max_prefetch_bytes" in ctx.meta:
+        budget = "" if max_prefetch_bytes is None else f" within {max_prefetch_bytes / 1e9:.3g} GB"
+        aprint(f"Prefetching {prefetch} time point(s) ahead{budget}")
+    ctx.params["input_dataset"].set_prefetch(prefetch, max_prefetch_bytes)
+
+
+def prefetch_callback(ctx: click.Context, opt: click.Option, value: int) -> None:
+    ctx.meta["prefetch"] = value
+    _set_prefetch(ctx)
+    opt.expose_value = False
+
+
+def max_prefetch_bytes_callback(ctx: click.Context, opt: click.Option, value: Optional[float]) -> None:
+    ctx.meta["max_prefetch_bytes"] = None if value is None else int(value)
+    _set_prefetch(ctx)
+    opt.expose_value = False
+
+
+def prefetch_option() -> Callable:
+    def decorator(f: Callable) -> Callable:
+        f = click.option(
+            "--max-prefetch-bytes",
+            "-mpb",
+            type=float,
+            default=None,
+            help="Memory budget in bytes of the time points loaded ahead (e.g. 8e9), no budget when ommited.",
+            callback=max_prefetch_bytes_callback,
+        )(f)
+        return click.option(
+            "--prefetch",
+            "-pf",
+            type=int,
+            default=0,
+            help="Number of time points to load ahead in background threads, overlapping reading with processing. 0 disables prefetching.",
+            show_default=True,
+            callback=prefetch_callback,
+        )(f)
+
+    return decorator
+
+
+def cache_callback(ctx: click.Context, opt: click.Option, value: Optional[float]) -> None:
+    if value is not None:
+        aprint(f"Caching up to {value} GB of decoded stacks" if value > 0 else "Stack cache disabled")
+        ctx.params["input_dataset"].set_stack_cache(StackCache(int(value * 1e9)) if value > 0 else None)
+    opt.expose_value = False
+
+
+def cache_option() -> Callable:
+    def decorator(f: Callable) -> Callable:
+        return click.option(
+            "--cache-size",
+            "-cs",
+            type=float,
+            default=None,
+            help="Size in gigabytes of the in-memory cache of decoded stacks shared by all reads, 0 disables caching. The dataset default is used when ommited.",
+            callback=cache_callback,
+        )(f)
+
+    return decorator
+
+
 def channels_callback(ctx: click.Context, opt: click.Option, value: Optional[str]) -> Sequence[str]:
     return _parse_channels(ctx.params["input_dataset"], value)
 
@@ -193,7 +266,12 @@ def input_dataset_argument() -> Callable:
 
 
 def output_dataset_callback(ctx: click.Context, opt: click.Option, value: Optional[str]) -> None:
-    mode = overwrite2mode(ctx.params.pop("overwrite"))
+    overwrite = ctx.params.pop("overwrite")
+    resume = ctx.params.pop("resume")
+    if resume and overwrite:
+        raise click.BadParameter("--resume and --overwrite cannot be used together.")
+    # resuming appends to an existing output dataset, or creates it
+    mode = "a" if resume else overwrite2mode(overwrite)
     if value is None:
         # new name with suffix if value is None
         value = _get_output_path(ctx.params["input_dataset"].path, None, "." + ctx.command.name)
@@ -206,6 +284,10 @@ def output_dataset_callback(ctx: click.Context, opt: click.Option, value: Option
         clevel=ctx.params.pop("clevel"),
         chunks=_parse_chunks(ctx.params.pop("chunks")),
         parent=ctx.params["input_dataset"],
+        write_behind=ctx.params.pop("write_behind"),
+        resume=resume,
+        projection_types=ctx.params.pop("projections"),
+        lazy_projections=ctx.params.pop("lazy_projections"),
     )
     # removing used parameters
     opt.expose_value = False
@@ -226,13 +308,19 @@ def output_dataset_options() -> Callable:
             is_eager=True,
         ),
         click.option(
-            "--chunks", "-chk", default=None, help="Dataset chunks dimensions, e.g. (1, 126, 512, 512).", is_eager=True
+            "--chunks",
+            "-chk",
+            default=None,
+            help="Dataset chunks dimensions, e.g. 1,126,512,512, or access pattern to tune them for: "
+            + "‘stack’ (whole stacks), ‘slice’ (z slices, for viewing) or ‘tile’ (scatter-gather tiles).",
+            is_eager=True,
         ),
         click.option(
             "--codec",
             "-z",
             default=DEFAULT_CODEC,
-            help="Compression codec: ‘zstd‘, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’",
+            help="Compression codec: ‘zstd‘, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’, or ‘auto’ to benchmark "
+            + "codecs, compression levels and shuffles on the first stack written to each channel.",
             show_default=True,
             is_eager=True,
         ),
@@ -245,6 +333,44 @@ def output_dataset_options() -> Callable:
             show_default=True,
             is_eager=True,
         ),
+        click.option(
+            "--write-behind",
+            "-wbh",
+            type=int,
+            default=0,
+            help="Number of stacks that can be queued for compression and writing in background threads, "
+            "0 writes synchronously.",
+            show_default=True,
+            is_eager=True,
+        ),
+        click.option(
+            "--projections",
+            "-prj",
+            default="max",
+            help="Types of the projections written along the channels, comma separated among "
+            + "‘max’, ‘min’, ‘sum’ and ‘mean’, or ‘none’.",
+            show_default=True,
+            is_eager=True,
+            callback=lambda ctx, opt, value: () if value == "none" else tuple(v.strip() for v in value.split(",")),
+        ),
+        click.option(
+            "--lazy-projections",
+            "-lzp",
+            is_flag=True,
+            default=False,
+            help="Keeps the projections in memory and writes them when the output dataset is closed.",
+            show_default=True,
+            is_eager=True,
+        ),
+        click.option(
+            "--resume",
+            "-rs",
+            is_flag=True,
+            default=False,
+            help="Resumes an interrupted operation, time points already written to the output dataset are skipped.",
+            show_default=True,
+            is_eager=True,
+        ),
     ]
 
     def decorator(f: Callable) -> Callable:
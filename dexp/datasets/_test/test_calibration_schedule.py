@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from dexp.datasets.calibration_schedule import CalibrationSchedule
+
+
+def _calibrate(time_point, initial_parameters):
+    # fake calibration, warm starts add one to the previous order:
+    order = 1.0 if initial_parameters is None else initial_parameters["order"] + 1
+    return {"freq_cutoff": (0.1 * time_point, 0.5), "order": order, "axes": None}
+
+
+def test_calibration_schedule():
+    schedule = CalibrationSchedule(10, every=4)
+    assert schedule.time_points == [0, 4, 8, 9]
+
+    schedule.calibrate(_calibrate)
+    assert sorted(schedule.calibrated) == [0, 4, 8, 9]
+
+    # calibrated time points are used as is, others are interpolated:
+    assert schedule.parameters(4) == {"freq_cutoff": (0.4, 0.5), "order": 1.0, "axes": None}
+    parameters = schedule.parameters(2)
+    assert parameters["freq_cutoff"] == pytest.approx((0.2, 0.5))
+    assert parameters["axes"] is None
+
+    # metadata round trip, already calibrated time points are not calibrated again:
+    calibrated = CalibrationSchedule.from_metadata(json.loads(json.dumps(schedule.to_metadata())))
+    assert calibrated == schedule.calibrated
+
+    def _fail(time_point, initial_parameters):
+        raise RuntimeError("Should not be called")
+
+    CalibrationSchedule(10, every=4, calibrated=calibrated).calibrate(_fail)
+    CalibrationSchedule(10, every=8, calibrated=calibrated).calibrate(_fail)
+
+
+def test_calibration_schedule_warm_start_and_smoothing():
+    schedule = CalibrationSchedule(5, every=2, warm_start=True, smoothing=1)
+    schedule.calibrate(_calibrate)
+
+    # each calibration started from the previous one:
+    assert [schedule.calibrated[t]["order"] for t in (0, 2, 4)] == [1.0, 2.0, 3.0]
+
+    # smoothed over the previous and next calibrations:
+    assert schedule.parameters(0)["order"] == pytest.approx(1.5)
+    assert schedule.parameters(2)["order"] == pytest.approx(2.0)
+    assert schedule.parameters(1)["order"] == pytest.approx(1.75)
+    assert schedule.parameters(2)["freq_cutoff"] == pytest.approx((0.2, 0.5))
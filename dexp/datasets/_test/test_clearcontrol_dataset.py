@@ -0,0 +1,182 @@
+from pathlib import Path
+
+import numpy as np
+
+from dexp.datasets import CCDataset, ZDataset, clearcontrol_dataset
+from dexp.datasets.operations.copy import dataset_copy
+from dexp.io.compress_array import compress_array
+
+
+def _write_clearcontrol_dataset(
+    path: Path, channel: str = "C0L0", n_time_pts: int = 3, shape=(8, 32, 48)
+) -> np.ndarray:
+    stacks_dir = path / "stacks" / channel
+    stacks_dir.mkdir(parents=True)
+
+    rng = np.random.default_rng(0)
+    stacks = rng.integers(0, 2**16, size=(n_time_pts,) + shape, dtype=np.uint16)
+
+    with open(path / f"{channel}.index.txt", "w") as f:
+        for t in range(n_time_pts):
+            f.write(f"{t}\t{t * 1.5}\t{', '.join(str(s) for s in shape[::-1])}\n")
+            stacks[t].astype("<u2").tofile(stacks_dir / f"{str(t).zfill(6)}.raw")
+
+    return stacks
+
+
+def test_clearcontrol_raw_memmap(tmp_path: Path):
+    stacks = _write_clearcontrol_dataset(tmp_path)
+    dataset = CCDataset(str(tmp_path))
+
+    assert dataset.channels() == ["C0L0"]
+    assert dataset.shape("C0L0") == stacks.shape
+
+    stack = dataset.get_stack("C0L0", 1, per_z_slice=False)
+    assert isinstance(stack, np.memmap)
+    assert np.array_equal(stack, stacks[1])
+
+    # per z slice access is a lazy dask array built on the memory map
+    stack = dataset.get_stack("C0L0", 2, per_z_slice=True)
+    assert stack.chunksize == (1,) + stacks.shape[2:]
+    assert np.array_equal(stack[3:5].compute(), stacks[2, 3:5])
+
+    array = dataset.get_array("C0L0")
+    assert np.array_equal(array[:, 2:4, 5:10].compute(), stacks[:, 2:4, 5:10])
+
+
+def test_clearcontrol_blc_per_z_slice(tmp_path: Path):
+    stacks = _write_clearcontrol_dataset(tmp_path)
+
+    # compress the stacks the way ClearControl does, several plain Blosc chunks without chunk-offset header:
+    for raw_file in (tmp_path / "stacks" / "C0L0").glob("*.raw"):
+        stack = np.fromfile(raw_file, dtype="<u2")
+        raw_file.with_suffix(".blc").write_bytes(compress_array(stack, max_chunk_bytes=stack.nbytes // 5, index=False))
+        raw_file.unlink()
+
+    dataset = CCDataset(str(tmp_path))
+    file_name = dataset._get_stack_file_name("C0L0", 1)
+
+    assert np.array_equal(dataset._get_slice_array_for_stack_file_and_z(file_name, stacks.shape[1:], 3), stacks[1, 3])
+    assert Path(file_name + ".index.npz").exists()
+
+    compressed_stack = dataset._get_compressed_stack_for_stack_file(file_name, stacks.shape[1:])
+    compressed_offsets, decompressed_offsets, _ = compressed_stack.chunk_index()
+    assert len(compressed_offsets) > 2
+    assert decompressed_offsets[-1] == stacks[1].nbytes
+
+    # a fresh dataset loads the index from the sidecar file
+    dataset = CCDataset(str(tmp_path))
+    compressed_stack = dataset._get_compressed_stack_for_stack_file(file_name, stacks.shape[1:])
+    assert np.array_equal(compressed_stack.chunk_index()[1], decompressed_offsets)
+    assert np.array_equal(compressed_stack[-2:, 4:9], stacks[1, -2:, 4:9])
+    assert np.array_equal(compressed_stack[1:7:3], stacks[1, 1:7:3])
+    assert np.array_equal(np.asarray(compressed_stack), stacks[1])
+
+    stack = dataset.get_stack("C0L0", 2, per_z_slice=True)
+    assert stack.chunksize == (1,) + stacks.shape[2:]
+    assert np.array_equal(stack[3:5].compute(), stacks[2, 3:5])
+
+    array = dataset.get_array("C0L0")
+    assert np.array_equal(array[:, 2:4, 5:10].compute(), stacks[:, 2:4, 5:10])
+    assert np.array_equal(dataset.get_stack("C0L0", 0, per_z_slice=False), stacks[0])
+
+
+def test_clearcontrol_stack_cache(tmp_path: Path):
+    stacks = _write_clearcontrol_dataset(tmp_path)
+    for raw_file in (tmp_path / "stacks" / "C0L0").glob("*.raw"):
+        stack = np.fromfile(raw_file, dtype="<u2")
+        raw_file.with_suffix(".blc").write_bytes(compress_array(stack, max_chunk_bytes=stack.nbytes // 4, index=False))
+        raw_file.unlink()
+
+    dataset = CCDataset(str(tmp_path), cache_size=stacks[0].nbytes * 2)
+    cache = dataset.stack_cache
+
+    assert np.array_equal(dataset.get_stack("C0L0", 0, per_z_slice=False), stacks[0])
+    misses = cache.misses
+    assert misses > 0 and cache.hits == 0
+
+    # second read of the same stack is served from the cache
+    assert np.array_equal(dataset.get_stack("C0L0", 0, per_z_slice=False), stacks[0])
+    assert cache.hits == misses and cache.misses == misses
+
+    # per z slice reads reuse the cached chunks
+    assert np.array_equal(dataset.get_stack("C0L0", 0, per_z_slice=True)[2:6].compute(), stacks[0, 2:6])
+    assert cache.misses == misses
+
+    for t in range(len(stacks)):
+        assert np.array_equal(dataset.get_stack("C0L0", t, per_z_slice=False), stacks[t])
+    assert cache.evictions > 0 and cache.nbytes <= cache.max_bytes
+
+    dataset.set_stack_cache(None)
+    assert np.array_equal(dataset.get_stack("C0L0", 1, per_z_slice=False), stacks[1])
+
+
+def _compress_clearcontrol_dataset(path: Path, channel: str = "C0L0", num_chunks: int = 1) -> None:
+    # compresses the stacks the way ClearControl does, plain Blosc chunks without chunk-offset header:
+    for raw_file in (path / "stacks" / channel).glob("*.raw"):
+        stack = np.fromfile(raw_file, dtype="<u2")
+        raw_file.with_suffix(".blc").write_bytes(
+            compress_array(stack, max_chunk_bytes=-(-stack.nbytes // num_chunks), index=False)
+        )
+        raw_file.unlink()
+
+
+def test_clearcontrol_blc_decompress_once(tmp_path: Path, monkeypatch):
+    stacks = _write_clearcontrol_dataset(tmp_path)
+    _compress_clearcontrol_dataset(tmp_path)
+
+    decompressed = []
+    original = clearcontrol_dataset.decompress_file_range
+
+    def counting_decompress_file_range(file, start, stop, index):
+        decompressed.append((file.name, start, stop))
+        return original(file, start, stop, index)
+
+    monkeypatch.setattr(clearcontrol_dataset, "decompress_file_range", counting_decompress_file_range)
+
+    # the array is built without reading anything:
+    dataset = CCDataset(str(tmp_path), cache_size=0)
+    array = dataset.get_array("C0L0")
+    assert len(decompressed) == 0
+    assert not any(tmp_path.glob("stacks/C0L0/*.index.npz"))
+
+    # even without cache, per z slice reads of single chunk stacks decompress each stack once:
+    assert np.array_equal(array.compute(scheduler="threads"), stacks)
+    assert len(decompressed) == len(stacks)
+
+
+def test_clearcontrol_copy_zerolevel(tmp_path: Path):
+    stacks = _write_clearcontrol_dataset(tmp_path / "cc")
+    dataset = CCDataset(str(tmp_path / "cc"))
+
+    # the copy clips and shifts the stacks in place, memory mapped stacks are copy-on-write:
+    output = ZDataset(tmp_path / "copy.zarr", mode="w")
+    dataset_copy(dataset, output, ["C0L0"], zerolevel=100)
+
+    expected = np.clip(stacks, 100, None) - 100
+    assert np.array_equal(np.asarray(output.get_array("C0L0")), expected)
+    output.close()
+
+    # files and later reads are unchanged:
+    assert np.array_equal(dataset.get_stack("C0L0", 1, per_z_slice=False), stacks[1])
+    assert np.array_equal(CCDataset(str(tmp_path / "cc")).get_array("C0L0").compute(), stacks)
+
+
+def test_clearcontrol_blc_copy_zerolevel(tmp_path: Path):
+    stacks = _write_clearcontrol_dataset(tmp_path / "cc")
+    _compress_clearcontrol_dataset(tmp_path / "cc")
+    dataset = CCDataset(str(tmp_path / "cc"))
+
+    # decompressed stacks are shared with the cache, consumers get writable copies:
+    stack = dataset.get_stack("C0L0", 1, per_z_slice=False)
+    assert stack.flags.writeable
+    stack[...] = 0
+
+    output = ZDataset(tmp_path / "copy.zarr", mode="w")
+    dataset_copy(dataset, output, ["C0L0"], zerolevel=100)
+
+    expected = np.clip(stacks, 100, None) - 100
+    assert np.array_equal(np.asarray(output.get_array("C0L0")), expected)
+    output.close()
+
+    assert np.array_equal(dataset.get_stack("C0L0", 1, per_z_slice=False), stacks[1])
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy
+import pytest
+
+from dexp.datasets import ZDataset
+from dexp.datasets.projections import Projector, compute_projections
+from dexp.utils.backends import NumpyBackend
+
+_REFERENCES = {
+    "max": lambda array, axis: array.max(axis=axis),
+    "min": lambda array, axis: array.min(axis=axis),
+    "sum": lambda array, axis: array.sum(axis=axis),
+    "mean": lambda array, axis: array.mean(axis=axis),
+}
+
+
+def test_compute_projections():
+    rng = numpy.random.default_rng(0)
+    stack = rng.integers(0, 2**16, size=(13, 17, 19)).astype(numpy.uint16)
+
+    with NumpyBackend():
+        # small slabs, projections are accumulated over several slabs:
+        projections = compute_projections(stack, ("max", "min", "sum", "mean"), max_slab_voxels=1000)
+
+        # tile by tile:
+        projector = Projector(stack.shape, stack.dtype, ("max", "sum"))
+        for z in range(0, 13, 5):
+            for x in range(0, 19, 7):
+                projector.update(stack[z : z + 5, :, x : x + 7], offset=(z, 0, x))
+        tiled = projector.projections()
+
+    assert len(projections) == 4 * 3
+    for (projection_type, axis), projection in projections.items():
+        reference = _REFERENCES[projection_type](stack, axis)
+        numpy.testing.assert_allclose(projection, reference, rtol=1e-6)
+        if projection_type in tiled:
+            numpy.testing.assert_array_equal(tiled[(projection_type, axis)], reference)
+
+    assert projections[("sum", 0)].dtype == numpy.uint64
+    assert projections[("mean", 0)].dtype == numpy.float32
+
+
+@pytest.mark.parametrize("lazy_projections", [False, True])
+def test_zarr_projection_types(tmp_path: Path, lazy_projections: bool):
+    rng = numpy.random.default_rng(0)
+    stacks = rng.uniform(size=(4, 6, 10, 12)).astype(numpy.float32)
+
+    zdataset = ZDataset(
+        path=tmp_path / "test.zarr",
+        mode="w",
+        projection_types=("max", "mean"),
+        lazy_projections=lazy_projections,
+        write_behind=2,
+    )
+    zdataset.add_channel("first", shape=stacks.shape, dtype=stacks.dtype)
+    assert zdataset.projection_types("first") == ["max", "mean"]
+
+    # time points written out of order, lazy projections are written in contiguous ranges at close:
+    for t in (1, 0, 3, 2):
+        zdataset.write_stack("first", t, stacks[t])
+    zdataset.close()
+
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="r")
+    for axis in range(3):
+        max_projection = zdataset.get_projection_array("first", axis)[...]
+        numpy.testing.assert_array_equal(max_projection, stacks.max(axis=axis + 1))
+        mean_projection = zdataset.get_projection_array("first", axis, projection_type="mean")[...]
+        numpy.testing.assert_allclose(mean_projection, stacks.mean(axis=axis + 1), rtol=1e-5)
+    assert zdataset.complete_time_points("first") == {0, 1, 2, 3}
+
+
+def test_zarr_lazy_projections_resume(tmp_path: Path):
+    stacks = numpy.random.default_rng(0).uniform(size=(7, 4, 8, 8)).astype(numpy.float32)
+
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="w", lazy_projections=True)
+    zdataset.max_pending_projections = 3
+    zdataset.add_channel("first", shape=stacks.shape, dtype=stacks.dtype)
+    for t in range(len(stacks)):
+        zdataset.write_stack("first", t, stacks[t])
+
+    # as if the process crashed: only the pending projections are lost, and their time points resumed
+    resumed = ZDataset(path=tmp_path / "test.zarr", mode="a", resume=True)
+    assert resumed.complete_time_points("first") == set(range(6))
+    assert resumed.time_points_to_process("first", range(len(stacks))) == [6]
+
+    zdataset.close()
+    assert resumed.complete_time_points("first") == set(range(7))
+    numpy.testing.assert_array_equal(resumed.get_projection_array("first", 0)[...], stacks.max(axis=1))
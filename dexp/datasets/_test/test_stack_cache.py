@@ -0,0 +1,65 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from dexp.datasets.stack_cache import StackCache
+
+
+def test_stack_cache_lru():
+    cache = StackCache(max_bytes=3 * 1000)
+
+    for i in range(3):
+        cache.put(i, np.full(1000, i, dtype=np.uint8))
+    assert len(cache) == 3 and cache.nbytes == 3000
+
+    # 0 becomes the most recently used, 1 is evicted first
+    assert cache.get(0)[0] == 0
+    cache.put(3, np.full(1000, 3, dtype=np.uint8))
+    assert 1 not in cache and 0 in cache
+    assert cache.get(1) is None
+
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 1,
+        "entries": 3,
+        "nbytes": 3000,
+        "max_bytes": 3000,
+    }
+
+    # cached arrays are read-only
+    with pytest.raises(ValueError):
+        cache.get(0)[0] = 1
+
+    # too large to be cached at all, left writable
+    large = cache.put("large", np.zeros(4000, dtype=np.uint8))
+    assert "large" not in cache and len(cache) == 3
+    assert large.flags.writeable
+
+    # loaded arrays are writable copies of the cached ones
+    loaded = cache.get_or_load(0, lambda: None)
+    loaded[0] = 1
+    assert cache.get(0)[0] == 0
+
+    cache.invalidate(lambda key: key in (2, 3))
+    assert len(cache) == 1 and cache.nbytes == 1000
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert len(copy) == 0 and copy.max_bytes == cache.max_bytes
+
+
+def test_stack_cache_threads():
+    cache = StackCache(max_bytes=10 * 8 * 100)
+
+    def _load(i: int) -> np.ndarray:
+        return cache.get_or_load(i % 20, lambda: np.full(100, i % 20, dtype=np.float64))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        arrays = list(executor.map(_load, range(200)))
+
+    assert all(np.all(array == i % 20) for i, array in enumerate(arrays))
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.hits + cache.misses == 200
+    assert cache.evictions == cache.misses - len(cache)
@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+import pytest
+import zarr
+
+from dexp.datasets.stack_iterator import StackIterator
+
+
+def _make_array(n_time_pts: int = 8, shape=(4, 16, 16)) -> zarr.Array:
+    array = zarr.zeros((n_time_pts,) + shape, chunks=(1,) + shape, dtype=np.uint16)
+    for t in range(n_time_pts):
+        array[t] = t
+    return array
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_stack_iterator_prefetch(prefetch: int):
+    array = _make_array()
+    slicing = (slice(1, 7), slice(0, 2))
+
+    with StackIterator(array, slicing, prefetch=prefetch) as stacks:
+        assert len(stacks) == 6
+        assert stacks.shape == (6, 2, 16, 16)
+        for i, stack in enumerate(stacks):
+            assert stack.shape == stacks.shape[1:]
+            assert np.all(stack == i + 1)
+        # random access must still be correct
+        assert np.all(stacks[-1] == 6)
+        assert np.all(stacks[2] == 3)
+
+
+def test_stack_iterator_prefetch_budget():
+    array = _make_array()
+    stacks = StackIterator(array, None, prefetch=4, max_prefetch_bytes=2 * array[0].nbytes)
+
+    stacks[0]
+    assert len(stacks._futures) == 2
+
+    stacks = StackIterator(array, None, prefetch=4, max_prefetch_bytes=array[0].nbytes // 2)
+    stacks[0]
+    assert len(stacks._futures) == 0
+
+
+def test_stack_iterator_prefetch_error():
+    class FailingArray:
+        def __init__(self, array):
+            self.shape = array.shape
+            self.dtype = array.dtype
+            self._array = array
+
+        def __getitem__(self, item):
+            if item == 2:
+                raise RuntimeError("Failed reading")
+            return self._array[item]
+
+    stacks = StackIterator(FailingArray(_make_array()), None, prefetch=2)
+    stacks[0]
+    stacks[1]
+    with pytest.raises(RuntimeError):
+        stacks[2]
+
+    assert len(stacks._futures) == 0
+
+
+def test_stack_iterator_prefetch_consumers():
+    array = _make_array(n_time_pts=16)
+    stacks = StackIterator(array, None, prefetch=2)
+
+    # reads from another thread must not cancel the prefetches of this one:
+    stacks[0]
+    thread = threading.Thread(target=lambda: stacks[10])
+    thread.start()
+    thread.join()
+    assert set(stacks._futures.keys()) == {1, 2, 11, 12}
+    assert np.all(stacks[1] == 1)
+    stacks.close()
+
+
+def test_stack_iterator_prefetch_order():
+    array = _make_array(n_time_pts=10)
+    stacks = StackIterator(array, None, prefetch=2)
+    stacks.set_order([5, 3, 8, 1])
+
+    stacks[5]
+    assert set(stacks._futures.keys()) == {3, 8}
+    for t in (3, 8, 1):
+        assert np.all(stacks[t] == t)
+    assert len(stacks._futures) == 0
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from dexp.datasets import ZDataset
+from dexp.datasets.operations.histogram import dataset_histogram
+from dexp.datasets.statistics import (
+    stack_statistics,
+    statistics_at,
+    statistics_quantile,
+    statistics_range,
+)
+from dexp.processing.utils.normalise import Normalise
+from dexp.utils.backends import NumpyBackend
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int16, np.uint16])
+def test_stack_statistics_integers(dtype):
+    rng = np.random.default_rng(0)
+    info = np.iinfo(dtype)
+    stack = rng.integers(max(info.min, -1000), min(info.max, 3000), size=(7, 33, 35), endpoint=True).astype(dtype)
+
+    quantiles = (0.0, 0.01, 0.37, 0.5, 0.999, 1.0)
+    with NumpyBackend():
+        # small slabs, several bincounts are accumulated:
+        statistics = stack_statistics(stack, quantiles=quantiles, max_slab_voxels=2000)
+
+    assert statistics["exact"]
+    assert statistics["count"] == stack.size
+    assert statistics["min"] == stack.min() and statistics["max"] == stack.max()
+    assert statistics["mean"] == pytest.approx(stack.mean(dtype=np.float64))
+    assert statistics["std"] == pytest.approx(stack.std(dtype=np.float64))
+    np.testing.assert_allclose(statistics["quantiles"], np.quantile(stack, quantiles))
+
+
+def test_stack_statistics_floats():
+    rng = np.random.default_rng(0)
+    stack = rng.normal(100, 10, size=(5, 64, 64)).astype(np.float32)
+
+    quantiles = (0.01, 0.5, 0.99)
+    with NumpyBackend():
+        statistics = stack_statistics(stack, quantiles=quantiles, num_bins=512, max_slab_voxels=5000)
+
+    assert not statistics["exact"]
+    assert statistics["histogram"].sum() == stack.size
+    assert statistics["min"] == stack.min() and statistics["max"] == stack.max()
+    assert statistics["mean"] == pytest.approx(stack.mean(dtype=np.float64))
+    assert statistics["std"] == pytest.approx(stack.std(dtype=np.float64))
+
+    # quantiles are accurate to half a bin:
+    bin_width = (stack.max() - stack.min()) / 512
+    np.testing.assert_allclose(statistics["quantiles"], np.quantile(stack, quantiles), atol=bin_width)
+
+
+def test_stack_statistics_non_finite():
+    rng = np.random.default_rng(0)
+    stack = rng.normal(100, 10, size=(5, 32, 32)).astype(np.float32)
+    stack[0, :4] = np.nan
+    stack[2, 3, 5] = np.inf
+    finite = stack[np.isfinite(stack)]
+
+    with NumpyBackend():
+        statistics = stack_statistics(stack, quantiles=(0.5,), max_slab_voxels=1024)
+        # a stack without any finite value:
+        empty = stack_statistics(np.full((2, 4, 4), np.nan, dtype=np.float32), quantiles=(0.5,))
+
+    assert statistics["count"] == statistics["histogram"].sum() == finite.size
+    assert statistics["min"] == finite.min() and statistics["max"] == finite.max()
+    assert statistics["mean"] == pytest.approx(finite.mean(dtype=np.float64))
+    assert statistics["quantiles"][0] == pytest.approx(np.median(finite), abs=0.2)
+
+    assert empty["count"] == 0
+    assert np.isnan(empty["min"]) and np.isnan(empty["quantiles"]).all()
+
+
+def test_dataset_histogram(tmp_path):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 1000, size=(4, 8, 16, 16)).astype(np.uint16)
+
+    dataset = ZDataset(tmp_path / "statistics.zarr", mode="w")
+    dataset.add_channel("image", shape=array.shape, dtype=array.dtype)
+    dataset.write_array("image", array)
+    dataset.close()
+
+    # datasets opened read only are left untouched, statistics are stored in the output directory:
+    dataset = ZDataset(tmp_path / "statistics.zarr", mode="r")
+    statistics = dataset_histogram(dataset, tmp_path / "histograms", ["image"], 0, 1, None, workers=2, plot=False)
+    np.testing.assert_array_equal(statistics["image"]["max"], array.max(axis=(1, 2, 3)))
+    assert (tmp_path / "histograms" / "statistics.zarr").exists()
+    assert dataset.get_statistics("image") is None
+    with pytest.raises(ValueError):
+        dataset.write_statistics("image", 0, stack_statistics(array[0]))
+    dataset.close()
+
+    # and in writable datasets:
+    dataset = ZDataset(tmp_path / "statistics.zarr", mode="r+")
+    dataset_histogram(dataset, tmp_path / "histograms", ["image"], 0, 1, None, workers=2, plot=False)
+    dataset.close()
+
+    dataset = ZDataset(tmp_path / "statistics.zarr", mode="r")
+    assert dataset.channels() == ["image"]
+    statistics = dataset.get_statistics("image")
+    assert statistics["computed"].all()
+    np.testing.assert_array_equal(statistics["max"], array.max(axis=(1, 2, 3)))
+
+    # stored and histogram derived quantiles:
+    np.testing.assert_allclose(statistics_quantile(statistics, 0.5), np.quantile(array, 0.5, axis=(1, 2, 3)))
+    assert statistics_quantile(statistics, 0.3, time_point=2) == pytest.approx(np.quantile(array[2], 0.3))
+    assert statistics_range(statistics, quantile=0.0) == (array.min(), array.max())
+
+    # statistics of a time point, e.g. for normalisation:
+    time_point_statistics = statistics_at(statistics, 2)
+    assert time_point_statistics["max"] == array[2].max()
+    with NumpyBackend():
+        normalise = Normalise(array[2], quantile=0.01, statistics=time_point_statistics)
+    assert normalise.min_value == pytest.approx(np.quantile(array[2], 0.01))
+    assert normalise.max_value == pytest.approx(np.quantile(array[2], 0.99))
+    assert statistics_at(None, 2) is None
@@ -1,13 +1,17 @@
 import os
+import time
 from pathlib import Path
 
 import numpy
+import pytest
+import zarr
 from arbol import aprint
 from ome_zarr.utils import info
 from skimage.data import binary_blobs
 from skimage.filters import gaussian
 
 from dexp.datasets import ZDataset
+from dexp.datasets.stack_cache import StackCache
 from dexp.utils.backends import NumpyBackend
 
 
@@ -187,3 +191,182 @@ def test_ome_zarr_convertion(tmp_path: Path):
     ome_zarr_path = tmp_path / "test_ome.ome.zarr"
     zdataset.to_ome_zarr(ome_zarr_path)
     aprint(list(info(ome_zarr_path, stats=True)))
+
+
+def test_ome_zarr_pyramid(tmp_path: Path):
+    rng = numpy.random.default_rng(0)
+    stacks = rng.integers(0, 1000, size=(3, 2, 8, 12, 16)).astype(numpy.uint16)
+
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="w", store="dir")
+    for c, channel in enumerate(("first", "second")):
+        zdataset.add_channel(name=channel, shape=stacks[:, c].shape, dtype=stacks.dtype)
+        zdataset.write_array(channel, stacks[:, c])
+
+    # converted in parallel, each level downscaled from the previous one:
+    converted_path = tmp_path / "converted.ome.zarr"
+    zdataset.to_ome_zarr(converted_path, n_scales=3, workers=2)
+    converted = zarr.open_group(zarr.NestedDirectoryStore(str(converted_path)), mode="r")
+
+    assert converted["0"].shape == (3, 2, 8, 12, 16)
+    assert converted["1"].shape == (3, 2, 4, 6, 8)
+    assert converted["2"].shape == (3, 2, 2, 3, 4)
+    numpy.testing.assert_array_equal(converted["0"][...], stacks)
+    level_1 = stacks.reshape(3, 2, 4, 2, 6, 2, 8, 2).mean(axis=(3, 5, 7))
+    numpy.testing.assert_array_equal(converted["1"][...], numpy.rint(level_1))
+    assert len(converted.attrs["multiscales"][0]["datasets"]) == 3
+
+    # written incrementally along with the stacks:
+    incremental_path = tmp_path / "incremental.ome.zarr"
+    zdataset = ZDataset(path=tmp_path / "written.zarr", mode="w", store="dir", write_behind=2)
+    for c, channel in enumerate(("first", "second")):
+        zdataset.add_channel(name=channel, shape=stacks[:, c].shape, dtype=stacks.dtype)
+    zdataset.set_ome_zarr_pyramid(incremental_path, n_scales=3)
+    for t in range(3):
+        for c, channel in enumerate(("first", "second")):
+            zdataset.write_stack(channel, t, stacks[t, c])
+    zdataset.close()
+
+    incremental = zarr.open_group(zarr.NestedDirectoryStore(str(incremental_path)), mode="r")
+    for level in ("0", "1", "2"):
+        numpy.testing.assert_array_equal(incremental[level][...], converted[level][...])
+
+
+def test_zarr_write_behind(tmp_path: Path):
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="w", store="dir", write_behind=2)
+
+    zdataset.add_channel(name="first", shape=(6, 10, 20, 30), chunks=(1, 5, 10, 10), dtype="f4")
+
+    rng = numpy.random.default_rng(0)
+    stacks = [rng.uniform(size=(10, 20, 30)).astype("f4") for _ in range(6)]
+    # queued stacks are copies, the same buffer can be reused for each write:
+    buffer = numpy.empty_like(stacks[0])
+    for i, stack in enumerate(stacks):
+        buffer[...] = stack
+        zdataset.write_stack("first", i, buffer)
+    buffer[...] = 0
+
+    zdataset.flush()
+    assert zdataset.check_integrity()
+
+    for i, stack in enumerate(stacks):
+        assert numpy.all(zdataset.get_stack("first", i) == stack)
+        for axis in range(3):
+            assert numpy.all(zdataset.get_projection_array("first", axis=axis)[i] == stack.max(axis=axis))
+
+    # errors from the writer threads are raised to the caller
+    zdataset.write_stack("missing", 0, stacks[0])
+    with pytest.raises(KeyError):
+        zdataset.flush()
+
+    # even when the done callbacks of the writes have not run yet when flushing, errors are reported once:
+    write_done = zdataset._write_done
+
+    def _late_write_done(future):
+        time.sleep(0.2)
+        write_done(future)
+
+    zdataset._write_done = _late_write_done
+    zdataset.write_stack("missing", 0, stacks[0])
+    with pytest.raises(KeyError):
+        zdataset.flush()
+    time.sleep(0.3)
+    zdataset.flush()
+
+    zdataset.close()
+
+
+def test_zarr_stack_cache(tmp_path: Path):
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="w", store="dir")
+    zdataset.add_channel(name="first", shape=(3, 10, 20, 30), chunks=(1, 5, 10, 10), dtype="f4")
+    zdataset.set_stack_cache(StackCache(max_bytes=10**6))
+    cache = zdataset.stack_cache
+
+    stack = numpy.ones((10, 20, 30), dtype="f4")
+    zdataset.write_stack("first", 1, stack)
+
+    assert numpy.all(zdataset.get_stack("first", 1) == 1)
+    assert numpy.all(zdataset.get_stack("first", 1) == 1)
+    assert cache.hits == 1 and cache.misses == 1
+
+    # cached stacks can be modified in place by consumers, without affecting the cache
+    cached = zdataset.get_stack("first", 1)
+    cached *= 3
+    assert numpy.all(zdataset.get_stack("first", 1) == 1)
+
+    # writes invalidate the cached stacks
+    zdataset.write_stack("first", 1, 2 * stack)
+    assert numpy.all(zdataset.get_stack("first", 1) == 2)
+    assert cache.misses == 2
+
+    zdataset.close()
+
+
+def test_zarr_resume(tmp_path: Path):
+    path = tmp_path / "test.zarr"
+    zdataset = ZDataset(path=path, mode="w", store="dir")
+    zdataset.add_channel(name="first", shape=(4, 10, 20, 30), chunks=(1, 5, 10, 10), dtype="f4")
+
+    stack = numpy.ones((10, 20, 30), dtype="f4")
+    zdataset.write_stack("first", 0, stack)
+    zdataset.write_stack("first", 2, stack)
+    # partially written time point
+    zdataset.get_array("first")[1, :5] = 1
+    zdataset.close()
+
+    zdataset = ZDataset(path=path, mode="a", resume=True)
+    assert zdataset.complete_time_points("first") == {0, 2}
+    assert zdataset.first_uninitialized_time_point("first") == 1
+    assert zdataset.time_points_to_process("first", range(4)) == [1, 3]
+    assert zdataset.time_points_to_process("second", range(4)) == [0, 1, 2, 3]
+
+    # existing channels are reused when resuming, if they match
+    array = zdataset.add_channel(name="first", shape=(4, 10, 20, 30), dtype="f4")
+    assert numpy.all(array[2] == 1)
+    with pytest.raises(ValueError):
+        zdataset.add_channel(name="first", shape=(5, 10, 20, 30), dtype="f4")
+
+    for t in zdataset.time_points_to_process("first", range(4)):
+        zdataset.write_stack("first", t, stack)
+    assert zdataset.time_points_to_process("first", range(4)) == []
+    zdataset.close()
+
+
+def test_zarr_storage_tuning(tmp_path: Path):
+    zdataset = ZDataset(
+        path=tmp_path / "test.zarr", mode="w", store="dir", codec="auto", chunks="slice", write_behind=2
+    )
+    array = zdataset.add_channel(name="first", shape=(4, 6, 20, 30), dtype="u2")
+    zdataset.add_channel(name="second", shape=(4, 6, 20, 30), dtype="u2", chunks="tile", codec="lz4", clevel=5)
+
+    assert zdataset.get_array("first").chunks == (1, 1, 20, 30)
+    assert zdataset.get_array("second").chunks == (1, 6, 20, 30)
+
+    rng = numpy.random.default_rng(0)
+    stacks = rng.poisson(100, size=(4, 6, 20, 30)).astype("u2")
+    for t, stack in enumerate(stacks[:3]):
+        zdataset.write_stack("first", t, stack)
+        zdataset.write_stack("second", t, stack)
+    zdataset.flush()
+
+    # the array returned before tuning writes with the tuned codec:
+    array[3] = stacks[3]
+    assert array.compressor == zdataset.get_array("first").compressor
+    zdataset.write_stack("second", 3, stacks[3])
+    zdataset.close()
+
+    zdataset = ZDataset(path=tmp_path / "test.zarr", mode="r")
+    numpy.testing.assert_array_equal(zdataset.get_array("first")[...], stacks)
+    # projections are only written by `write_stack`:
+    projection = zdataset.get_projection_array("first", axis=0)[:3]
+    numpy.testing.assert_array_equal(projection, stacks[:3].max(axis=1))
+
+    # decision recorded in the channel metadata:
+    storage = zdataset.get_storage_metadata("first")
+    assert storage["tuned"] and storage["access"] == "slice"
+    assert storage["ratio"] > 1
+    compressor = zdataset.get_array("first").compressor
+    assert (compressor.cname, compressor.clevel) == (storage["codec"], storage["clevel"])
+
+    storage = zdataset.get_storage_metadata("second")
+    assert not storage["tuned"]
+    assert (storage["codec"], storage["clevel"], storage["access"]) == ("lz4", 5, "tile")
@@ -1,10 +1,11 @@
 import warnings
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, List, Optional, Sequence, Tuple, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy
 
+from dexp.datasets.stack_cache import StackCache
 from dexp.datasets.stack_iterator import StackIterator
 
 
@@ -13,6 +14,9 @@ class BaseDataset(ABC):
         """Instanciates a Base Dataset"""
         self.dask_backed = dask_backed
         self._slicing = None
+        self._prefetch = 0
+        self._max_prefetch_bytes = None
+        self._stack_cache: Optional[StackCache] = None
 
         if not isinstance(path, str):
             path = str(path)
@@ -118,13 +122,50 @@ class BaseDataset(ABC):
     def slicing(self) -> slice:
         return self._slicing
 
+    def set_prefetch(self, prefetch: int, max_prefetch_bytes: Optional[int] = None) -> None:
+        """Sets the number of time points that stack iterators load ahead in background threads.
+
+        Parameters
+        ----------
+        prefetch : number of time points to load ahead, 0 disables prefetching.
+        max_prefetch_bytes : memory budget for the stacks loaded ahead, None means no budget.
+        """
+        self._prefetch = prefetch
+        self._max_prefetch_bytes = max_prefetch_bytes
+
+    def process_local_options(self) -> List[str]:
+        """Returns the enabled options that only apply in the current process: copies of the dataset
+        (and of its stack iterators) sent to worker processes ignore them."""
+        return ["prefetch"] if self._prefetch > 0 else []
+
+    def set_stack_cache(self, cache: Optional[StackCache]) -> None:
+        """Sets the cache of decoded stacks used by reads, None disables caching.
+        The same cache can be shared by several datasets.
+
+        Parameters
+        ----------
+        cache : stack cache, or None.
+        """
+        self._stack_cache = cache
+
+    @property
+    def stack_cache(self) -> Optional[StackCache]:
+        return self._stack_cache
+
+    def _stack_iterator(self, array: Any) -> StackIterator:
+        return StackIterator(array, self._slicing, prefetch=self._prefetch, max_prefetch_bytes=self._max_prefetch_bytes)
+
     def __getitem__(self, channel: str) -> StackIterator:
-        return StackIterator(self.get_array(channel), self._slicing)
+        return self._stack_iterator(self.get_array(channel))
 
     @property
     def path(self) -> str:
         return self._path
 
+    def get_statistics(self, channel: str) -> Optional[Dict[str, numpy.ndarray]]:
+        """Returns the per time point statistics of a channel (see `dexp.datasets.statistics`), None if not computed."""
+        return None
+
     def get_resolution(self, channel: Optional[str] = None) -> List[float]:
         warnings.warn("`get_resolution` not implemented, returning list of 1.0 as default.")
         return [1] * len(self.shape(channel))
@@ -0,0 +1,145 @@
+import numbers
+from typing import Any, Callable, Dict, List, Optional
+
+import dask
+import numpy as np
+from arbol import aprint, asection
+
+
+class CalibrationSchedule:
+    def __init__(
+        self,
+        num_time_points: int,
+        every: int = 1,
+        warm_start: bool = False,
+        smoothing: int = 0,
+        calibrated: Optional[Dict[int, Dict[str, Any]]] = None,
+    ):
+        """Schedules the calibration of per time point parameters (e.g. denoising parameters) of a dataset operation.
+
+        Only every k-th time point (and the last one) is calibrated, the parameters of the other time points are
+        linearly interpolated between their calibrated neighbours. Calibrations can start from the parameters of the
+        previously calibrated time point, and calibrated parameters can be averaged over neighbouring calibrations.
+        Numerical parameters (numbers and sequences of numbers) are interpolated and averaged, the others are taken
+        from the closest calibration.
+
+        Parameters
+        ----------
+        num_time_points : number of time points of the dataset.
+        every : calibrates one time point every 'every' time points.
+        warm_start : if True each calibration starts from the parameters of the previous calibration,
+            calibrations are then sequential.
+        smoothing : calibrated parameters are averaged over 'smoothing' calibrations before and after, 0 disables it.
+        calibrated : parameters already calibrated (e.g. by a previous run, see 'to_metadata'), indexed by time point.
+        """
+        if every < 1:
+            raise ValueError(f"Calibration interval must be positive, got {every}")
+        self.num_time_points = num_time_points
+        self.every = every
+        self.warm_start = warm_start
+        self.smoothing = max(0, smoothing)
+        self.calibrated: Dict[int, Dict[str, Any]] = dict(calibrated or {})
+
+    @property
+    def time_points(self) -> List[int]:
+        """Time points to calibrate, the last one is included so that no parameters are extrapolated."""
+        time_points = list(range(0, self.num_time_points, self.every))
+        if self.num_time_points > 0 and time_points[-1] != self.num_time_points - 1:
+            time_points.append(self.num_time_points - 1)
+        return time_points
+
+    def missing_time_points(self) -> List[int]:
+        return [t for t in self.time_points if t not in self.calibrated]
+
+    def calibrate(self, function: Callable[[int, Optional[Dict[str, Any]]], Dict[str, Any]]) -> None:
+        """
+        Calibrates the missing time points with dask, in parallel or sequentially when warm starting.
+
+        Parameters
+        ----------
+        function : calibration function, takes a time point and the initial parameters (None when not warm starting)
+            and returns the calibrated parameters.
+        """
+        missing = self.missing_time_points()
+        if len(missing) == 0:
+            aprint("All time points are already calibrated.")
+            return
+
+        with asection(f"Calibrating {len(missing)} time points: {missing}"):
+            lazy_calibrations = {}
+            known = dict(self.calibrated)
+            for t in missing:
+                initial = None
+                if self.warm_start:
+                    # starts from the closest calibration before, already known or lazily computed:
+                    before = [c for c in known if c < t]
+                    initial = known[max(before)] if len(before) > 0 else None
+                known[t] = lazy_calibrations[t] = dask.delayed(function)(t, initial)
+
+            (results,) = dask.compute(lazy_calibrations)
+            self.calibrated.update(results)
+
+    def _smoothed(self) -> Dict[int, Dict[str, Any]]:
+        time_points = sorted(self.calibrated)
+        if self.smoothing == 0:
+            return {t: self.calibrated[t] for t in time_points}
+
+        smoothed = {}
+        for i, t in enumerate(time_points):
+            neighbours = [self.calibrated[n] for n in time_points[max(0, i - self.smoothing) : i + self.smoothing + 1]]
+            smoothed[t] = {
+                k: _average([p[k] for p in neighbours]) if _is_numerical(v) else v
+                for k, v in self.calibrated[t].items()
+            }
+        return smoothed
+
+    def parameters(self, time_point: int) -> Dict[str, Any]:
+        """Returns the (smoothed and interpolated) parameters of a time point."""
+        if len(self.calibrated) == 0:
+            raise RuntimeError("No calibrated time points, 'calibrate' must be called first.")
+
+        smoothed = self._smoothed()
+        time_points = sorted(smoothed)
+        after = next((t for t in time_points if t >= time_point), time_points[-1])
+        before = next((t for t in reversed(time_points) if t <= time_point), time_points[0])
+        if after == before:
+            return dict(smoothed[after])
+
+        alpha = (time_point - before) / (after - before)
+        closest = smoothed[before] if alpha < 0.5 else smoothed[after]
+        return {
+            k: _average([v, smoothed[after][k]], weights=[1 - alpha, alpha]) if _is_numerical(v) else closest[k]
+            for k, v in smoothed[before].items()
+        }
+
+    def to_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the calibrated parameters in a JSON serializable form (e.g. for the dataset metadata)."""
+        return {str(t): {k: _to_builtin(v) for k, v in p.items()} for t, p in sorted(self.calibrated.items())}
+
+    @staticmethod
+    def from_metadata(metadata: Optional[Dict[str, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """Inverse of 'to_metadata', lists of numbers are converted back to tuples."""
+        if metadata is None:
+            return {}
+        return {int(t): {k: tuple(v) if isinstance(v, list) else v for k, v in p.items()} for t, p in metadata.items()}
+
+
+def _is_numerical(value: Any) -> bool:
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0 and all(_is_numerical(v) for v in value)
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _average(values: List[Any], weights: Optional[List[float]] = None) -> Any:
+    average = np.average(np.asarray(values, dtype=np.float64), axis=0, weights=weights)
+    if isinstance(values[0], (list, tuple)):
+        return tuple(float(v) for v in average)
+    return float(average)
+
+
+def _to_builtin(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
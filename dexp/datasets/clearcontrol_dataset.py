@@ -1,22 +1,245 @@
 import os
 import re
+import threading
+from collections import OrderedDict
 from fnmatch import fnmatch
 from os import listdir
 from os.path import exists, join
-from typing import Any, List, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 from arbol.arbol import aprint
-from cachey import Cache
 from dask import array, delayed
 
 from dexp.datasets.base_dataset import BaseDataset
-from dexp.io.compress_array import decompress_array
+from dexp.datasets.stack_cache import StackCache
+from dexp.io.compress_array import (
+    chunk_range,
+    decompress_file_range,
+    file_chunk_index,
+)
 from dexp.utils.config import config_blosc
 
 
+class CompressedStack:
+    def __init__(self, file_name: str, shape: Tuple[int, ...], dtype=np.uint16, cache: Optional[StackCache] = None):
+        """Lazy array of a Blosc compressed ClearControl stack (.blc) with random access along z.
+
+        Only the compressed chunks covering the requested z range are read and decompressed. The chunk offsets
+        are built from the Blosc chunk headers once and cached in a sidecar file next to the stack
+        ('<file_name>.index.npz'). Decompressed chunks are kept in the stack cache, if any, so that consecutive
+        z slices and repeated reads do not decompress the same chunks again.
+
+        Parameters
+        ----------
+        file_name : path of the compressed stack file.
+        shape : shape of the decompressed stack (z, y, x).
+        dtype : data type of the decompressed stack.
+        cache : cache for the decompressed chunks, None disables caching.
+        """
+        self.file_name = file_name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).newbyteorder("L")
+        self.ndim = len(self.shape)
+
+        self._index: Optional[Tuple[np.ndarray, np.ndarray, int]] = None
+        self._cache = cache
+        self._lock = threading.Lock()
+
+    @property
+    def sidecar_file_name(self) -> str:
+        return self.file_name + ".index.npz"
+
+    @property
+    def plane_nbytes(self) -> int:
+        return int(np.prod(self.shape[1:])) * self.dtype.itemsize
+
+    def chunk_index(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        with self._lock:
+            return self._get_index()
+
+    def _get_index(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        # Must be called with the lock held.
+        if self._index is None:
+            stat = os.stat(self.file_name)
+            self._index = self._load_sidecar(stat)
+            if self._index is None:
+                with open(self.file_name, "rb") as file:
+                    self._index = file_chunk_index(file)
+                self._save_sidecar(stat)
+        return self._index
+
+    def _load_sidecar(self, stat: os.stat_result) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        try:
+            with np.load(self.sidecar_file_name) as sidecar:
+                # the sidecar is stale if the stack file changed since it was written:
+                if sidecar["file_size"] != stat.st_size or sidecar["file_mtime_ns"] != stat.st_mtime_ns:
+                    return None
+                return sidecar["compressed_offsets"], sidecar["decompressed_offsets"], int(sidecar["data_offset"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save_sidecar(self, stat: os.stat_result) -> None:
+        compressed_offsets, decompressed_offsets, data_offset = self._index
+        try:
+            with open(self.sidecar_file_name, "wb") as file:
+                np.savez(
+                    file,
+                    compressed_offsets=compressed_offsets,
+                    decompressed_offsets=decompressed_offsets,
+                    data_offset=data_offset,
+                    file_size=stat.st_size,
+                    file_mtime_ns=stat.st_mtime_ns,
+                )
+        except OSError as e:
+            # read-only acquisitions are fine, the index is just rebuilt next time:
+            aprint(f"Could not write chunk index sidecar file: {self.sidecar_file_name} ({e})")
+
+    def read(self, z_start: int, z_stop: int, copy: bool = False) -> np.ndarray:
+        """Decompresses the z slices in range [z_start, z_stop) and returns them as a read-only array,
+        or as a writable array that does not share memory with the cache if 'copy' is True."""
+        start = z_start * self.plane_nbytes
+        stop = z_stop * self.plane_nbytes
+
+        with self._lock:
+            index = self._get_index()
+            decompressed_offsets = index[1]
+            chunk_ids = chunk_range(index, start, stop)
+
+            chunks = {}
+            if self._cache is not None:
+                for chunk_id in chunk_ids:
+                    chunk = self._cache.get((self.file_name, chunk_id))
+                    if chunk is not None:
+                        chunks[chunk_id] = chunk
+
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in chunks]
+            if len(missing) > 0:
+                # chunks in between missing ones are decompressed again, that's one read and parallel decompression:
+                missing_start = int(decompressed_offsets[missing[0]])
+                with open(self.file_name, "rb") as file:
+                    buffer = decompress_file_range(
+                        file, missing_start, int(decompressed_offsets[missing[-1] + 1]), index
+                    )
+                buffer.flags.writeable = False
+
+                if len(missing) == len(chunk_ids):
+                    # nothing to assemble:
+                    chunks_start = int(decompressed_offsets[chunk_ids.start])
+                    if not self._cache_chunks(chunk_ids, buffer, missing_start, decompressed_offsets) and copy:
+                        # the buffer is not shared with anything:
+                        buffer.flags.writeable = True
+                        copy = False
+                    array = buffer[start - chunks_start : stop - chunks_start]
+                    return self._as_stack(array.copy() if copy else array, z_start, z_stop)
+
+                for chunk_id in range(missing[0], missing[-1] + 1):
+                    chunks[chunk_id] = buffer[
+                        decompressed_offsets[chunk_id]
+                        - missing_start : decompressed_offsets[chunk_id + 1]
+                        - missing_start
+                    ]
+                self._cache_chunks(missing, buffer, missing_start, decompressed_offsets)
+
+        if len(chunk_ids) == 1:
+            chunk = chunks[chunk_ids.start]
+            chunk_start = int(decompressed_offsets[chunk_ids.start])
+            array = chunk[start - chunk_start : stop - chunk_start]
+            return self._as_stack(array.copy() if copy else array, z_start, z_stop)
+
+        # the range spans several chunks, we copy the overlapping parts:
+        array = np.empty(stop - start, dtype=np.uint8)
+        for chunk_id in chunk_ids:
+            chunk_start = int(decompressed_offsets[chunk_id])
+            begin = max(start, chunk_start)
+            end = min(stop, int(decompressed_offsets[chunk_id + 1]))
+            array[begin - start : end - start] = chunks[chunk_id][begin - chunk_start : end - chunk_start]
+        array.flags.writeable = copy
+
+        return self._as_stack(array, z_start, z_stop)
+
+    def _cache_chunks(self, chunk_ids, buffer: np.ndarray, buffer_start: int, decompressed_offsets) -> bool:
+        # Returns True if the chunks were handed to the cache.
+        if self._cache is None:
+            return False
+        for chunk_id in chunk_ids:
+            begin = int(decompressed_offsets[chunk_id]) - buffer_start
+            end = int(decompressed_offsets[chunk_id + 1]) - buffer_start
+            self._cache.put((self.file_name, chunk_id), buffer[begin:end])
+        return True
+
+    def _as_stack(self, array: np.ndarray, z_start: int, z_stop: int) -> np.ndarray:
+        return array.view(self.dtype).reshape((z_stop - z_start,) + self.shape[1:])
+
+    def __getitem__(self, item) -> np.ndarray:
+        if not isinstance(item, tuple):
+            item = (item,)
+
+        if len(item) == 0 or item[0] is Ellipsis:
+            return self.read(0, self.shape[0])[item]
+
+        z, rest = item[0], item[1:]
+
+        if isinstance(z, slice):
+            z_start, z_stop, step = z.indices(self.shape[0])
+            if step > 0:
+                z_stop = max(z_start, z_stop)
+                return self.read(z_start, z_stop)[(slice(None, None, step),) + rest]
+
+        elif np.ndim(z) == 0 and np.issubdtype(type(z), np.integer):
+            z = int(z) + self.shape[0] if z < 0 else int(z)
+            if not (0 <= z < self.shape[0]):
+                raise IndexError(f"Index {z} out of range for {self.shape[0]} z slices.")
+            return self.read(z, z + 1)[(0,) + rest]
+
+        # any other indexing decompresses the whole stack:
+        return self.read(0, self.shape[0])[item]
+
+    def __array__(self, dtype=None) -> np.ndarray:
+        return np.asarray(self[...], dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __dask_tokenize__(self):
+        return CompressedStack, self.file_name, self.shape, self.dtype.str
+
+    def __getstate__(self) -> Dict:
+        # Locks cannot be pickled
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _getitem_or_zeros(stack: CompressedStack, item) -> np.ndarray:
+    try:
+        return stack[item]
+    except FileNotFoundError:
+        aprint(f"Could not find file: {stack.file_name} for array of shape: {stack.shape}")
+        return np.array(np.broadcast_to(np.zeros((), dtype=stack.dtype), stack.shape)[item])
+
+
 class CCDataset(BaseDataset):
-    def __init__(self, path, cache_size=8e9):
+
+    # Maximum number of raw stack memory maps, and of compressed stacks with their chunk index, kept at once:
+    max_open_memmaps = 64
+
+    # Number of stacks worth of decompressed chunks kept when the stack cache is disabled, so that the z slices
+    # of a stack read one at a time do not decompress the same chunks again:
+    scratch_stacks = 2
+
+    def __init__(self, path, cache_size=2e9):
+        """Instanciates a ClearControl dataset.
+
+        Parameters
+        ----------
+        path : path of the ClearControl acquisition folder.
+        cache_size : size in bytes of the cache of decompressed stacks, 0 disables caching.
+        """
 
         super().__init__(dask_backed=False, path=path)
 
@@ -49,7 +272,13 @@ class CCDataset(BaseDataset):
         for channel in self._channels:
             self._parse_channel(channel)
 
-        self.cache = Cache(cache_size)  # Leverage two gigabytes of memory
+        self._stack_cache = StackCache(cache_size) if cache_size > 0 else None
+        max_stack_nbytes = max((np.prod(shape) * 2 for shapes in self._shapes.values() for shape in shapes), default=0)
+        self._scratch_cache = StackCache(self.scratch_stacks * int(max_stack_nbytes))
+
+        self._memmaps = OrderedDict()
+        self._compressed_stacks = OrderedDict()
+        self._memmaps_lock = threading.Lock()
 
     def _parse_channel(self, channel):
 
@@ -103,23 +332,58 @@ class CCDataset(BaseDataset):
         else:
             return raw_file_name
 
+    def _get_memmap_for_stack_file(self, file_name, shape=None, shared: bool = True) -> np.memmap:
+        # Nothing is read from disk until the array is accessed. Shared memory maps are reused and read-only,
+        # the others are copy-on-write: consumers may modify them in place without affecting the file or other reads.
+        dt = np.dtype(np.uint16)
+        dt = dt.newbyteorder("L")
+
+        if not shared:
+            return np.memmap(file_name, dtype=dt, mode="c", shape=shape)
+
+        with self._memmaps_lock:
+            key = (file_name, shape)
+            if key in self._memmaps:
+                self._memmaps.move_to_end(key)
+                return self._memmaps[key]
+
+            aprint(f"Memory mapping file: {file_name}")
+
+            array = np.memmap(file_name, dtype=dt, mode="r", shape=shape)
+
+            self._memmaps[key] = array
+            if len(self._memmaps) > self.max_open_memmaps:
+                self._memmaps.popitem(last=False)
+
+            return array
+
+    def _get_compressed_stack_for_stack_file(self, file_name, shape) -> CompressedStack:
+        # Compressed stacks are reused so that their chunk index and last decompressed chunks are too:
+        with self._memmaps_lock:
+            key = (file_name, tuple(shape))
+            if key in self._compressed_stacks:
+                self._compressed_stacks.move_to_end(key)
+                return self._compressed_stacks[key]
+
+            cache = self._scratch_cache if self._stack_cache is None else self._stack_cache
+            stack = CompressedStack(file_name, shape, dtype=np.uint16, cache=cache)
+
+            self._compressed_stacks[key] = stack
+            if len(self._compressed_stacks) > self.max_open_memmaps:
+                self._compressed_stacks.popitem(last=False)
+
+            return stack
+
     def _get_array_for_stack_file(self, file_name, shape=None, dtype=None):
 
         try:
             if file_name.endswith(".raw"):
-                aprint(f"Accessing file: {file_name}")
-
-                dt = np.dtype(np.uint16)
-                dt = dt.newbyteorder("L")
-
-                array = np.fromfile(file_name, dtype=dt)
+                array = self._get_memmap_for_stack_file(file_name, shape, shared=False)
 
             elif file_name.endswith(".blc"):
-                array = np.empty(shape=shape, dtype=dtype)
-                with open(file_name, "rb") as binary_file:
-                    # Read the whole file at once
-                    data = binary_file.read()
-                    decompress_array(data, array)
+                # Decompressed chunks are cached, consumers get their own writable copy:
+                stack = self._get_compressed_stack_for_stack_file(file_name, shape)
+                array = stack.read(0, stack.shape[0], copy=True)
 
             # Reshape array:
             if shape is not None:
@@ -135,17 +399,9 @@ class CCDataset(BaseDataset):
 
         try:
             if file_name.endswith(".raw"):
-                aprint(f"Accessing file: {file_name} at z={z}")
-
-                length = shape[1] * shape[2] * np.dtype(np.uint16).itemsize
-                offset = z * length
-
-                dt = np.dtype(np.uint16)
-                dt = dt.newbyteorder("L")
-
-                array = np.fromfile(file_name, offset=offset, count=length, dtype=dt)
+                array = np.array(self._get_memmap_for_stack_file(file_name, shape)[z])
             elif file_name.endswith(".blc"):
-                raise NotImplementedError("This type of access is not yet supported")
+                array = self._get_compressed_stack_for_stack_file(file_name, shape).read(z, z + 1, copy=True)
 
             array = array.reshape(shape[1:])
             return array
@@ -154,9 +410,27 @@ class CCDataset(BaseDataset):
             aprint(f"Could  not find file: {file_name} for array of shape: {shape} at z={z}")
             return np.zeros(shape[1:], dtype=np.uint16)
 
+    def _get_lazy_compressed_stack(self, file_name, shape) -> array.Array:
+        # Dask array of the compressed stack, one chunk per z slice, decompressed on access. Nothing is read from disk
+        # until then, not even the chunk index, missing stack files read as zeros:
+        stack = self._get_compressed_stack_for_stack_file(file_name, shape)
+        return array.from_array(
+            stack,
+            chunks=(1,) + tuple(shape[1:]),
+            asarray=False,
+            getitem=_getitem_or_zeros,
+            meta=np.empty((0,) * len(shape), dtype=stack.dtype),
+        )
+
+    def set_stack_cache(self, cache: Optional[StackCache]) -> None:
+        super().set_stack_cache(cache)
+        # compressed stacks are recreated with the new cache:
+        with self._memmaps_lock:
+            self._compressed_stacks.clear()
+
     def close(self):
-        # Nothing to do...
-        pass
+        if self._stack_cache is not None and self._stack_cache.hits + self._stack_cache.misses > 0:
+            aprint(f"Stack cache: {self._stack_cache}")
 
     def channels(self) -> List[str]:
         return list(self._channels)
@@ -191,14 +465,24 @@ class CCDataset(BaseDataset):
         # Lazy and memorized version of get_stack:
         lazy_get_stack = delayed(self.get_stack, pure=True)
 
-        # Lazily load each stack for each time point:
-        lazy_stacks = [lazy_get_stack(channel, time_point, per_z_slice) for time_point in self._time_points[channel]]
+        if per_z_slice and self._is_compressed:
+            # Compressed stacks are decompressed per z slice, only the chunks covering the slices accessed are read:
+            arrays = [
+                self._get_lazy_compressed_stack(
+                    self._get_stack_file_name(channel, time_point), self._shapes[channel][time_point]
+                )
+                for time_point in self._time_points[channel]
+            ]
+
+        else:
+            # Lazily load each stack for each time point, raw stacks are memory mapped and sliced without copies:
+            lazy_stacks = [lazy_get_stack(channel, time_point, False) for time_point in self._time_points[channel]]
 
-        # Construct a small Dask array for every lazy value:
-        arrays = [
-            array.from_delayed(lazy_stack, dtype=np.uint16, shape=self._channel_shape[channel])
-            for lazy_stack in lazy_stacks
-        ]
+            # Construct a small Dask array for every lazy value:
+            arrays = [
+                array.from_delayed(lazy_stack, dtype=np.uint16, shape=self._channel_shape[channel])
+                for lazy_stack in lazy_stacks
+            ]
 
         stacked_array = array.stack(arrays, axis=0)  # Stack all small Dask arrays into one
 
@@ -209,18 +493,13 @@ class CCDataset(BaseDataset):
         file_name = self._get_stack_file_name(channel, time_point)
         shape = self._shapes[channel][time_point]
 
-        if per_z_slice and not self._is_compressed:
-
-            lazy_get_slice_array_for_stack_file_and_z = delayed(
-                self.cache.memoize(self._get_slice_array_for_stack_file_and_z), pure=True
-            )
-
-            # Lazily load each stack for each time point:
-            lazy_stacks = [lazy_get_slice_array_for_stack_file_and_z(file_name, shape, z) for z in range(0, shape[0])]
-
-            arrays = [array.from_delayed(lazy_stack, dtype=np.uint16, shape=shape[1:]) for lazy_stack in lazy_stacks]
+        if per_z_slice and self._is_compressed:
+            stack = self._get_lazy_compressed_stack(file_name, shape)
 
-            stack = array.stack(arrays, axis=0)
+        elif (per_z_slice or wrap_with_dask) and not self._is_compressed:
+            # Dask array of the memory map, one chunk per z slice, only the slices accessed are read from disk:
+            stack = self._get_array_for_stack_file(file_name, shape=shape, dtype=np.uint16)
+            stack = array.from_array(stack, chunks=(1,) + shape[1:] if per_z_slice else shape)
 
         else:
             stack = self._get_array_for_stack_file(file_name, shape=shape, dtype=np.uint16)
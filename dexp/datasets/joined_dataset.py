@@ -1,10 +1,11 @@
-from typing import Any, List, Sequence, Tuple
+from typing import Any, List, Optional, Sequence, Tuple
 
 import numpy
 from arbol.arbol import aprint
 from dask.array import concatenate
 
 from dexp.datasets.base_dataset import BaseDataset
+from dexp.datasets.stack_cache import StackCache
 
 # Configure multithreading for Dask:
 
@@ -81,6 +82,11 @@ class JoinedDataset(BaseDataset):
         for dataset in self._dataset_list:
             dataset.close()
 
+    def set_stack_cache(self, cache: Optional[StackCache]) -> None:
+        super().set_stack_cache(cache)
+        for dataset in self._dataset_list:
+            dataset.set_stack_cache(cache)
+
     def check_integrity(self, channels: Sequence[str] = None) -> bool:
         for dataset in self._dataset_list:
             if not dataset.check_integrity(channels):
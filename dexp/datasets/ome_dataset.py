@@ -1,8 +1,31 @@
-from typing import Dict, List, Sequence
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
+import zarr
 from ome_zarr.format import CurrentFormat
 
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend, CupyBackend
+
+
+def _downscale_method(gpu: bool) -> Tuple[Callable, str, str]:
+    # imported on demand, scikit-image is slow to import and only needed to convert to OME zarr:
+    if gpu:
+        try:
+            from cucim import __version__ as sk_version
+            from cucim.skimage.transform import downscale_local_mean
+
+            return downscale_local_mean, "cucim.skimage.transform.downscale_local_mean", sk_version
+
+        except ImportError:
+            pass
+
+    from skimage import __version__ as sk_version
+    from skimage.transform import downscale_local_mean
+
+    return downscale_local_mean, "skimage.transform.downscale_local_mean", sk_version
+
 
 def default_omero_metadata(name: str, channels: Sequence[str], dtype: np.dtype) -> Dict:
     val_max = 1.0 if np.issubdtype(dtype, np.floating) else np.iinfo(dtype).max
@@ -34,3 +57,116 @@ def create_coord_transform(scales: List[float], factor: float = 1) -> List:
             "scale": scales,
         }
     ]
+
+
+class OMEZarrPyramid:
+    def __init__(
+        self,
+        path: str,
+        shape: Sequence[int],
+        dtype: np.dtype,
+        channels: Sequence[str],
+        resolution: Sequence[float],
+        n_scales: int = 3,
+        name: Optional[str] = None,
+        max_chunk_size: int = 2**27,
+        overwrite: bool = True,
+    ):
+        """
+        Multi-scale (OME-Zarr) pyramid of a dataset whose channels have the same shape, written one stack at a time.
+        Each level is downscaled by 2 from the previous one (local mean), not from the full resolution stack.
+        Time points and channels are chunked one by one, so that stacks of different (time point, channel) are written
+        to different chunks and can be written concurrently, e.g. by a pool of workers or by background writes.
+
+        Parameters
+        ----------
+        path : path of the OME-Zarr store (nested directory store).
+        shape : shape of the channels (t, z, y, x).
+        dtype : dtype of the pyramid.
+        channels : names of the channels.
+        resolution : resolution of the time and spatial axes (dt, dz, dy, dx).
+        n_scales : number of levels, including the full resolution.
+        name : name of the dataset, in the omero metadata.
+        max_chunk_size : maximum size in bytes of the chunks, chunks span whole planes.
+        overwrite : if True an existing store is overwritten, otherwise it is opened and levels are reused.
+        """
+        self.path = str(path)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.channels = list(channels)
+        self.n_scales = n_scales
+
+        group = zarr.open_group(zarr.NestedDirectoryStore(self.path), mode="w" if overwrite else "a")
+
+        self.arrays: List[zarr.Array] = []
+        datasets = []
+        for i in range(n_scales):
+            factor = 2**i
+            level_shape = (self.shape[0], len(self.channels)) + tuple(
+                int(math.ceil(s / factor)) for s in self.shape[1:]
+            )
+            self.arrays.append(
+                group.require_dataset(
+                    f"{i}",
+                    shape=level_shape,
+                    dtype=self.dtype,
+                    chunks=(1, 1) + self._plane_chunks(level_shape[2:], max_chunk_size),
+                )
+            )
+            datasets.append({"path": f"{i}", "coordinateTransformations": create_coord_transform(resolution, factor)})
+
+        _, downscale_method, sk_version = _downscale_method(gpu=False)
+        group.attrs["multiscales"] = [
+            {
+                "version": CurrentFormat().version,
+                "datasets": datasets,
+                "axes": [
+                    {"name": "t", "type": "time"},
+                    {"name": "c", "type": "channel"},
+                    {"name": "z", "type": "space", "unit": "micrometer"},
+                    {"name": "y", "type": "space", "unit": "micrometer"},
+                    {"name": "x", "type": "space", "unit": "micrometer"},
+                ],
+                "type": "local_mean",
+                "metadata": {
+                    "method": downscale_method,
+                    "version": sk_version,
+                },
+            }
+        ]
+        group.attrs["omero"] = default_omero_metadata(self.path if name is None else name, self.channels, self.dtype)
+
+    def _plane_chunks(self, shape: Sequence[int], max_chunk_size: int) -> Tuple[int, ...]:
+        # chunks span whole planes, as many as fit in the maximum chunk size:
+        plane_size = self.dtype.itemsize * int(np.prod(shape[1:]))
+        depth = max(1, min(shape[0], max_chunk_size // max(1, plane_size)))
+        return (depth,) + tuple(shape[1:])
+
+    def write(self, time_point: int, channel: Union[int, str], stack: xpArray) -> None:
+        """
+        Writes a stack and its downscaled levels, computed with the current backend.
+        Thread safe for stacks of different time points or channels.
+
+        Parameters
+        ----------
+        time_point : time point of the stack.
+        channel : channel of the stack, name or index.
+        stack : full resolution stack.
+        """
+        c = self.channels.index(channel) if isinstance(channel, str) else channel
+        xp = Backend.get_xp_module()
+        downscale_local_mean, _, _ = _downscale_method(gpu=isinstance(Backend.current(), CupyBackend))
+
+        self.arrays[0][time_point, c] = Backend.to_numpy(stack, dtype=self.dtype)
+
+        # levels are cascaded in floating point, so that rounding does not accumulate:
+        level = Backend.to_backend(stack, dtype=xp.float32)
+        for array in self.arrays[1:]:
+            level = downscale_local_mean(level, (2,) * level.ndim)
+            array[time_point, c] = Backend.to_numpy(self._cast(level, xp))
+
+    def _cast(self, level: xpArray, xp) -> xpArray:
+        if np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            return xp.clip(xp.rint(level), info.min, info.max).astype(self.dtype)
+        return level.astype(self.dtype)
@@ -1,11 +1,12 @@
 from pathlib import Path
 
+import numpy as np
 import pytest
 from arbol import asection
 
 from dexp.cli.parsing import parse_devices
 from dexp.datasets import ZDataset
-from dexp.datasets.operations.denoise import dataset_denoise
+from dexp.datasets.operations.denoise import CALIBRATION_METADATA_KEY, dataset_denoise
 from dexp.utils.testing.testing import cupy_only
 
 
@@ -50,6 +51,29 @@ def test_dataset_denoise(dexp_nuclei_background_data, tmp_path: Path, display_te
     out_ds.close()
 
 
+def test_dataset_denoise_cpu(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    array = rng.normal(100, 10, size=(3, 8, 24, 24)).astype(np.float32)
+
+    in_ds = ZDataset(tmp_path / "in_ds.zarr", mode="w")
+    in_ds.add_channel("channel", shape=array.shape, dtype=array.dtype)
+    in_ds.write_array("channel", array)
+
+    # calibrations of time points 0 and 2, the parameters of time point 1 are interpolated:
+    out_ds = ZDataset(tmp_path / "out_ds.zarr", mode="w")
+    dataset_denoise(in_ds, out_ds, channels=["channel"], tilesize=320, devices="threads:1", calibration_interval=2)
+
+    calibrations = out_ds.get_metadata()[CALIBRATION_METADATA_KEY]["channel"]
+    assert sorted(calibrations) == ["0", "2"]
+
+    denoised = np.asarray(out_ds.get_array("channel"))
+    assert denoised.shape == array.shape
+    assert denoised.std() < array.std()
+
+    in_ds.close()
+    out_ds.close()
+
+
 if __name__ == "__main__":
     from dexp.utils.testing import test_as_demo
 
@@ -0,0 +1,33 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from dexp.datasets import ZDataset
+from dexp.datasets.operations.generic import dataset_generic
+from dexp.utils.backends import Backend, NumpyBackend
+from dexp.utils.testing.testing import local_cluster_only
+
+
+def _double(stack: np.ndarray) -> np.ndarray:
+    # CPU workers run with the numpy backend and their share of the cores:
+    assert isinstance(Backend.current(), NumpyBackend)
+    assert os.environ["OMP_NUM_THREADS"] == str(max(1, os.cpu_count() // 2))
+    return stack * 2
+
+
+@local_cluster_only
+def test_dataset_generic_cpu(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 1000, size=(4, 8, 16, 16)).astype(np.uint16)
+
+    in_ds = ZDataset(tmp_path / "in_ds.zarr", mode="w")
+    in_ds.add_channel("channel", shape=array.shape, dtype=array.dtype)
+    in_ds.write_array("channel", array)
+
+    out_ds = ZDataset(tmp_path / "out_ds.zarr", mode="w")
+    dataset_generic(in_ds, out_ds, channels=["channel"], func=_double, tilesize=None, devices="cpu:2")
+    out_ds.close()
+
+    out_ds = ZDataset(tmp_path / "out_ds.zarr", mode="r")
+    np.testing.assert_array_equal(np.asarray(out_ds.get_array("channel")), array * 2)
@@ -1,16 +1,15 @@
-from typing import Callable, Dict, Optional, Sequence
+from typing import Callable, Dict, Optional, Sequence, Union
 
 import dask
 import numpy as np
-from arbol import aprint, asection, section
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
+from arbol import asection, section
 from toolz import curry, reduce
 
 from dexp.datasets import BaseDataset, ZDataset
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.processing.crop.background import foreground_mask
 from dexp.utils.backends.cupy_backend import CupyBackend
+from dexp.utils.dask import DaskExecutor
 
 
 @dask.delayed
@@ -56,10 +55,9 @@ def dataset_background(
     channels: Sequence[str],
     reference_channel: Optional[str],
     merge_channels: bool,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
     **kwargs,
 ) -> None:
-    lazy_computations = []
 
     if reference_channel is not None and merge_channels:
         raise ValueError("`reference_channel` cannot be supplied with `merge_channels` option.")
@@ -79,13 +77,16 @@ def dataset_background(
     for ch in channels:
         output_dataset.add_channel(ch, input_dataset.shape(ch), input_dataset.dtype(ch))
 
-    lazy_computations = [process(time_point=t) for t in range(max_t)]
+    # when resuming, time points are processed if any of their channels is not yet written:
+    remaining = {ch: set(output_dataset.time_points_to_process(ch, range(len(arrays[ch])))) for ch in channels}
+    time_points = [t for t in range(max_t) if any(int(round(t / time_scale[ch])) in remaining[ch] for ch in channels)]
 
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask client", client)
+    # time points are processed with all their channels at once:
+    lazy_computations = {t: process(time_point=t) for t in time_points}
 
     # Compute everything
-    dask.compute(*lazy_computations)
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset, output_dataset)
+        executor.compute(lazy_computations)
 
     output_dataset.check_integrity()
@@ -54,14 +54,18 @@ def dataset_copy(
 
             aprint(f"Slicing with: {array.slicing}")
             output_dataset.add_channel(name=channel, shape=array.shape, dtype=array.dtype)
+            time_points = output_dataset.time_points_to_process(channel, range(len(array)))
+            array.set_order(time_points)
 
             if workers == 1:
-                for i in range(len(array)):
+                for i in time_points:
                     process(i)
             else:
-                n_jobs = compute_num_workers(workers, len(array))
+                n_jobs = compute_num_workers(workers, len(time_points))
                 parallel = Parallel(n_jobs=n_jobs, backend=workersbackend)
-                parallel(delayed(process)(i) for i in range(len(array)))
+                parallel(delayed(process)(i) for i in time_points)
+
+        array.close()
 
         if isinstance(input_dataset, CCDataset):
             time = input_dataset.time_sec(channel).tolist()
@@ -1,4 +1,4 @@
-from typing import Sequence, Tuple
+from typing import Optional, Sequence, Tuple
 
 import numpy as np
 import zarr
@@ -11,27 +11,30 @@ from toolz import curry
 from dexp.datasets import BaseDataset
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.datasets.zarr_dataset import ZDataset
-from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolve import FFTConvolver
 from dexp.utils.backends import Backend, BestBackend
 from dexp.utils.misc import compute_num_workers
 
 
-def _estimate_crop(array: ArrayLike, quantile: float) -> Sequence[Tuple[int]]:
+def _estimate_crop(
+    array: ArrayLike, quantile: float, convolver: Optional[FFTConvolver] = None
+) -> Tuple[Sequence[Tuple[int]], FFTConvolver]:
     window_size = 15
     step = 4
     shape = array.shape
-    with BestBackend():
-        xp = Backend.get_xp_module()
-        array = Backend.to_backend(array[::step, ::step, ::step], dtype=xp.float16)
-        array = xp.clip(array - xp.mean(array), 0, None)  # removing background noise
+    xp = Backend.get_xp_module()
+    array = Backend.to_backend(array[::step, ::step, ::step], dtype=xp.float16)
+    array = xp.clip(array - xp.mean(array), 0, None)  # removing background noise
+    if convolver is None or convolver.image_shape != array.shape:
         kernel = xp.ones((window_size, window_size, window_size)) / (window_size**3)
         kernel = kernel.astype(xp.float16)
-        array = fft_convolve(array, kernel, in_place=True)
-        lower = xp.quantile(array, quantile)
-        aprint("Estimated lower threshold", lower)
-        array = array > lower
-        array, _ = ndi.label(Backend.to_numpy(array))
-        slices = ndi.find_objects(array)
+        convolver = FFTConvolver(array.shape, kernel)
+    array = convolver(array)
+    lower = xp.quantile(array, quantile)
+    aprint("Estimated lower threshold", lower)
+    array = array > lower
+    array, _ = ndi.label(Backend.to_numpy(array))
+    slices = ndi.find_objects(array)
 
     largest_slice = None
     largest_size = 0
@@ -44,15 +47,24 @@ def _estimate_crop(array: ArrayLike, quantile: float) -> Sequence[Tuple[int]]:
     if largest_slice is None:
         raise RuntimeError("Could not detect any objects")
 
-    return tuple(
+    crop = tuple(
         (s.start * step, min(s.stop * step, d))  # fixing possible mismatch due to step
         for s, d in zip(largest_slice, shape)
     )
+    return crop, convolver
 
 
 def compute_crop_slicing(array: zarr.Array, time_points: Sequence[int], quantile: float) -> Sequence[slice]:
+    # the convolver (padded shape, kernel spectrum and buffer) is shared by the time points:
+    ranges = []
+    convolver = None
+    with BestBackend():
+        for t in time_points:
+            crop, convolver = _estimate_crop(array[t], quantile, convolver)
+            ranges.append(crop)
+
     # N x D x 2
-    ranges = np.array(tuple(_estimate_crop(array[t], quantile) for t in time_points))
+    ranges = np.array(ranges)
     lower = np.min(ranges[..., 0], axis=0)
     upper = np.max(ranges[..., 1], axis=0)
     return tuple(slice(int(l), int(u)) for l, u in zip(lower, upper))
@@ -96,14 +108,15 @@ def dataset_crop(
             array = input_dataset[channel]
             output_dataset.add_channel(name=channel, shape=array.shape, dtype=array.dtype)
             process = _process(array=array, output_dataset=output_dataset, channel=channel)
+            time_points = output_dataset.time_points_to_process(channel, range(len(array)))
 
             if workers == 1:
-                for i in range(len(array)):
+                for i in time_points:
                     process(i)
             else:
-                n_jobs = compute_num_workers(workers, len(array))
+                n_jobs = compute_num_workers(workers, len(time_points))
                 parallel = Parallel(n_jobs=n_jobs)
-                parallel(delayed(process)(i) for i in range(len(array)))
+                parallel(delayed(process)(i) for i in time_points)
 
     # Dataset info:
     aprint(output_dataset.info())
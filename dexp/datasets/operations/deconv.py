@@ -1,26 +1,25 @@
-import functools
 from pathlib import Path
-from typing import Callable, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
 
 import dask
 import numpy as np
 import scipy
 from arbol.arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
 from toolz import curry
 
 from dexp.datasets import BaseDataset
 from dexp.datasets.stack_iterator import StackIterator
+from dexp.datasets.statistics import statistics_at
 from dexp.datasets.zarr_dataset import ZDataset
 from dexp.optics.psf.standard_psfs import nikon16x08na, olympus20x10na
 from dexp.processing.deconvolution import (
     admm_deconvolution,
     lucy_richardson_deconvolution,
 )
+from dexp.processing.deconvolution.lr_deconvolution import clear_otf_cache
 from dexp.processing.filters.fft_convolve import fft_convolve
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
-from dexp.utils.backends import BestBackend
+from dexp.utils.dask import DaskExecutor, worker_backend
 
 
 def get_psf(
@@ -91,7 +90,6 @@ def get_deconv_func(
 ) -> Callable:
 
     if method == "lr" or method == "wb":
-        convolve = functools.partial(fft_convolve, in_place=False, mode="reflect", internal_dtype=np.float32)
 
         def deconv(image):
             min_value = image.min()
@@ -109,7 +107,7 @@ def get_deconv_func(
                 blind_spot_axis_exclusion=(0,),
                 wb_order=wb_order,
                 back_projection=back_projection,
-                convolve_method=convolve,
+                convolve_method=fft_convolve,
             )
 
     elif method == "admm":
@@ -138,13 +136,14 @@ def _process(
     channel: str,
     deconv_func: Callable,
     scaling: Tuple[int],
+    statistics: Optional[Dict[str, np.ndarray]] = None,
 ):
 
     with asection(f"Deconvolving time point for time point {time_point}/{len(stacks)}"):
         with asection(f"Loading channel: {channel}"):
             stack = np.asarray(stacks[time_point])
 
-        with BestBackend() as bkd:
+        with worker_backend() as bkd:
             if any(s != 1.0 for s in scaling):
                 with asection(f"Applying scaling {scaling} to image."):
                     sp = bkd.get_sp_module()
@@ -153,7 +152,7 @@ def _process(
                     stack = bkd.to_numpy(stack)
 
             with asection("Deconvolving ..."):
-                stack = deconv_func(stack)
+                stack = deconv_func(stack, statistics=statistics)
 
                 with asection("Moving array from backend to numpy."):
                     stack = bkd.to_numpy(stack, dtype=out_dataset.dtype(channel), force_copy=False)
@@ -186,7 +185,7 @@ def dataset_deconv(
     psf_z_size: int,
     psf_show: bool,
     scaling: Tuple[float],
-    devices: List[int],
+    devices: Union[str, Sequence[int]],
 ):
     aprint(f"Input images will be scaled by: (sz,sy,sx)={scaling}")
 
@@ -209,12 +208,15 @@ def dataset_deconv(
         tiles=tilesize,
         margins=margins,
         normalise=method == "admm",
+        pipelined=True,
     )
 
-    lazy_computation = []
+    lazy_computation = {}
+    iterators = []
 
     for channel in channels:
         stacks = input_dataset[channel]
+        iterators.append(stacks)
 
         out_shape = tuple(int(round(u * v)) for u, v in zip(stacks.shape, (1,) + scaling))
         dtype = np.float16 if method == "admm" else stacks.dtype
@@ -222,6 +224,11 @@ def dataset_deconv(
         # Adds destination array channel to dataset
         output_dataset.add_channel(name=channel, shape=out_shape, dtype=dtype)
 
+        # stored statistics of whole stacks (see 'dexp histogram') spare the normalisation quantiles:
+        statistics = None
+        if method == "admm" and tuple(stacks.shape[1:]) == tuple(input_dataset.shape(channel)[1:]):
+            statistics = input_dataset.get_statistics(channel)
+
         process = _process(
             stacks=stacks,
             out_dataset=output_dataset,
@@ -230,15 +237,21 @@ def dataset_deconv(
             deconv_func=deconv_func(internal_dtype=dtype),
         )
 
-        for t in range(len(stacks)):
-            lazy_computation.append(process(time_point=t))
-
-    dask.compute(*lazy_computation)
-
-    # CUDA DASK cluster
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask Client", client)
+        time_points = output_dataset.time_points_to_process(channel, range(len(stacks)))
+        stacks.set_order(time_points)
+        for t in time_points:
+            lazy_computation[(channel, t)] = process(time_point=t, statistics=statistics_at(statistics, stacks.time(t)))
+
+    try:
+        with DaskExecutor(devices) as executor:
+            executor.check_datasets(input_dataset, output_dataset)
+            executor.compute(lazy_computation)
+    finally:
+        # OTFs cached by in-process deconvolutions hold (GPU) memory, they are released with the run:
+        clear_otf_cache()
+
+    for stacks in iterators:
+        stacks.close()
 
     # Dataset info:
     aprint(output_dataset.info())
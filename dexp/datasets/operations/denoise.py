@@ -1,18 +1,32 @@
-from typing import Callable, Sequence, Tuple
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
 
 import dask
-from arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
+import numpy as np
+from arbol import asection
 from toolz import curry
 
 from dexp.datasets import BaseDataset, ZDataset
+from dexp.datasets.calibration_schedule import CalibrationSchedule
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.processing.denoising import calibrate_denoise_butterworth, denoise_butterworth
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
-from dexp.utils.backends import CupyBackend
+from dexp.utils.dask import DaskExecutor, worker_backend
 from dexp.utils.fft import clear_fft_plan_cache
 
+# Output dataset metadata storing the calibrated parameters of each channel and time point:
+CALIBRATION_METADATA_KEY = "denoise_calibration"
+
+
+@curry
+def _calibrate(time_point: int, initial_parameters: Optional[Dict], stacks: StackIterator, channel: str) -> Dict:
+    with worker_backend() as bkd:
+        with asection(f"Calibrating channel {channel} time point {time_point}"):
+            stack = bkd.to_backend(np.asarray(stacks[time_point]))
+            _, best_params = calibrate_denoise_butterworth(stack, initial_parameters=initial_parameters)
+            clear_fft_plan_cache()
+    # plain python values, to be stored as metadata
+    return {k: tuple(float(v) for v in p) if isinstance(p, tuple) else p for k, p in best_params.items()}
+
 
 @curry
 def _process(
@@ -20,17 +34,15 @@ def _process(
     out_dataset: ZDataset,
     channel: str,
     time_point: int,
+    parameters: Dict,
     scatter_gather: Callable,
 ) -> None:
 
-    with CupyBackend() as bkd:
-        with asection(f"Calibrating and denoising channel {channel} time point {time_point}"):
-            stack = bkd.to_backend(stacks[time_point])
-            _, best_params = calibrate_denoise_butterworth(stack)
-            denoise_fun = curry(denoise_butterworth, **best_params)
-
-            with asection("Denoising"):
-                denoised = scatter_gather(function=denoise_fun, image=stack)
+    with worker_backend() as bkd:
+        with asection(f"Denoising channel {channel} time point {time_point} with parameters {parameters}"):
+            stack = bkd.to_backend(np.asarray(stacks[time_point]))
+            denoise_fun = curry(denoise_butterworth, **parameters)
+            denoised = scatter_gather(function=denoise_fun, image=stack)
 
             out_dataset.write_stack(channel, time_point, bkd.to_numpy(denoised))
             clear_fft_plan_cache()
@@ -41,35 +53,69 @@ def dataset_denoise(
     output_dataset: ZDataset,
     channels: Sequence[str],
     tilesize: Tuple[int],
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
+    calibration_interval: int = 1,
+    warm_start: bool = False,
+    smoothing: int = 0,
 ):
-    # NOTE:
-    #   we might want in the future to smooth the parameters estimation over neighboring time points.
-    lazy_computations = []
-
-    for ch in channels:
-        stacks = input_dataset[ch]
-        output_dataset.add_channel(ch, stacks.shape, dtype=input_dataset.dtype(ch))
-
-        # Create processing function with default parameters
-        process = dask.delayed(
-            _process(
-                stacks=stacks,
-                out_dataset=output_dataset,
-                channel=ch,
-                scatter_gather=curry(scatter_gather_i2i, tiles=tilesize, margins=32),
+    """
+    Denoises the channels of a dataset with the Butterworth denoiser, its parameters are calibrated
+    per time point with a self-supervised loss.
+
+    Calibrated parameters are stored in the output dataset metadata, reruns (e.g. resuming) reuse them.
+
+    Parameters
+    ----------
+    input_dataset : input dataset.
+    output_dataset : output dataset.
+    channels : channels to denoise.
+    tilesize : tile size of the denoising.
+    devices : CUDA devices, 'cpu' or dask scheduler file, see `dexp.utils.dask.DaskExecutor`.
+    calibration_interval : calibrates one time point every 'calibration_interval' time points (and the last one),
+        parameters of the other time points are interpolated.
+    warm_start : each calibration starts from the parameters of the previous one, calibrations are then sequential.
+    smoothing : calibrated parameters are averaged over 'smoothing' calibrations before and after.
+    """
+    # calibrations are computed on the same cluster, its client being the default dask scheduler:
+    with DaskExecutor(devices) as executor:
+        calibrations = output_dataset.get_metadata().get(CALIBRATION_METADATA_KEY, {})
+        lazy_computations = {}
+
+        for ch in channels:
+            stacks = input_dataset[ch]
+            output_dataset.add_channel(ch, stacks.shape, dtype=input_dataset.dtype(ch))
+            time_points = output_dataset.time_points_to_process(ch, range(len(stacks)))
+            if len(time_points) == 0:
+                continue
+
+            schedule = CalibrationSchedule(
+                len(stacks),
+                every=calibration_interval,
+                warm_start=warm_start,
+                smoothing=smoothing,
+                calibrated=CalibrationSchedule.from_metadata(calibrations.get(ch)),
             )
-        )  # using 32 because Jordao assumed it's good enough and 320 (default tile) + 64 = 384
-        # has a nice prime factorization, speeding up fft computation
+            schedule.calibrate(_calibrate(stacks=stacks, channel=ch))
+            calibrations[ch] = schedule.to_metadata()
+            output_dataset.append_metadata({CALIBRATION_METADATA_KEY: calibrations})
 
-        # Stores functions to be computed
-        lazy_computations += [process(time_point=t) for t in range(len(stacks))]
+            # Create processing function with default parameters
+            process = dask.delayed(
+                _process(
+                    stacks=stacks,
+                    out_dataset=output_dataset,
+                    channel=ch,
+                    scatter_gather=curry(scatter_gather_i2i, tiles=tilesize, margins=32, pipelined=True),
+                )
+            )  # using 32 because Jordao assumed it's good enough and 320 (default tile) + 64 = 384
+            # has a nice prime factorization, speeding up fft computation
 
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask client", client)
+            # Stores functions to be computed
+            for t in time_points:
+                lazy_computations[(ch, t)] = process(time_point=t, parameters=schedule.parameters(t))
 
-    # Compute everything
-    dask.compute(*lazy_computations)
+        # Compute everything
+        executor.check_datasets(input_dataset, output_dataset)
+        executor.compute(lazy_computations)
 
     output_dataset.check_integrity()
@@ -1,10 +1,8 @@
-from typing import Callable, List, Optional, Sequence
+from typing import Callable, Optional, Sequence, Union
 
 import dask
 import fasteners
 from arbol.arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
 from toolz import curry
 
 from dexp.datasets import BaseDataset
@@ -12,6 +10,7 @@ from dexp.datasets.stack_iterator import StackIterator
 from dexp.datasets.zarr_dataset import ZDataset
 from dexp.processing.deskew import deskew_functions
 from dexp.utils.backends import BestBackend
+from dexp.utils.dask import DaskExecutor
 from dexp.utils.lock import create_lock
 
 
@@ -58,7 +57,7 @@ def dataset_deskew(
     lateral_axis: int,
     mode: str,
     padding: bool,
-    devices: List[int],
+    devices: Union[str, Sequence[int]],
 ):
     # Default flipping:
     if flips is None:
@@ -87,14 +86,16 @@ def dataset_deskew(
         padding=padding,
     )
 
-    lazy_computations = []
+    lazy_computations = {}
 
     # Iterate through channels
     for i, channel in enumerate(channels):
         stacks = input_dataset[channel]
         lock = create_lock(channel)
-        lazy_computations += [
-            _process(
+        # the channel is added by the first time point processed, if it exists we are resuming:
+        time_points = output_dataset.time_points_to_process(channel, range(len(stacks)))
+        for t in time_points:
+            lazy_computations[(channel, t)] = _process(
                 time_point=t,
                 stacks=stacks,
                 channel=channel,
@@ -102,15 +103,11 @@ def dataset_deskew(
                 output_dataset=output_dataset,
                 deskew_func=deskew_func(flip_depth_axis=flips[i]),
             )
-            for t in range(len(stacks))
-        ]
 
     # setting up dask compute scheduler
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-
-    aprint("Dask client", client)
-    dask.compute(*lazy_computations)
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset, output_dataset)
+        executor.compute(lazy_computations)
 
     # shape and dtype of views to deskew:
     output_dataset.check_integrity()
@@ -1,17 +1,16 @@
 import warnings
-from typing import Callable, Sequence
+from typing import Callable, Sequence, Union
 
 import dask
 import numpy as np
-from arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
+from arbol import asection
 from toolz import curry
 
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.datasets.zarr_dataset import ZDataset
 from dexp.processing.remove_beads import BeadsRemover
 from dexp.utils.backends.best_backend import BestBackend
+from dexp.utils.dask import DaskExecutor
 
 
 @curry
@@ -34,7 +33,7 @@ def dataset_extract_psf(
     peak_threshold: int,
     similarity_threshold: float,
     psf_size: int,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
     verbose: bool = True,
 ) -> None:
     """
@@ -44,20 +43,19 @@ def dataset_extract_psf(
     warnings.warn("This command is subpar, it should be improved.")
     dest_path = dest_path.split(".")[0]
 
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask client", client)
-
     def create_beads_remover() -> BeadsRemover:
         return BeadsRemover(
             peak_threshold=peak_threshold, similarity_threshold=similarity_threshold, psf_size=psf_size, verbose=verbose
         )
 
-    for ch in channels:
-        stacks = input_dataset[ch]
-        lazy_computations = [_process(t, stacks, create_beads_remover) for t in range(len(stacks))]
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset)
 
-        psf = np.stack(dask.compute(*lazy_computations)).mean(axis=0)
-        np.save(dest_path + ch + ".npy", psf)
+        for ch in channels:
+            stacks = input_dataset[ch]
+            lazy_computations = {
+                (ch, t): dask.delayed(_process)(t, stacks, create_beads_remover) for t in range(len(stacks))
+            }
 
-    client.close()
+            psf = np.stack(list(executor.compute(lazy_computations).values())).mean(axis=0)
+            np.save(dest_path + ch + ".npy", psf)
@@ -67,14 +67,15 @@ def dataset_fromraw(
     for ch in channels:
         out_dataset.add_channel(ch, in_dataset.shape(argmin), in_dataset.dtype(ch))
         write_fun = _write(in_dataset, out_dataset, ch, np.where(ch_to_mask[ch])[0])
+        time_points = out_dataset.time_points_to_process(ch, range(min_time_pts))
 
         if workers == 1:
-            for i in range(min_time_pts):
+            for i in time_points:
                 write_fun(i)
         else:
-            n_jobs = compute_num_workers(workers, min_time_pts)
+            n_jobs = compute_num_workers(workers, len(time_points))
             parallel = Parallel(n_jobs=n_jobs)
-            parallel(delayed(write_fun)(i) for i in range(min_time_pts))
+            parallel(delayed(write_fun)(i) for i in time_points)
 
     aprint(out_dataset.info())
     out_dataset.check_integrity()
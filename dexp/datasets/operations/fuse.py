@@ -1,11 +1,9 @@
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import dask
 import numpy as np
 from arbol.arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
 from toolz import curry
 
 from dexp.datasets import BaseDataset, ZDataset
@@ -21,6 +19,7 @@ from dexp.processing.registration.model.pairwise_registration_model import (
 )
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend, BestBackend
+from dexp.utils.dask import DaskExecutor
 
 
 def load_registration_models(model_list_filename: Path, n_time_pts: int) -> Sequence[PairwiseRegistrationModel]:
@@ -211,7 +210,7 @@ def dataset_fuse(
     white_top_hat_size: float,
     white_top_hat_sampling: int,
     remove_beads: bool,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
 ):
 
     views = {channel.split("-")[-1]: input_dataset[channel] for channel in channels}
@@ -269,26 +268,37 @@ def dataset_fuse(
 
     output_models = [model]
 
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask Client", client)
-
-    lazy_computations = []
-    for t in range(1, n_time_pts):
-        lazy_computations.append(
-            dask.delayed(_process)(
-                time_point=t,
-                views=views,
-                out_dataset=output_dataset,
-                fusion_func=fusion_func(equalisation_ratios=equalisation_ratios, model=models[t] if loadreg else None),
-            )
+    # the first time point is always computed, it provides the equalisation ratios of the remaining ones:
+    time_points = output_dataset.time_points_to_process("fused", range(1, n_time_pts))
+    for view in views.values():
+        view.set_order(time_points)
+
+    lazy_computations = {}
+    for t in time_points:
+        lazy_computations[t] = dask.delayed(_process)(
+            time_point=t,
+            views=views,
+            out_dataset=output_dataset,
+            fusion_func=fusion_func(equalisation_ratios=equalisation_ratios, model=models[t] if loadreg else None),
         )
 
     # compute remaining stacks and save models
-    output_models += [output[1] for output in dask.compute(*lazy_computations)]
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset, output_dataset)
+        outputs = executor.compute(lazy_computations)
+    output_models += [outputs[t][1] for t in time_points]
+
+    for view in views.values():
+        view.close()
 
     if not loadreg and output_models[0] is not None:
-        model_list_to_file(model_list_filename, output_models)
+        if len(output_models) < n_time_pts:
+            aprint(
+                "WARNING: Registration models of skipped time points are unknown, "
+                + f"'{model_list_filename}' is not saved."
+            )
+        else:
+            model_list_to_file(model_list_filename, output_models)
 
     aprint(output_dataset.info())
 
@@ -1,15 +1,14 @@
-from typing import Callable, Optional, Sequence, Tuple
+from typing import Callable, Optional, Sequence, Tuple, Union
 
 import dask
-from arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
+import numpy as np
+from arbol import asection
 from toolz import curry
 
 from dexp.datasets import BaseDataset, ZDataset
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
-from dexp.utils.backends import CupyBackend
+from dexp.utils.dask import DaskExecutor, worker_backend
 
 
 @dask.delayed
@@ -22,9 +21,9 @@ def _process(
     func: Callable,
 ) -> None:
 
-    with CupyBackend() as bkd:
+    with worker_backend() as bkd:
         with asection(f"Applying {func.__name__} for channel {channel} at time point {time_point}"):
-            stack = bkd.to_backend(stacks[time_point])
+            stack = bkd.to_backend(np.asarray(stacks[time_point]))
             stack = func(stack)
             out_dataset.write_stack(channel, time_point, bkd.to_numpy(stack))
 
@@ -35,12 +34,12 @@ def dataset_generic(
     channels: Sequence[str],
     func: Callable,
     tilesize: Optional[Tuple[int]],
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
 ) -> None:
-    lazy_computations = []
+    lazy_computations = {}
 
     if tilesize is not None:
-        func = curry(scatter_gather_i2i, function=func, tiles=tilesize, margins=32)
+        func = curry(scatter_gather_i2i, function=func, tiles=tilesize, margins=32, pipelined=True)
 
     for ch in channels:
         stacks = input_dataset[ch]
@@ -49,13 +48,12 @@ def dataset_generic(
         process = _process(stacks=stacks, out_dataset=output_dataset, channel=ch, func=func)
 
         # Stores functions to be computed
-        lazy_computations += [process(time_point=t) for t in range(len(stacks))]
-
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask client", client)
+        for t in output_dataset.time_points_to_process(ch, range(len(stacks))):
+            lazy_computations[(ch, t)] = process(time_point=t)
 
     # Compute everything
-    dask.compute(*lazy_computations)
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset, output_dataset)
+        executor.compute(lazy_computations)
 
     output_dataset.check_integrity()
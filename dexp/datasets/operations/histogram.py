@@ -1,14 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import Dict, Optional, Sequence
 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.backends.backend_pdf import PdfPages
-from matplotlib.colors import LogNorm
-from tqdm import tqdm
-
-from dexp.datasets import BaseDataset
+import zarr
+from arbol import aprint, asection
+
+from dexp.datasets import BaseDataset, ZDataset
+from dexp.datasets.statistics import (
+    DEFAULT_NUM_BINS,
+    DEFAULT_QUANTILES,
+    read_statistics,
+    stack_statistics,
+    write_statistics,
+)
 from dexp.utils.backends import BestBackend
+from dexp.utils.misc import compute_num_workers
 
 
 def dataset_histogram(
@@ -18,58 +25,130 @@ def dataset_histogram(
     device: int,
     minimum_count: int,
     maximum_count: Optional[float],
-):
-
+    workers: int = 1,
+    num_bins: int = DEFAULT_NUM_BINS,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    plot: bool = True,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Computes the histogram, quantiles, min, max, mean and standard deviation of each time point of the given channels,
+    on the backend and in parallel over time points. Statistics are stored in the dataset for writable zarr datasets
+    (see `ZDataset.get_statistics`), in a 'statistics.zarr' store in the output directory otherwise
+    (read only, non zarr or sliced datasets).
+
+    Parameters
+    ----------
+    dataset : dataset to compute statistics of
+    output_dir : output directory of the plots and of the statistics of non zarr datasets
+    channels : channels to compute statistics of
+    device : CUDA device id
+    minimum_count : plotted histograms are cut after the last value with at least this count
+    maximum_count : plotted counts are clipped to this value, None disables clipping
+    workers : number of threads computing time points concurrently, negative numbers n mean number_of_cores / |n|
+    num_bins : number of histogram bins for floating point and large integer channels
+    quantiles : quantile levels to store
+    plot : if True, histograms are plotted from the stored statistics into a pdf per channel
+
+    Returns
+    -------
+    Statistics of each channel, see `dexp.datasets.statistics.read_statistics`.
+    """
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
 
-    for channel in channels:
-        histograms = []
-
-        data_dir = output_dir / f"{channel}_data"
-        data_dir.mkdir(exist_ok=True)
-
-        with PdfPages(output_dir / f"histograms_{channel}.pdf") as pdf:
-
-            with BestBackend(device_id=device) as bkd:
-
-                for i, stack in tqdm(enumerate(dataset[channel]), f"Computing Histogram of {channel}"):
-                    stack = bkd.to_backend(stack)
-                    hist = np.bincount(stack.flatten())
+    in_dataset = isinstance(dataset, ZDataset) and dataset.slicing is None and not dataset.read_only
+    if not in_dataset:
+        store = zarr.open_group(str(output_dir / "statistics.zarr"), mode="a")
 
-                    if minimum_count > 1:
-                        (non_zero,) = np.nonzero(hist < minimum_count)
-                        hist = hist[: non_zero.max()]
+    def _compute(array, time_point: int) -> Dict[str, np.ndarray]:
+        with BestBackend(device_id=device):
+            return stack_statistics(np.asarray(array[time_point]), quantiles=quantiles, num_bins=num_bins)
 
-                    if maximum_count is not None:
-                        hist = np.clip(hist, a_min=None, a_max=int(maximum_count))
-
-                    hist = bkd.to_numpy(hist)
-
-                    np.save(data_dir / f"{channel}_{i}.npy", hist)
-                    histograms.append(hist)
-
-                max_length = max(len(h) for h in histograms)
-                max_count = max(h.max() for h in histograms)
-                hist_2d = np.zeros((len(histograms), max_length), dtype=int)
-
-                for i, hist in enumerate(histograms):
-                    hist_2d[i, : len(hist)] += hist
-
-                    plt.figure(figsize=(5, 5))
-                    plt.bar(np.arange(len(hist)), hist, width=1)
-                    plt.title(f"Histogram of {channel} and index {i}.")
-                    plt.ylabel("Count")
-                    plt.yscale("log")
-                    plt.ylim(top=max_count)
-                    plt.xlim(0, max_length)
-                    plt.xlabel("Image intensity")
-                    pdf.savefig()
-                    plt.close()
-
-                plot = plt.imshow(hist_2d, cmap="viridis", norm=LogNorm(), aspect="auto")
-                plt.ylabel("Time")
-                plt.xlabel("Intensity")
-                plt.colorbar(plot, label="Count")
-                pdf.savefig()
-                plt.close()
+    all_statistics = {}
+    for channel in channels:
+        array = dataset[channel]
+        num_time_points = len(array)
+
+        with asection(f"Computing statistics of channel '{channel}' over {num_time_points} time points"):
+            n_jobs = compute_num_workers(workers, num_time_points)
+            with ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="histogram") as executor:
+                results = executor.map(lambda t: _compute(array, t), range(num_time_points))
+
+                # statistics are written from this thread only, time points may share chunks:
+                for time_point, statistics in enumerate(results):
+                    if in_dataset:
+                        dataset.write_statistics(channel, time_point, statistics, quantiles)
+                    else:
+                        write_statistics(
+                            store.require_group(channel), time_point, num_time_points, statistics, quantiles
+                        )
+                    aprint(
+                        f"Time point {time_point}: min={statistics['min']:.4g}, max={statistics['max']:.4g}, "
+                        + f"mean={statistics['mean']:.4g}, std={statistics['std']:.4g}"
+                    )
+            array.close()
+
+        statistics = dataset.get_statistics(channel) if in_dataset else read_statistics(store[channel])
+        all_statistics[channel] = statistics
+
+        if plot:
+            plot_histograms(statistics, channel, output_dir / f"histograms_{channel}.pdf", minimum_count, maximum_count)
+
+    return all_statistics
+
+
+def plot_histograms(
+    statistics: Dict[str, np.ndarray],
+    channel: str,
+    path: Path,
+    minimum_count: int = 1,
+    maximum_count: Optional[float] = None,
+) -> None:
+    """
+    Plots the stored histograms of a channel into a pdf: one page per time point and a time versus intensity page.
+
+    Parameters
+    ----------
+    statistics : statistics read by `dexp.datasets.statistics.read_statistics`
+    channel : channel name, for the titles
+    path : path of the pdf file
+    minimum_count : histograms are cut after the last bin with at least this count
+    maximum_count : counts are clipped to this value, None disables clipping
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.colors import LogNorm
+
+    histograms = statistics["histogram"][statistics["computed"]]
+    ranges = statistics["histogram_range"][statistics["computed"]]
+    if len(histograms) == 0:
+        aprint(f"No statistics to plot for channel '{channel}'.")
+        return
+
+    # bins beyond the last one with enough counts are not plotted:
+    (significant,) = np.nonzero((histograms >= max(1, minimum_count)).any(axis=0))
+    length = significant.max() + 1 if len(significant) > 0 else histograms.shape[1]
+    start = significant.min() if len(significant) > 0 and statistics["exact"] else 0
+    histograms = histograms[:, start:length]
+    if maximum_count is not None:
+        histograms = np.clip(histograms, a_min=None, a_max=int(maximum_count))
+    max_count = histograms.max()
+
+    with PdfPages(path) as pdf:
+        for i, (hist, (first, width)) in enumerate(zip(histograms, ranges)):
+            plt.figure(figsize=(5, 5))
+            plt.bar(first + width * np.arange(start, length), hist, width=width, align="edge")
+            plt.title(f"Histogram of {channel} and index {i}.")
+            plt.ylabel("Count")
+            plt.yscale("log")
+            plt.ylim(top=max(1, max_count))
+            plt.xlabel("Image intensity")
+            pdf.savefig()
+            plt.close()
+
+        plot = plt.imshow(np.maximum(histograms, 1), cmap="viridis", norm=LogNorm(), aspect="auto")
+        plt.ylabel("Time")
+        plt.xlabel("Intensity bin" if not statistics["exact"] else f"Intensity - {start + ranges[0, 0]:g}")
+        plt.colorbar(plot, label="Count")
+        pdf.savefig()
+        plt.close()
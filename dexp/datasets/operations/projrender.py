@@ -1,18 +1,16 @@
 from pathlib import Path
-from typing import Callable, Sequence
+from typing import Callable, Sequence, Union
 
 import dask
 import imageio
 import numpy as np
 from arbol.arbol import aprint, asection
-from dask.distributed import Client
 from toolz import curry
 
 from dexp.datasets import BaseDataset
 from dexp.datasets.stack_iterator import StackIterator
 from dexp.processing.color.projection import project_image
-from dexp.utils.backends import BestBackend
-from dexp.utils.backends.cupy_backend import is_cupy_available
+from dexp.utils.dask import DaskExecutor, worker_backend
 
 
 @dask.delayed
@@ -27,7 +25,7 @@ def _process(time_point: int, stacks: StackIterator, outpath: Path, project_func
             with asection("Loading stack..."):
                 stack = np.asarray(stacks[time_point])
 
-            with BestBackend() as bkd:
+            with worker_backend() as bkd:
                 with asection(f"Projecting image of shape: {stack.shape} "):
                     projection = bkd.to_numpy(project_func(bkd.to_backend(stack)))
 
@@ -40,11 +38,11 @@ def dataset_projection_rendering(
     output_path: Path,
     channels: Sequence[str],
     overwrite: bool,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
     **kwargs,
 ):
     project_func = curry(project_image, **kwargs)
-    lazy_computations = []
+    lazy_computations = {}
 
     for channel in channels:
         # Ensures that the output folder exists per channel:
@@ -67,18 +65,10 @@ def dataset_projection_rendering(
         with asection(f"Channel '{channel}' shape: {stacks.shape}:"):
             aprint(input_dataset.info(channel))
 
-        lazy_computations += [process(time_point=t) for t in range(len(stacks))]
-
-    if len(devices) > 0 and is_cupy_available():
-        from dask_cuda import LocalCUDACluster
-
-        cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-        client = Client(cluster)
-    else:
-        client = Client()
-    aprint("Dask client", client)
+        for t in range(len(stacks)):
+            lazy_computations[(channel, t)] = process(time_point=t)
 
     # Compute everything
-    dask.compute(*lazy_computations)
-
-    client.close()
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset)
+        executor.compute(lazy_computations)
@@ -1,12 +1,10 @@
 from copy import deepcopy
-from typing import Dict, List, Sequence
+from typing import Dict, List, Sequence, Union
 
 import dask
 import numpy
 import numpy as np
 from arbol.arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
 from toolz import curry
 
 from dexp.datasets.base_dataset import BaseDataset
@@ -18,6 +16,7 @@ from dexp.processing.registration.model.translation_registration_model import (
     TranslationRegistrationModel,
 )
 from dexp.utils.backends import BestBackend
+from dexp.utils.dask import DaskExecutor
 
 
 @dask.delayed
@@ -66,7 +65,7 @@ def dataset_register(
     white_top_hat_size: float,
     white_top_hat_sampling: int,
     remove_beads: bool,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
 ) -> None:
 
     views = {channel.split("-")[-1]: dataset[channel] for channel in channels}
@@ -106,21 +105,15 @@ def dataset_register(
         views=views, fuse_model=fuse_model, max_proj=max_proj, registration_edge_filter=registration_edge_filter
     )
 
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask Client", client)
+    lazy_computations = {i: process(tp=i) for i in range(n_time_pts)}
 
-    lazy_computations = []
-    for i in range(n_time_pts):
-        lazy_computations.append(process(tp=i))
-
-    models = dask.compute(*lazy_computations)
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(dataset)
+        models = list(executor.compute(lazy_computations).values())
 
     mode_model = compute_median_translation(models)
     model_list_to_file(model_path, [mode_model])
 
-    client.close()
-
 
 def compute_median_translation(models: List[TranslationRegistrationModel]) -> TranslationRegistrationModel:
     """
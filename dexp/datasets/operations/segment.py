@@ -1,11 +1,9 @@
-from typing import Sequence
+from typing import Sequence, Union
 
 import dask
 import numpy as np
 import pandas as pd
 from arbol import aprint, asection
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
 from skimage.measure import regionprops_table
 from toolz import curry
 
@@ -14,6 +12,7 @@ from dexp.datasets.stack_iterator import StackIterator
 from dexp.processing.morphology import area_white_top_hat
 from dexp.processing.segmentation import roi_watershed_from_minima
 from dexp.utils.backends import CupyBackend
+from dexp.utils.dask import DaskExecutor
 
 
 def intensity_sum(mask: np.ndarray, intensities: np.ndarray) -> float:
@@ -139,7 +138,7 @@ def dataset_segment(
     detection_channels: Sequence[str],
     features_channels: Sequence[str],
     out_channel: str,
-    devices: Sequence[int],
+    devices: Union[str, Sequence[int]],
     z_scale: float,
     area_threshold: float,
     minimum_area: float,
@@ -174,14 +173,12 @@ def dataset_segment(
         )
     )
 
-    lazy_computations = [process(time_point=t) for t in range(n_time_pts)]
-
-    cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=devices)
-    client = Client(cluster)
-    aprint("Dask client", client)
+    lazy_computations = {(out_channel, t): process(time_point=t) for t in range(n_time_pts)}
 
     df_path = output_dataset.path.replace(".zarr", ".csv")
-    df = pd.concat(dask.compute(*lazy_computations))
+    with DaskExecutor(devices) as executor:
+        executor.check_datasets(input_dataset, output_dataset)
+        df = pd.concat(executor.compute(lazy_computations).values())
     df.to_csv(df_path, index=False)
 
     output_dataset.append_metadata({"features": features_channels})
@@ -40,26 +40,18 @@ def _compute_model(
     workers: int = 1,
 ) -> SequenceRegistrationModel:
 
-    # get channel array:
-    array = input_dataset.get_array(channel, per_z_slice=False, wrap_with_dask=True)
+    # sliced stacks of the channel, streamed in order:
+    stacks = input_dataset[channel]
+    ndim = len(stacks.shape)
 
-    # Perform slicing:
-    if input_dataset.slicing is not None:
-        # dexp slicing API doesn't work with dask
-        array = array[input_dataset.slicing]
-
-    # Shape and chunks for array:
-    ndim = array.ndim
-
-    workers = compute_num_workers(workers, array.shape[0])
+    workers = compute_num_workers(workers, len(stacks))
 
     if not maxproj:
         with BestBackend(device, enable_unified_memory=True):
             model = image_stabilisation(
-                image=array,
+                image=stacks,
                 axis=0,
                 detrend=detrend,
-                preload_images=False,
                 max_range=max_range,
                 min_confidence=min_confidence,
                 enable_com=enable_com,
@@ -79,12 +71,12 @@ def _compute_model(
 
     else:  # stabilized with maximum intensity projection
         projections = []
-        for axis in range(array.ndim - 1):
+        for axis in range(ndim - 1):
             projection = input_dataset.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
             if input_dataset.slicing is not None:
                 projection = projection[input_dataset.slicing]
 
-            proj_axis = list(1 + a for a in range(array.ndim - 1) if a != axis)
+            proj_axis = list(1 + a for a in range(ndim - 1) if a != axis)
             projections.append((*proj_axis, projection))
 
         # Perform stabilisation:
@@ -309,13 +301,15 @@ def dataset_stabilize(
             integral=integral,
         )
 
+        time_points = output_dataset.time_points_to_process(channel, range(0, nb_timepoints))
+
         # start jobs:
         if workers == 1:
-            for tp in range(0, nb_timepoints):
+            for tp in time_points:
                 process(tp)
         else:
-            n_jobs = compute_num_workers(workers, nb_timepoints)
-            Parallel(n_jobs=n_jobs, backend=workers_backend)(delayed(process)(tp) for tp in range(0, nb_timepoints))
+            n_jobs = compute_num_workers(workers, len(time_points))
+            Parallel(n_jobs=n_jobs, backend=workers_backend)(delayed(process)(tp) for tp in time_points)
 
     # Dataset info:
     aprint(output_dataset.info())
@@ -1,4 +1,4 @@
-from typing import List, Sequence, Union
+from typing import List, Optional, Sequence, Union
 
 import dask
 import numpy as np
@@ -8,13 +8,17 @@ from toolz import curry
 
 from dexp.datasets import ZDataset
 from dexp.datasets.base_dataset import BaseDataset
+from dexp.datasets.statistics import statistics_range
+
+# quantile of the contrast limits read from the dataset statistics, see `dataset_view`:
+CONTRAST_QUANTILE = 0.001
 
 
 def dataset_view(
     input_dataset: BaseDataset,
     channels: Sequence[str],
     scale: int,
-    contrast_limits: Union[List[int], List[float]],
+    contrast_limits: Optional[Union[List[int], List[float]]],
     colormap: str,
     name: str,
     windowsize: int,
@@ -57,10 +61,19 @@ def dataset_view(
         else:
             downsample = curry(ts.downsample, method="mean")
 
+            channel_contrast_limits = contrast_limits
+            if channel_contrast_limits is None:
+                # contrast limits from the stored quantiles (see 'dexp histogram'), or estimated by napari:
+                statistics = input_dataset.get_statistics(channel)
+                if statistics is not None and statistics["computed"].any():
+                    channel_contrast_limits = statistics_range(statistics, quantile=CONTRAST_QUANTILE)
+                    aprint(f"Contrast limits of channel '{channel}' from its statistics: {channel_contrast_limits}")
+
             def add_layer(data, **kwargs):
+                if channel_contrast_limits is not None:
+                    kwargs["contrast_limits"] = channel_contrast_limits
                 return viewer.add_image(
                     data,
-                    contrast_limits=contrast_limits,
                     blending="additive",
                     colormap=colormap,
                     rendering="attenuated_mip",
@@ -0,0 +1,133 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy
+
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+# Projection types, max projections are the default ones:
+PROJECTION_TYPES = ("max", "min", "sum", "mean")
+DEFAULT_PROJECTION_TYPES = ("max",)
+
+# Maximum number of voxels of the slabs stacks are projected by, i.e. sent at once to the backend:
+DEFAULT_SLAB_VOXELS = 2**22
+
+
+def projection_dtype(projection_type: str, dtype: numpy.dtype) -> numpy.dtype:
+    """Returns the dtype of a projection of an array of the given dtype: same dtype for min and max,
+    numpy's sum dtype for sums (e.g. uint64 for uint16), float for means."""
+    dtype = numpy.dtype(dtype)
+    if projection_type in ("max", "min"):
+        return dtype
+    elif projection_type == "sum":
+        return numpy.add.reduce(numpy.zeros((1,), dtype=dtype)).dtype
+    elif projection_type == "mean":
+        return numpy.dtype(numpy.float64 if dtype == numpy.float64 else numpy.float32)
+    raise ValueError(f"Unknown projection type '{projection_type}', expected one of {PROJECTION_TYPES}")
+
+
+def _accumulator(projection_type: str, shape: Tuple[int, ...], dtype: numpy.dtype) -> xpArray:
+    xp = Backend.get_xp_module()
+    if projection_type in ("sum", "mean"):
+        return xp.zeros(shape, dtype=projection_dtype("sum", dtype))
+
+    if numpy.issubdtype(dtype, numpy.integer):
+        info = numpy.iinfo(dtype)
+        identity = info.min if projection_type == "max" else info.max
+    elif numpy.issubdtype(dtype, numpy.bool_):
+        identity = projection_type == "min"
+    else:
+        identity = -numpy.inf if projection_type == "max" else numpy.inf
+    return xp.full(shape, identity, dtype=dtype)
+
+
+class Projector:
+    def __init__(
+        self,
+        shape: Sequence[int],
+        dtype: numpy.dtype,
+        projection_types: Sequence[str] = DEFAULT_PROJECTION_TYPES,
+    ):
+        """
+        Computes the projections of an array along all its axes from blocks of it (slabs, tiles),
+        in a single pass over the data: each block is sent once to the current backend and reduced along every axis
+        while in device memory or in cache.
+
+        Parameters
+        ----------
+        shape : shape of the projected array.
+        dtype : dtype of the projected array.
+        projection_types : types of projections, among 'max', 'min', 'sum' and 'mean'.
+        """
+        for projection_type in projection_types:
+            projection_dtype(projection_type, dtype)  # validates the type
+
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+        self.projection_types = tuple(projection_types)
+        self._accumulators = {
+            (projection_type, axis): _accumulator(
+                projection_type, self.shape[:axis] + self.shape[axis + 1 :], self.dtype
+            )
+            for projection_type in self.projection_types
+            for axis in range(len(self.shape))
+        }
+
+    def update(self, block: xpArray, offset: Optional[Sequence[int]] = None) -> None:
+        """
+        Accumulates a block of the array into the projections, blocks must not overlap.
+
+        Parameters
+        ----------
+        block : block of the array.
+        offset : position of the block in the array, the origin when None.
+        """
+        xp = Backend.get_xp_module()
+        block = Backend.to_backend(block, force_copy=False)
+        offset = (0,) * block.ndim if offset is None else tuple(offset)
+
+        for (projection_type, axis), accumulator in self._accumulators.items():
+            region = tuple(slice(o, o + s) for i, (o, s) in enumerate(zip(offset, block.shape)) if i != axis)
+            # basic slicing gives a view, projections are accumulated in place:
+            view = accumulator[region]
+            if projection_type == "max":
+                xp.maximum(view, xp.max(block, axis=axis), out=view)
+            elif projection_type == "min":
+                xp.minimum(view, xp.min(block, axis=axis), out=view)
+            else:
+                view += xp.sum(block, axis=axis, dtype=accumulator.dtype)
+
+    def projections(self) -> Dict[Tuple[str, int], xpArray]:
+        """Returns the projections, indexed by projection type and axis, as backend arrays."""
+        projections = {}
+        for (projection_type, axis), accumulator in self._accumulators.items():
+            if projection_type == "mean":
+                accumulator = (accumulator / max(1, self.shape[axis])).astype(projection_dtype("mean", self.dtype))
+            projections[(projection_type, axis)] = accumulator
+        return projections
+
+
+def compute_projections(
+    stack: xpArray,
+    projection_types: Sequence[str] = DEFAULT_PROJECTION_TYPES,
+    max_slab_voxels: int = DEFAULT_SLAB_VOXELS,
+) -> Dict[Tuple[str, int], xpArray]:
+    """
+    Computes the projections of a stack along all its axes, with the current backend. Large stacks are sent
+    to the backend slab by slab along the first axis, each slab is reduced along every axis while in device memory.
+
+    Parameters
+    ----------
+    stack : stack to project.
+    projection_types : types of projections, among 'max', 'min', 'sum' and 'mean'.
+    max_slab_voxels : maximum number of voxels of the slabs.
+
+    Returns
+    -------
+    Projections indexed by projection type and axis, as backend arrays.
+    """
+    projector = Projector(stack.shape, stack.dtype, projection_types)
+    depth = max(1, max_slab_voxels // max(1, int(numpy.prod(stack.shape[1:]))))
+    for start in range(0, stack.shape[0], depth):
+        projector.update(stack[start : start + depth], offset=(start,) + (0,) * (stack.ndim - 1))
+    return projector.projections()
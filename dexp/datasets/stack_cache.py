@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class StackCache:
+    def __init__(self, max_bytes: int):
+        """Least recently used cache of decoded stacks, slices or chunks, bounded by their total size in bytes.
+
+        The cache is thread-safe and can be shared by several datasets, keys must be unique across them
+        (e.g. start with the dataset path). Cached arrays are made read-only: 'get' and 'put' return them as is,
+        callers must copy them before modifying them, 'get_or_load' returns writable copies.
+
+        Parameters
+        ----------
+        max_bytes : maximal total size in bytes of the cached arrays, 0 disables caching.
+        """
+        self._max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        return self._evictions
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "nbytes": self._nbytes,
+                "max_bytes": self._max_bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Returns the cached array for a key, or None on a miss."""
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+            return array
+
+    def put(self, key: Hashable, array: np.ndarray) -> np.ndarray:
+        """Caches an array, evicting the least recently used arrays beyond the budget.
+        Arrays larger than the whole budget are neither cached nor modified. Returns the array, read-only if cached."""
+        if array.nbytes > self._max_bytes:
+            return array
+        array.flags.writeable = False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+
+            self._entries[key] = array
+            self._nbytes += array.nbytes
+
+            while self._nbytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._evictions += 1
+
+        return array
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> np.ndarray:
+        """Returns a writable copy of the cached array for a key, loads and caches it on a miss. Loaded arrays too
+        large to be cached are returned as is. The loader is called without holding the lock, concurrent misses
+        on the same key may load it twice."""
+        array = self.get(key)
+        if array is None:
+            array = np.asarray(loader())
+            if array.nbytes > self._max_bytes:
+                return array
+            array = self.put(key, array)
+        return array.copy()
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Removes the arrays whose key satisfies the predicate, e.g. after the underlying data was written."""
+        with self._lock:
+            for key in [key for key in self._entries.keys() if predicate(key)]:
+                self._nbytes -= self._entries.pop(key).nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def __repr__(self) -> str:
+        stats = self.stats()
+        return (
+            f"StackCache({stats['nbytes'] / 1e6:.1f}/{stats['max_bytes'] / 1e6:.1f} MB, {stats['entries']} entries, "
+            + f"{stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions)"
+        )
+
+    def __getstate__(self) -> Dict:
+        # Locks cannot be pickled, a copy sent to another process starts empty with the same budget
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        state["_nbytes"] = 0
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
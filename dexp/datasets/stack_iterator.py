@@ -1,19 +1,52 @@
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import zarr
+from arbol import aprint
 
 from dexp.utils.slicing import slice_from_shape
 
 
 class StackIterator:
-    def __init__(self, array: zarr.Array, slicing: Optional[slice]):
+    def __init__(
+        self,
+        array: zarr.Array,
+        slicing: Optional[slice],
+        prefetch: int = 0,
+        max_prefetch_bytes: Optional[int] = None,
+        prefetch_workers: int = 2,
+    ):
+        """Iterates over the (sliced) stacks of an array, one time point at a time.
 
+        Parameters
+        ----------
+        array : 4D array (zarr, tensorstore, dask, ...) indexed by time point first.
+        slicing : optional slicing applied to the array, the first element slices the time points.
+        prefetch : number of time points to load ahead in background threads, 0 disables prefetching.
+            Each consumer thread gets its own window of time points loaded ahead of its last read,
+            following the processing order (see `set_order`), so concurrent reads do not cancel each other's.
+        max_prefetch_bytes : memory budget for stacks loaded ahead, None means no budget.
+        prefetch_workers : number of threads used for prefetching.
+        """
         self._out_shape, self._volume_slicing, self._time_points = slice_from_shape(array.shape, slicing)
         self._slicing = slicing
 
         self._array = array
 
+        self._prefetch = max(0, prefetch)
+        self._max_prefetch_bytes = max_prefetch_bytes
+        self._prefetch_workers = max(1, prefetch_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+        # processing order of the time points, and position in it of the last read of each consumer thread:
+        self._order: List[int] = list(range(len(self._time_points)))
+        self._positions: Dict[int, int] = {index: position for position, index in enumerate(self._order)}
+        self._windows: Dict[int, int] = {}
+
     @property
     def shape(self) -> Tuple[int]:
         return self._out_shape
@@ -30,15 +63,130 @@ class StackIterator:
     def slicing(self) -> Tuple[slice]:
         return self._slicing
 
+    @property
+    def prefetch(self) -> int:
+        return self._prefetch
+
+    @property
+    def stack_nbytes(self) -> int:
+        return int(np.prod(self._out_shape[1:])) * self.dtype.itemsize
+
     def __len__(self) -> int:
         return len(self._time_points)
 
-    def __getitem__(self, index: int) -> np.ndarray:
+    def _load(self, index: int):
         if isinstance(self._volume_slicing, type(...)):
             slicing = self._time_points[index]
         else:
             slicing = (self._time_points[index],) + self._volume_slicing
         return self._array[slicing]
 
+    def set_order(self, indices: Sequence[int]) -> None:
+        """Sets the order in which time points are expected to be read, e.g. the time points an operation
+        processes, time points are prefetched in that order. By default all time points, by increasing index.
+
+        Parameters
+        ----------
+        indices : time point indices (relative to the slicing), in processing order.
+        """
+        with self._lock:
+            self._order = list(indices)
+            self._positions = {index: position for position, index in enumerate(self._order)}
+            self._windows = {}
+
+    def _max_in_flight(self) -> int:
+        # each consumer may have its window loaded ahead, within the memory budget:
+        max_in_flight = self._prefetch * max(1, len(self._windows))
+        if self._max_prefetch_bytes is not None:
+            max_in_flight = min(max_in_flight, self._max_prefetch_bytes // max(1, self.stack_nbytes))
+        return max_in_flight
+
+    def _window(self, position: int) -> List[int]:
+        return self._order[position + 1 : position + 1 + self._prefetch]
+
+    def _schedule(self, index: int) -> None:
+        # Must be called with the lock held.
+        position = self._positions.get(index)
+        if position is not None:
+            self._windows[threading.get_ident()] = position
+
+        # Futures outside of the windows of all consumers will most likely never be requested:
+        windows = {i for p in self._windows.values() for i in self._window(p)}
+        for i in list(self._futures.keys()):
+            if i not in windows:
+                self._futures.pop(i).cancel()
+
+        max_in_flight = self._max_in_flight()
+        if position is None or max_in_flight <= 0:
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._prefetch_workers, thread_name_prefix="prefetch")
+
+        for i in self._window(position):
+            if len(self._futures) >= max_in_flight:
+                break
+            if i not in self._futures:
+                self._futures[i] = self._executor.submit(lambda i=i: np.asarray(self._load(i)))
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if self._prefetch == 0:
+            return self._load(index)
+
+        if index < 0:
+            index += len(self)
+        if not (0 <= index < len(self)):
+            raise IndexError(f"Index {index} out of range for {len(self)} time points.")
+
+        with self._lock:
+            future = self._futures.pop(index, None)
+            self._schedule(index)
+
+        if future is None:
+            return np.asarray(self._load(index))
+
+        try:
+            return future.result()
+        except Exception:
+            aprint(f"Prefetching of time point {index} failed, cancelling pending reads.")
+            self.close()
+            raise
+
     def time(self, index: int) -> int:
         return self._time_points[index]
+
+    def close(self) -> None:
+        """Cancels pending prefetches and releases the prefetching threads."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def __enter__(self) -> "StackIterator":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __getstate__(self) -> Dict:
+        # Threads and futures cannot be pickled, a copy sent to another process loads time points on demand
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_futures"] = {}
+        state["_lock"] = None
+        state["_prefetch"] = 0
+        state["_windows"] = {}
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
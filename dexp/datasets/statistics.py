@@ -0,0 +1,267 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import zarr
+
+from dexp.processing.utils.quantile import (
+    exact_histogram_offset,
+    histogram_quantiles,
+)
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+# Quantiles stored for each time point, contrast limits and normalisation ranges are usually picked among them:
+DEFAULT_QUANTILES = (0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 0.9, 0.95, 0.99, 0.999, 0.9999)
+
+# Number of bins of the histograms of floating point and large integer stacks:
+DEFAULT_NUM_BINS = 1024
+
+# Number of voxels sent at once to the backend:
+DEFAULT_SLAB_VOXELS = 2**26
+
+# Scalar statistics stored for each time point:
+SCALAR_STATISTICS = ("count", "min", "max", "mean", "std")
+
+
+def _slabs(stack: xpArray, max_voxels: int):
+    slab_depth = max(1, max_voxels // max(1, int(np.prod(stack.shape[1:], dtype=np.int64))))
+    for start in range(0, stack.shape[0], slab_depth):
+        yield Backend.to_backend(stack[start : start + slab_depth], force_copy=False)
+
+
+def _finite(slab: xpArray) -> xpArray:
+    # NaNs and infinities of floating point stacks are left out of the statistics:
+    if not np.issubdtype(slab.dtype, np.floating):
+        return slab
+    xp = Backend.get_xp_module(slab)
+    finite = xp.isfinite(slab)
+    return slab if bool(xp.all(finite)) else slab[finite]
+
+
+def stack_statistics(
+    stack: xpArray,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    num_bins: int = DEFAULT_NUM_BINS,
+    max_slab_voxels: int = DEFAULT_SLAB_VOXELS,
+) -> Dict[str, np.ndarray]:
+    """
+    Computes the histogram, quantiles, min, max, mean and standard deviation of a stack with the current backend.
+    The stack is streamed to the backend by slabs of planes so that it never needs to fit at once in device memory.
+
+    Integer stacks of at most 16 bits get one bin per value (single bincount per slab) and exact statistics,
+    other stacks are binned in 'num_bins' bins between their min and max, their quantiles are then
+    accurate to half a bin. NaNs and infinities are ignored, they are not counted either.
+
+    Parameters
+    ----------
+    stack : stack (numpy, zarr or backend array)
+    quantiles : quantile levels to compute, within [0, 1]
+    num_bins : number of bins for floating point and large integer stacks
+    max_slab_voxels : maximum number of voxels sent at once to the backend
+
+    Returns
+    -------
+    Dictionary of numpy values: 'histogram', 'histogram_range' (value of the first bin and bin width),
+    'quantiles', the scalar statistics 'count', 'min', 'max', 'mean' and 'std',
+    and 'exact' telling whether each bin holds a single value.
+    """
+    xp = Backend.get_xp_module()
+
+    offset = exact_histogram_offset(stack.dtype)
+    if offset is not None:
+        length = 2 ** (8 * np.dtype(stack.dtype).itemsize)
+        histogram = xp.zeros((length,), dtype=xp.int64)
+        for slab in _slabs(stack, max_slab_voxels):
+            values = slab.ravel()
+            if offset != 0:
+                values = values.astype(xp.int32) - offset
+            histogram += xp.bincount(values, minlength=length)
+        histogram = Backend.to_numpy(histogram)
+        histogram_range = np.asarray((offset, 1.0))
+
+        count = int(histogram.sum())
+        non_zero = np.flatnonzero(histogram)
+        values = offset + np.arange(length, dtype=np.float64)
+        minimum = values[non_zero[0]] if count > 0 else np.nan
+        maximum = values[non_zero[-1]] if count > 0 else np.nan
+        mean = np.dot(histogram, values) / max(1, count)
+        std = np.sqrt(max(0.0, np.dot(histogram, np.square(values - mean)) / max(1, count)))
+
+    else:
+        count, minimum, maximum, total = 0, np.inf, -np.inf, 0.0
+        for slab in _slabs(stack, max_slab_voxels):
+            values = _finite(slab)
+            if values.size == 0:
+                continue
+            count += values.size
+            minimum = min(minimum, float(xp.min(values)))
+            maximum = max(maximum, float(xp.max(values)))
+            total += float(xp.sum(values, dtype=xp.float64))
+
+        if count == 0:
+            minimum, maximum, mean, std = np.nan, np.nan, np.nan, np.nan
+            histogram = np.zeros((num_bins,), dtype=np.int64)
+            histogram_range = np.asarray((np.nan, np.nan))
+
+        else:
+            mean = total / count
+
+            # second pass: histogram and centered second moment, the slabs are usually read from memory:
+            width = max(maximum - minimum, np.finfo(np.float32).eps) / num_bins
+            histogram = xp.zeros((num_bins,), dtype=xp.int64)
+            squares = 0.0
+            for slab in _slabs(stack, max_slab_voxels):
+                values = _finite(slab)
+                slab_histogram, _ = xp.histogram(values, bins=num_bins, range=(minimum, minimum + width * num_bins))
+                histogram += slab_histogram
+                squares += float(xp.sum(xp.square(values.astype(xp.float64) - mean)))
+            histogram = Backend.to_numpy(histogram)
+            histogram_range = np.asarray((minimum, width))
+            std = np.sqrt(squares / count)
+
+    statistics = dict(
+        exact=offset is not None,
+        histogram=histogram,
+        histogram_range=histogram_range,
+        count=count,
+        min=minimum,
+        max=maximum,
+        mean=mean,
+        std=std,
+    )
+    statistics["quantiles"] = histogram_quantiles(
+        histogram, histogram_range, quantiles, exact=offset is not None, value_range=(minimum, maximum)
+    )
+    return statistics
+
+
+def write_statistics(
+    group: zarr.Group,
+    time_point: int,
+    num_time_points: int,
+    statistics: Dict[str, np.ndarray],
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+) -> None:
+    """
+    Writes the statistics of a time point (see 'stack_statistics') into a zarr group holding those of all time points.
+    Not thread safe, concurrent writes of different time points may share chunks.
+
+    Parameters
+    ----------
+    group : zarr group of the statistics of a channel
+    time_point : time point of the statistics
+    num_time_points : number of time points of the channel
+    statistics : statistics of the time point
+    quantiles : quantile levels of the statistics
+    """
+    num_bins = len(statistics["histogram"])
+    if "histogram" in group and group["histogram"].shape[1] != num_bins:
+        raise ValueError(f"Histograms of {group['histogram'].shape[1]} bins already stored, got {num_bins} bins.")
+
+    stored_quantiles = group.attrs.get("quantile_levels")
+    if stored_quantiles is not None and not np.allclose(stored_quantiles, quantiles):
+        raise ValueError(f"Quantiles {stored_quantiles} already stored, got {list(quantiles)}.")
+    group.attrs.update(quantile_levels=[float(q) for q in quantiles], exact=bool(statistics["exact"]))
+
+    def _require(name: str, shape: Tuple[int, ...], dtype: np.dtype) -> zarr.Array:
+        # unwritten time points are filled with zero counts and NaNs, only histograms are chunked per time point:
+        fill_value = 0 if np.issubdtype(dtype, np.integer) else np.nan
+        chunks = (1,) + shape if name == "histogram" else True
+        return group.require_dataset(
+            name, shape=(num_time_points,) + shape, chunks=chunks, dtype=dtype, fill_value=fill_value
+        )
+
+    _require("histogram", (num_bins,), np.int64)[time_point] = statistics["histogram"]
+    _require("histogram_range", (2,), np.float64)[time_point] = statistics["histogram_range"]
+    _require("quantiles", (len(quantiles),), np.float64)[time_point] = statistics["quantiles"]
+    for name in SCALAR_STATISTICS:
+        _require(name, (), np.int64 if name == "count" else np.float64)[time_point] = statistics[name]
+
+
+def read_statistics(group: Optional[zarr.Group]) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Reads the statistics of all time points written by 'write_statistics'.
+
+    Returns
+    -------
+    Dictionary of numpy arrays indexed by time point, with the 'quantile_levels', the 'exact' flag and a 'computed'
+    mask of the time points with statistics, None if there are no statistics.
+    """
+    if group is None or "count" not in group:
+        return None
+    statistics = {name: group[name][...] for name in group.array_keys()}
+    statistics["quantile_levels"] = np.asarray(group.attrs["quantile_levels"])
+    statistics["exact"] = group.attrs["exact"]
+    statistics["computed"] = statistics["count"] > 0
+    return statistics
+
+
+def statistics_at(statistics: Optional[Dict[str, np.ndarray]], time_point: int) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Selects the statistics of a time point among those of all time points read by 'read_statistics',
+    in the format returned by 'stack_statistics', e.g. for the 'statistics' of 'Normalise'.
+
+    Parameters
+    ----------
+    statistics : statistics read by 'read_statistics', or None
+    time_point : time point
+
+    Returns
+    -------
+    Dictionary of numpy values of the time point, None if it has no statistics.
+    """
+    if statistics is None or not statistics["computed"][time_point]:
+        return None
+    selected = {name: statistics[name][time_point] for name in ("histogram", "histogram_range", "quantiles")}
+    selected.update({name: statistics[name][time_point] for name in SCALAR_STATISTICS})
+    selected["exact"] = statistics["exact"]
+    return selected
+
+
+def statistics_quantile(
+    statistics: Dict[str, np.ndarray], quantile: float, time_point: Optional[int] = None
+) -> np.ndarray:
+    """
+    Returns a quantile of the stored statistics, for a time point or all time points.
+    Stored quantile levels are returned as is, others are computed from the histograms.
+
+    Parameters
+    ----------
+    statistics : statistics read by 'read_statistics'
+    quantile : quantile level within [0, 1]
+    time_point : time point, all time points if None
+
+    Returns
+    -------
+    Quantile value, or values per time point (NaN for time points without statistics).
+    """
+    time_points = slice(None) if time_point is None else time_point
+    levels = statistics["quantile_levels"]
+    index = np.flatnonzero(np.isclose(levels, quantile))
+    if len(index) > 0:
+        return statistics["quantiles"][time_points, index[0]]
+
+    def _quantile(t: int) -> float:
+        value_range = (statistics["min"][t], statistics["max"][t])
+        return histogram_quantiles(
+            statistics["histogram"][t], statistics["histogram_range"][t], [quantile], statistics["exact"], value_range
+        )[0]
+
+    if time_point is not None:
+        return _quantile(time_point)
+    return np.asarray([_quantile(t) for t in range(len(statistics["count"]))])
+
+
+def statistics_range(
+    statistics: Dict[str, np.ndarray], quantile: float = 0.001, time_point: Optional[int] = None
+) -> Tuple[float, float]:
+    """
+    Returns the range between the 'quantile' and '1 - quantile' quantiles of a time point, or over all the computed
+    time points, e.g. as contrast limits or as the 'minmax' of 'Normalise'.
+    """
+    low = statistics_quantile(statistics, quantile, time_point)
+    high = statistics_quantile(statistics, 1 - quantile, time_point)
+    if time_point is None:
+        low = np.nanmin(low[statistics["computed"]])
+        high = np.nanmax(high[statistics["computed"]])
+    return float(low), float(high)
@@ -0,0 +1,176 @@
+import time
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy
+from arbol import aprint, asection
+from zarr import Blosc
+
+# Access patterns chunks can be tuned for:
+#  'stack': whole stacks per time point (processing operations),
+#  'slice': single z slices (viewing),
+#  'tile': blocks of a few hundred voxels (scatter-gather processing).
+ACCESS_PATTERNS = ("stack", "slice", "tile")
+
+# Codec of the channels tuned on the first stack written:
+AUTO_CODEC = "auto"
+
+# Candidates benchmarked by 'tune_codec':
+DEFAULT_CODECS = ("zstd", "lz4", "lz4hc", "blosclz")
+DEFAULT_CLEVELS = (1, 3, 5)
+DEFAULT_SHUFFLES = (Blosc.BITSHUFFLE, Blosc.SHUFFLE, Blosc.NOSHUFFLE)
+
+# Storage bandwidth (bytes per second) used to weight compression ratio against codec speed:
+DEFAULT_IO_BANDWIDTH = 5e8
+
+# Size of the block of the sample stack that codecs are benchmarked on:
+DEFAULT_SAMPLE_BYTES = 2**23
+
+# Maximum size of chunks, as for the default chunks:
+MAX_CHUNK_BYTES = 2147483647
+
+_SHUFFLE_NAMES = {Blosc.NOSHUFFLE: "noshuffle", Blosc.SHUFFLE: "shuffle", Blosc.BITSHUFFLE: "bitshuffle"}
+
+
+def is_access_pattern(chunks: Union[str, Sequence[int], None]) -> bool:
+    return isinstance(chunks, str) and chunks in ACCESS_PATTERNS
+
+
+def tune_chunks(
+    shape: Tuple[int, ...],
+    dtype: numpy.dtype,
+    access: str = "stack",
+    tile_size: int = 320,
+    max_chunk_bytes: int = MAX_CHUNK_BYTES,
+) -> Tuple[int, ...]:
+    """
+    Returns chunks matching an access pattern of a (t, z, y, x) or (t, y, x) array, one time point per chunk.
+
+    Parameters
+    ----------
+    shape : shape of the array.
+    dtype : dtype of the array.
+    access : 'stack' for whole stacks (as many planes as fit in 'max_chunk_bytes'), 'slice' for single planes,
+        'tile' for blocks of 'tile_size' voxels along each spatial axis.
+    tile_size : tile size of the 'tile' access pattern, e.g. the scatter-gather tile size.
+    max_chunk_bytes : maximum size in bytes of a chunk.
+
+    Returns
+    -------
+    Chunks shape.
+    """
+    if access not in ACCESS_PATTERNS:
+        raise ValueError(f"Unknown access pattern '{access}', expected one of {ACCESS_PATTERNS}")
+
+    itemsize = numpy.dtype(dtype).itemsize
+    spatial = tuple(shape[1:])
+    if access == "tile":
+        chunks = tuple(min(s, tile_size) for s in spatial)
+    else:
+        plane = spatial[1:] if len(spatial) > 2 else spatial
+        depth = 1 if access == "slice" or len(spatial) <= 2 else spatial[0]
+        max_depth = max(1, max_chunk_bytes // max(1, itemsize * int(numpy.prod(plane))))
+        chunks = ((min(depth, max_depth),) if len(spatial) > 2 else ()) + tuple(plane)
+
+    return (1,) + chunks
+
+
+def _sample_block(stack: numpy.ndarray, max_bytes: int) -> numpy.ndarray:
+    # central block of the stack, halving its largest axis until it fits:
+    shape = list(stack.shape)
+    while numpy.prod(shape) * stack.itemsize > max_bytes and max(shape) > 1:
+        axis = int(numpy.argmax(shape))
+        shape[axis] = (shape[axis] + 1) // 2
+    slicing = tuple(slice((s - b) // 2, (s - b) // 2 + b) for s, b in zip(stack.shape, shape))
+    return numpy.ascontiguousarray(stack[slicing])
+
+
+def tune_codec(
+    sample: numpy.ndarray,
+    codecs: Sequence[str] = DEFAULT_CODECS,
+    clevels: Sequence[int] = DEFAULT_CLEVELS,
+    shuffles: Sequence[int] = DEFAULT_SHUFFLES,
+    io_bandwidth: float = DEFAULT_IO_BANDWIDTH,
+    max_sample_bytes: int = DEFAULT_SAMPLE_BYTES,
+) -> Dict[str, Union[str, int, float]]:
+    """
+    Benchmarks Blosc codecs, compression levels and shuffles on a representative stack and returns the fastest
+    for writing and reading it back: compression, decompression and storage transfer of the compressed data.
+
+    Parameters
+    ----------
+    sample : representative stack, benchmarked on a central block.
+    codecs : Blosc codecs to benchmark.
+    clevels : compression levels to benchmark.
+    shuffles : Blosc shuffles to benchmark.
+    io_bandwidth : storage bandwidth in bytes per second.
+    max_sample_bytes : maximum size of the benchmarked block.
+
+    Returns
+    -------
+    Best configuration: 'codec', 'clevel', 'shuffle' (Blosc constant), and its measured 'ratio',
+    'compression_speed' and 'decompression_speed' (bytes per second).
+    """
+    block = _sample_block(numpy.asarray(sample), max_sample_bytes)
+    nbytes = max(1, block.nbytes)
+
+    results = []
+    with asection(f"Benchmarking {len(codecs) * len(clevels) * len(shuffles)} codecs on a block of {nbytes} bytes"):
+        for codec in codecs:
+            for clevel in clevels:
+                for shuffle in shuffles:
+                    compressor = Blosc(cname=codec, clevel=clevel, shuffle=shuffle)
+                    start = time.perf_counter()
+                    compressed = compressor.encode(block)
+                    compression_time = max(time.perf_counter() - start, 1e-9)
+                    start = time.perf_counter()
+                    compressor.decode(compressed)
+                    decompression_time = max(time.perf_counter() - start, 1e-9)
+
+                    ratio = nbytes / max(1, len(compressed))
+                    # time per byte written and read back:
+                    cost = (compression_time + decompression_time) / nbytes + 2 / (ratio * io_bandwidth)
+                    results.append(
+                        (
+                            cost,
+                            dict(
+                                codec=codec,
+                                clevel=clevel,
+                                shuffle=shuffle,
+                                ratio=ratio,
+                                compression_speed=nbytes / compression_time,
+                                decompression_speed=nbytes / decompression_time,
+                            ),
+                        )
+                    )
+
+        _, best = min(results, key=lambda result: result[0])
+        aprint(
+            f"Selected codec: {best['codec']}, clevel: {best['clevel']}, shuffle: {_SHUFFLE_NAMES[best['shuffle']]}, "
+            + f"ratio: {best['ratio']:.2f}, compression: {best['compression_speed'] / 1e6:.0f} MB/s, "
+            + f"decompression: {best['decompression_speed'] / 1e6:.0f} MB/s"
+        )
+    return best
+
+
+def storage_metadata(
+    chunks: Sequence[int],
+    compressor: Blosc,
+    access: Optional[str] = None,
+    benchmark: Optional[Dict[str, Union[str, int, float]]] = None,
+) -> Dict[str, Union[str, int, float, list, None]]:
+    """Returns the storage settings of a channel, and how they were chosen, for the channel metadata."""
+    metadata = dict(
+        chunks=[int(c) for c in chunks],
+        access=access,
+        codec=compressor.cname if isinstance(compressor.cname, str) else compressor.cname.decode(),
+        clevel=int(compressor.clevel),
+        shuffle=_SHUFFLE_NAMES.get(compressor.shuffle, str(compressor.shuffle)),
+        tuned=benchmark is not None,
+    )
+    if benchmark is not None:
+        metadata.update(
+            ratio=float(benchmark["ratio"]),
+            compression_speed=float(benchmark["compression_speed"]),
+            decompression_speed=float(benchmark["decompression_speed"]),
+        )
+    return metadata
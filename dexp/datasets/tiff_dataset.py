@@ -2,7 +2,6 @@ from typing import Dict, Sequence, Tuple
 
 import dask.array as da
 import numpy as np
-from dask.array.image import imread
 from numpy.typing import ArrayLike
 
 from dexp.datasets.base_dataset import BaseDataset
@@ -10,6 +9,9 @@ from dexp.datasets.base_dataset import BaseDataset
 
 class TIFDataset(BaseDataset):
     def __init__(self, path: str):
+        # imported here because it pulls scikit-image, which is slow to import:
+        from dask.array.image import imread
+
         super().__init__(dask_backed=False, path=path)
         self._channel = "stack"
         self._array = imread(path)
@@ -3,39 +3,62 @@ import os
 import re
 import shutil
 import sys
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from os.path import exists, isdir, isfile, join
 from pathlib import Path
-from typing import Any, List, Optional, Sequence, Tuple, Union
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import dask
 import numpy
 import zarr
 from arbol.arbol import aprint, asection
-from ome_zarr.format import CurrentFormat
 from zarr import Blosc, CopyError, convenience, open_group
 
 from dexp.cli.defaults import DEFAULT_CLEVEL, DEFAULT_CODEC
 from dexp.datasets.base_dataset import BaseDataset
-from dexp.datasets.ome_dataset import create_coord_transform, default_omero_metadata
+from dexp.datasets.ome_dataset import OMEZarrPyramid
+from dexp.datasets.projections import (
+    DEFAULT_PROJECTION_TYPES,
+    PROJECTION_TYPES,
+    compute_projections,
+    projection_dtype,
+)
 from dexp.datasets.stack_iterator import StackIterator
+from dexp.datasets.statistics import (
+    DEFAULT_QUANTILES,
+    read_statistics,
+    write_statistics,
+)
+from dexp.datasets.storage_tuning import (
+    AUTO_CODEC,
+    is_access_pattern,
+    storage_metadata,
+    tune_chunks,
+    tune_codec,
+)
 from dexp.utils import compress_dictionary_lists_length
 from dexp.utils.backends import Backend, BestBackend
 from dexp.utils.config import config_blosc
+from dexp.utils.misc import compute_num_workers
 
-try:
-    from cucim import __version__ as sk_version
-    from cucim.skimage.transform import downscale_local_mean
 
-    DOWNSCALE_METHOD = "cucim.skimage.transform.downscale_local_mean"
-
-except ImportError:
-    from skimage import __version__ as sk_version
-    from skimage.transform import downscale_local_mean
-
-    DOWNSCALE_METHOD = "skimage.transform.downscale_local_mean"
+class ZDataset(BaseDataset):
 
+    # Number of time points of a channel whose lazy projections are kept in memory before being written:
+    max_pending_projections = 64
 
-class ZDataset(BaseDataset):
     def __init__(
         self,
         path: Union[str, Path],
@@ -44,8 +67,13 @@ class ZDataset(BaseDataset):
         *,
         codec: str = DEFAULT_CODEC,
         clevel: int = DEFAULT_CLEVEL,
-        chunks: Optional[Sequence[int]] = None,
+        chunks: Optional[Union[Sequence[int], str]] = None,
         parent: Optional[BaseDataset] = None,
+        write_behind: int = 0,
+        write_workers: int = 2,
+        resume: bool = False,
+        projection_types: Sequence[str] = DEFAULT_PROJECTION_TYPES,
+        lazy_projections: bool = False,
     ):
         """Instantiates a Zarr dataset (and opens it)
 
@@ -59,6 +87,20 @@ class ZDataset(BaseDataset):
             'w' means create (overwrite if exists);
             'w-' means create (fail if exists).
         store : type of store, can be 'dir', 'ndir', or 'zip'
+        codec : default compression codec of the channels, 'auto' tunes it on the first stack written
+            (see `add_channel`).
+        clevel : default compression level of the channels.
+        chunks : default chunks of the channels, or access pattern to tune them for: 'stack', 'slice' or 'tile'.
+        write_behind : maximum number of stacks queued for writing in the background by `write_stack`,
+            0 means that stacks are written synchronously. Queued stacks are copies, callers may reuse their buffers.
+        write_workers : number of background threads compressing and writing queued stacks.
+        resume : if True, `add_channel` reuses existing channels of same shape and dtype and `time_points_to_process`
+            skips the time points already written, for resuming interrupted operations (use with mode 'a').
+        projection_types : types of the projections of the channels added, among 'max', 'min', 'sum' and 'mean'.
+        lazy_projections : if True the projections of the stacks written are kept in memory and written at `close`,
+            or once `max_pending_projections` time points of a channel are pending, one write per projection array
+            and contiguous range of time points. Time points whose projections were not written yet are not complete
+            (see `complete_time_points`), at most that many are processed again when resuming after a crash.
 
         Returns
         -------
@@ -75,6 +117,27 @@ class ZDataset(BaseDataset):
         self._clevel = clevel
         self._chunks = chunks
 
+        self._write_behind = write_behind
+        self._write_workers = max(1, write_workers)
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._write_slots = threading.BoundedSemaphore(max(1, write_behind))
+        self._write_futures = set()
+        self._write_errors = []
+        self._write_lock = threading.Lock()
+
+        self._resume = resume
+        self._pyramid: Optional[OMEZarrPyramid] = None
+
+        self._projection_types = tuple(projection_types)
+        self._lazy_projections = lazy_projections
+        self._pending_projections = {}
+        self._projections_lock = threading.Lock()
+        self._channel_projection_types = {}
+
+        # channels whose codec is tuned on the first stack written, see `add_channel`:
+        self._pending_tuning = {}
+        self._tuning_lock = threading.Lock()
+
         # Open remote store:
         if "http" in self._path:
             aprint(f"Opening a remote store at: {self._path}")
@@ -187,6 +250,13 @@ class ZDataset(BaseDataset):
         return chunk[-len(shape) :]
 
     def close(self):
+        # Pending background writes must land before the store is closed
+        self.flush()
+        self.flush_projections()
+        if self._write_executor is not None:
+            self._write_executor.shutdown()
+            self._write_executor = None
+
         # We close the store if it exists, i.e. if we have been writing to the dataset
         if self._store is not None:
             try:
@@ -195,6 +265,7 @@ class ZDataset(BaseDataset):
                 pass
 
     def check_integrity(self, channels: Sequence[str] = None) -> bool:
+        self.flush()
         aprint("Checking integrity of zarr storage, might take some time.")
         if channels is None:
             channels = self.channels()
@@ -315,14 +386,24 @@ class ZDataset(BaseDataset):
         return array
 
     def get_stack(self, channel: str, time_point: int, per_z_slice: bool = False, wrap_with_dask: bool = False):
+        if self._stack_cache is not None and not per_z_slice and not wrap_with_dask:
+            # decoded stacks are cached, callers get writable copies:
+            return self._stack_cache.get_or_load(
+                (self._path, channel, time_point), lambda: self.get_array(channel)[time_point]
+            )
         stack_array = self.get_array(channel, per_z_slice=per_z_slice, wrap_with_dask=wrap_with_dask)[time_point]
         return stack_array
 
     def get_projection_array(
-        self, channel: str, axis: int, wrap_with_dask: bool = False, wrap_with_tensorstore: bool = False
+        self,
+        channel: str,
+        axis: int,
+        wrap_with_dask: bool = False,
+        wrap_with_tensorstore: bool = False,
+        projection_type: str = "max",
     ) -> Optional[Union[zarr.Array, Any]]:
         assert (wrap_with_dask != wrap_with_tensorstore) or not wrap_with_dask
-        array = self._root_group[channel].get(self._projection_name(channel, axis))
+        array = self._root_group[channel].get(self._projection_name(channel, axis, projection_type))
         if array is None:
             return None
 
@@ -332,35 +413,184 @@ class ZDataset(BaseDataset):
             return self._load_tensorstore(array)
         return array
 
-    def _projection_name(self, channel: str, axis: int):
-        return f"{channel}_projection_{axis}"
+    def _projection_name(self, channel: str, axis: int, projection_type: str = "max"):
+        # max projections keep their historical names:
+        if projection_type == "max":
+            return f"{channel}_projection_{axis}"
+        return f"{channel}_projection_{projection_type}_{axis}"
+
+    def projection_types(self, channel: str) -> List[str]:
+        """Returns the types of the projections of a channel."""
+        # looked up in the store once per channel, stacks are written much more often than channels are created:
+        projection_types = self._channel_projection_types.get(channel)
+        if projection_types is None:
+            projection_types = [
+                projection_type
+                for projection_type in PROJECTION_TYPES
+                if self._projection_name(channel, 0, projection_type) in self._root_group[channel]
+            ]
+            self._channel_projection_types[channel] = projection_types
+        return projection_types
+
+    def _write_projections(self, channel: str, time_point: Union[int, slice], projections: dict) -> None:
+        if self._lazy_projections and isinstance(time_point, int):
+            with self._projections_lock:
+                pending = self._pending_projections.setdefault(channel, {})
+                for key, projection in projections.items():
+                    pending.setdefault(key, {})[time_point] = Backend.to_numpy(projection)
+                # bounds the time points lost, and processed again when resuming, if the process crashes:
+                if len(next(iter(pending.values()))) < self.max_pending_projections:
+                    return
+                del self._pending_projections[channel]
+            self._write_pending_projections(channel, pending)
+            return
+
+        for (projection_type, axis), projection in projections.items():
+            projection_in_zarr = self.get_projection_array(channel, axis, projection_type=projection_type)
+            projection_in_zarr[time_point] = Backend.to_numpy(projection)
+
+    def _write_pending_projections(self, channel: str, channel_projections: dict) -> None:
+        for (projection_type, axis), projections in channel_projections.items():
+            projection_in_zarr = self.get_projection_array(channel, axis, projection_type=projection_type)
+            time_points = sorted(projections)
+            # splits the time points into contiguous ranges:
+            breaks = [i for i in range(1, len(time_points)) if time_points[i] != time_points[i - 1] + 1]
+            for start, end in zip([0] + breaks, breaks + [len(time_points)]):
+                block = numpy.stack([projections[t] for t in time_points[start:end]])
+                projection_in_zarr[time_points[start] : time_points[start] + len(block)] = block
+
+    def flush_projections(self) -> None:
+        """Writes the projections kept in memory (see `lazy_projections`), one write per projection array and
+        contiguous range of time points."""
+        with self._projections_lock:
+            pending = self._pending_projections
+            self._pending_projections = {}
+
+        for channel, channel_projections in pending.items():
+            self._write_pending_projections(channel, channel_projections)
+
+    @property
+    def read_only(self) -> bool:
+        return self._root_group.read_only
+
+    def _statistics_name(self, channel: str):
+        return f"{channel}_statistics"
+
+    def get_statistics(self, channel: str) -> Optional[Dict[str, numpy.ndarray]]:
+        return read_statistics(self._root_group[channel].get(self._statistics_name(channel)))
+
+    def write_statistics(
+        self,
+        channel: str,
+        time_point: int,
+        statistics: Dict[str, numpy.ndarray],
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> None:
+        """Writes the statistics of a time point of a channel (see `dexp.datasets.statistics.stack_statistics`).
+        The dataset must be writable, see `read_only`.
+        """
+        if self.read_only:
+            raise ValueError(f"Cannot write the statistics of channel '{channel}', dataset {self._path} is read only.")
+        statistics_group = self._root_group[channel].require_group(self._statistics_name(channel))
+        write_statistics(statistics_group, time_point, self.nb_timepoints(channel), statistics, quantiles)
 
     def write_stack(self, channel: str, time_point: int, stack_array: numpy.ndarray):
+        if self._write_behind <= 0:
+            self._write_stack(channel, time_point, stack_array)
+            return
+
+        # errors from previous writes are reported as early as possible
+        self._raise_write_errors()
+
+        # device to host transfer happens here, the background threads are not in the backend context.
+        # Numpy arrays are copied, callers may modify or reuse them once this returns:
+        stack_array = Backend.to_numpy(stack_array, force_copy=isinstance(stack_array, numpy.ndarray))
+
+        # blocks when too many stacks are waiting to be written
+        self._write_slots.acquire()
+        with self._write_lock:
+            if self._write_executor is None:
+                self._write_executor = ThreadPoolExecutor(
+                    max_workers=self._write_workers, thread_name_prefix="write_behind"
+                )
+            future = self._write_executor.submit(self._write_stack, channel, time_point, stack_array)
+            self._write_futures.add(future)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future: Future) -> None:
+        with self._write_lock:
+            # futures already collected by 'flush' have had their error reported:
+            if future in self._write_futures:
+                self._collect_write_error(future)
+        self._write_slots.release()
+
+    def _collect_write_error(self, future: Future) -> None:
+        # Must be called with the lock held.
+        self._write_futures.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            self._write_errors.append(future.exception())
+
+    def _raise_write_errors(self, futures: Sequence[Future] = ()) -> None:
+        with self._write_lock:
+            for future in futures:
+                if future in self._write_futures:
+                    self._collect_write_error(future)
+            errors = self._write_errors
+            self._write_errors = []
+        if len(errors) > 0:
+            aprint(f"{len(errors)} background write(s) failed.")
+            raise errors[0]
+
+    def flush(self) -> None:
+        """Waits for all stacks queued by `write_stack` to be written, raises the first error that occurred if any."""
+        with self._write_lock:
+            futures = list(self._write_futures)
+        wait(futures)
+        # waiters are notified before done callbacks run, the errors of the waited futures are collected here:
+        self._raise_write_errors(futures)
+
+    def _write_stack(self, channel: str, time_point: int, stack_array: numpy.ndarray):
+        self._tune_channel(channel, stack_array)
         array_in_zarr = self.get_array(channel=channel, wrap_with_dask=False)
         array_in_zarr[time_point] = stack_array
+        self._invalidate_cached_stacks(channel, time_point)
+
+        projection_types = self.projection_types(channel)
+        if len(projection_types) > 0:
+            projections = compute_projections(stack_array, projection_types)
+            self._write_projections(channel, time_point, projections)
 
-        for axis in range(stack_array.ndim):
-            xp = Backend.get_xp_module()
-            projection = xp.max(stack_array, axis=axis)
-            projection_in_zarr = self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
-            projection_in_zarr[time_point] = projection
+        if self._pyramid is not None and channel in self._pyramid.channels:
+            self._pyramid.write(time_point, channel, stack_array)
+
+    def _invalidate_cached_stacks(self, channel: str, time_point: Optional[int] = None) -> None:
+        if self._stack_cache is not None:
+            self._stack_cache.invalidate(
+                lambda key: key[:2] == (self._path, channel) and (time_point is None or key[2] == time_point)
+            )
 
     def write_array(self, channel: str, array: numpy.ndarray):
+        self._tune_channel(channel, array[len(array) // 2])
         array_in_zarr = self.get_array(channel=channel, wrap_with_dask=False)
         array_in_zarr[...] = array
-
-        for axis in range(array.ndim - 1):
-            xp = Backend.get_xp_module()
-            projection = xp.max(array, axis=axis + 1)
-            projection_in_zarr = self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
-            projection_in_zarr[...] = projection
+        self._invalidate_cached_stacks(channel)
+
+        projection_types = self.projection_types(channel)
+        if len(projection_types) > 0:
+            # projected stack by stack, each projection array is then written at once:
+            stacks_projections = [compute_projections(stack, projection_types) for stack in array]
+            projections = {
+                key: numpy.stack([Backend.to_numpy(p[key]) for p in stacks_projections])
+                for key in stacks_projections[0]
+            }
+            self._write_projections(channel, slice(None), projections)
 
     def add_channel(
         self,
         name: str,
         shape: Tuple[int, ...],
         dtype: numpy.dtype,
-        chunks: Optional[Sequence[int]] = None,
+        chunks: Optional[Union[Sequence[int], str]] = None,
         enable_projections: bool = True,
         codec: Optional[str] = None,
         clevel: Optional[int] = None,
@@ -373,18 +603,27 @@ class ZDataset(BaseDataset):
         name : name of channel.
         shape : shape of correspodning array.
         dtype : dtype of array.
-        chunks: chunks shape.
-        codec: Compression codec to be used ('zstd', 'blosclz', 'lz4', 'lz4hc', 'zlib' or 'snappy').
+        chunks: chunks shape, or access pattern to tune them for: 'stack' (whole stacks), 'slice' (z slices, e.g.
+            for viewing) or 'tile' (scatter-gather tiles), see `dexp.datasets.storage_tuning.tune_chunks`.
+        codec: Compression codec to be used ('zstd', 'blosclz', 'lz4', 'lz4hc', 'zlib' or 'snappy'), or 'auto' to
+            benchmark codecs, compression levels and shuffles on the first stack written and pick the fastest to write
+            and read back. The channel is created with the default codec until then.
         clevel: An integer between 0 and 9 specifying the compression level.
 
+        The storage settings, and the benchmark results when tuned, are recorded in the channel metadata
+        (see `get_storage_metadata`).
+
         Returns
         -------
-        zarr array
+        zarr array. With codec 'auto', the arrays are recreated with the selected codec when tuned, the returned array
+        then reloads its metadata on each access so that it stays valid.
 
 
         """
         # check if channel exists:
         if name in self.channels():
+            if self._resume:
+                return self._resume_channel(name, shape, dtype)
             raise ValueError("Channel already exist!")
 
         if chunks is None:
@@ -393,12 +632,21 @@ class ZDataset(BaseDataset):
             else:
                 chunks = self._chunks
 
+        access = None
+        if is_access_pattern(chunks):
+            access = chunks
+            chunks = tune_chunks(shape, dtype, access)
+
         if clevel is None:
             clevel = self._clevel
 
         if codec is None:
             codec = self._codec
 
+        tune = codec == AUTO_CODEC
+        if tune:
+            codec, clevel = DEFAULT_CODEC, DEFAULT_CLEVEL
+
         aprint(f"chunks={chunks}")
 
         # Choosing the fill value to the largest value:
@@ -406,12 +654,46 @@ class ZDataset(BaseDataset):
 
         aprint(
             f"Adding channel: '{name}' of shape: {shape}, chunks:{chunks}, dtype: {dtype}, "
-            + f"fill_value: {fill_value}, codec: {codec}, clevel: {clevel}"
+            + f"fill_value: {fill_value}, codec: {'auto' if tune else codec}, clevel: {clevel}"
         )
         compressor = Blosc(cname=codec, clevel=clevel, shuffle=Blosc.BITSHUFFLE)
-        filters = []
 
         channel_group = self._root_group.create_group(name)
+        settings = dict(
+            shape=shape,
+            dtype=dtype,
+            chunks=chunks,
+            fill_value=fill_value,
+            enable_projections=enable_projections,
+            access=access,
+        )
+        # the returned array must pick up the codec selected when tuning:
+        array = self._create_channel_arrays(
+            channel_group, name, compressor=compressor, cache_metadata=not tune, **settings
+        )
+
+        if tune:
+            self._pending_tuning[name] = settings
+
+        return array
+
+    def _create_channel_arrays(
+        self,
+        channel_group: zarr.Group,
+        name: str,
+        shape: Tuple[int, ...],
+        dtype: numpy.dtype,
+        chunks: Sequence[int],
+        fill_value: Any,
+        enable_projections: bool,
+        compressor: Blosc,
+        access: Optional[str] = None,
+        benchmark: Optional[dict] = None,
+        overwrite: bool = False,
+        cache_metadata: bool = True,
+    ) -> zarr.Array:
+        filters = []
+
         array = channel_group.full(
             name=name,
             shape=shape,
@@ -420,31 +702,69 @@ class ZDataset(BaseDataset):
             filters=filters,
             compressor=compressor,
             fill_value=fill_value,
+            overwrite=overwrite,
+            cache_metadata=cache_metadata,
         )
 
         if enable_projections:
             ndim = len(shape) - 1
-            for axis in range(ndim):
-                proj_name = self._projection_name(name, axis)
-
-                proj_shape = list(shape)
-                del proj_shape[1 + axis]
-                proj_shape = tuple(proj_shape)
-
-                # chunking along time must be 1 to allow parallelism, but no chunking for each projection (not needed!)
-                proj_chunks = (1,) + (None,) * (len(chunks) - 2)
-
-                channel_group.full(
-                    name=proj_name,
-                    shape=proj_shape,
-                    dtype=dtype,
-                    chunks=proj_chunks,
-                    filters=filters,
+            for projection_type in self._projection_types:
+                for axis in range(ndim):
+                    proj_name = self._projection_name(name, axis, projection_type)
+
+                    proj_shape = list(shape)
+                    del proj_shape[1 + axis]
+                    proj_shape = tuple(proj_shape)
+
+                    # chunking along time must be 1 to allow parallelism, but no chunking for each projection
+                    proj_chunks = (1,) + (None,) * (len(chunks) - 2)
+
+                    channel_group.full(
+                        name=proj_name,
+                        shape=proj_shape,
+                        dtype=projection_dtype(projection_type, dtype),
+                        chunks=proj_chunks,
+                        filters=filters,
+                        compressor=compressor,
+                        fill_value=fill_value if projection_type in ("max", "min") else 0,
+                        overwrite=overwrite,
+                    )
+
+        channel_group.attrs["storage"] = storage_metadata(chunks, compressor, access, benchmark)
+        self._channel_projection_types.pop(name, None)
+        return array
+
+    def _tune_channel(self, channel: str, stack: numpy.ndarray) -> None:
+        if channel not in self._pending_tuning:
+            return
+
+        with self._tuning_lock:
+            # another thread might have tuned the channel while waiting:
+            settings = self._pending_tuning.get(channel)
+            if settings is None:
+                return
+            if self.get_array(channel).nchunks_initialized > 0:
+                # written by a copy of this dataset (e.g. in another process), the default codec is kept:
+                aprint(f"Channel '{channel}' already has data, its codec is not tuned.")
+                del self._pending_tuning[channel]
+                return
+            with asection(f"Tuning the codec of channel '{channel}' on its first stack"):
+                benchmark = tune_codec(Backend.to_numpy(stack))
+                compressor = Blosc(cname=benchmark["codec"], clevel=benchmark["clevel"], shuffle=benchmark["shuffle"])
+                # nothing was written yet, the arrays are recreated with the selected compressor:
+                self._create_channel_arrays(
+                    self._root_group[channel],
+                    channel,
                     compressor=compressor,
-                    fill_value=fill_value,
+                    benchmark=benchmark,
+                    overwrite=True,
+                    **settings,
                 )
+            del self._pending_tuning[channel]
 
-        return array
+    def get_storage_metadata(self, channel: str) -> Optional[dict]:
+        """Returns the storage settings of a channel (chunks, codec, ...) and how they were chosen, if recorded."""
+        return self._root_group[channel].attrs.get("storage")
 
     def add_channels_to(
         self,
@@ -501,14 +821,17 @@ class ZDataset(BaseDataset):
 
                         if add_projections:
                             ndim = array.ndim - 1
-                            for axis in range(ndim):
-                                proj_array = self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
-                                convenience.copy(
-                                    source=proj_array,
-                                    dest=dest_group,
-                                    name=self._projection_name(new_name, axis),
-                                    if_exists="replace" if overwrite else "raise",
-                                )
+                            for projection_type in self.projection_types(channel):
+                                for axis in range(ndim):
+                                    proj_array = self.get_projection_array(
+                                        channel=channel, axis=axis, projection_type=projection_type
+                                    )
+                                    convenience.copy(
+                                        source=proj_array,
+                                        dest=dest_group,
+                                        name=self._projection_name(new_name, axis, projection_type),
+                                        if_exists="replace" if overwrite else "raise",
+                                    )
 
             except (CopyError, NotImplementedError):
                 aprint("Channel already exists, set option '-w' to force overwriting! ")
@@ -577,20 +900,76 @@ class ZDataset(BaseDataset):
         """
         Returns the index of the first uninitialized time point or the last time point if it is fully initialized
         """
-        array = self.get_array(channel)
-        prog = re.compile(r"\.".join([r"\d+"] * min(1, array.ndim)))
-        initialized = {
-            int(k.split(".", 1)[0]) for k in zarr.storage.listdir(array.chunk_store, array._path) if prog.match(k)
-        }
-        return max(initialized)
+        complete = self.complete_time_points(channel)
+        nb_timepoints = self.nb_timepoints(channel)
+        return next((t for t in range(nb_timepoints) if t not in complete), nb_timepoints - 1)
+
+    def complete_time_points(self, channel: str) -> Set[int]:
+        """
+        Returns the time points of a channel that are completely written, i.e. all the chunks of the stack and of its
+        projections are in the store. Only the chunk listing is read, not the chunks.
+        Chunks spanning several time points cannot tell which time points were written, none is then complete.
+        """
+        arrays = [self.get_array(channel)]
+        for projection_type in self.projection_types(channel):
+            for axis in range(len(self.shape(channel)) - 1):
+                arrays.append(self.get_projection_array(channel, axis, projection_type=projection_type))
+
+        complete = None
+        for array in arrays:
+            if array.chunks[0] != 1:
+                aprint(f"Array '{array.path}' has chunks spanning several time points, cannot tell which are complete.")
+                return set()
+
+            # chunk keys are 't.z.y.x' whether the store is nested or not:
+            prog = re.compile(r"\.".join([r"\d+"] * array.ndim) + "$")
+            chunks_per_time_point = Counter(
+                int(key.split(".", 1)[0])
+                for key in zarr.storage.listdir(array.chunk_store, array._path)
+                if prog.match(key)
+            )
+            nb_chunks = m.prod(m.ceil(s / c) for s, c in zip(array.shape[1:], array.chunks[1:]))
+            array_complete = {t for t, count in chunks_per_time_point.items() if count == nb_chunks}
+            complete = array_complete if complete is None else complete & array_complete
 
-    def to_ome_zarr(self, path: str, force_dtype: Optional[int] = None, n_scales: int = 3) -> None:
-        ch = self.channels()[0]
+        return complete
+
+    def time_points_to_process(self, channel: str, time_points: Iterable[int]) -> List[int]:
+        """
+        Returns the time points that an operation writing to a channel must process: all of them,
+        or only those not yet complete when resuming.
+        """
+        time_points = list(time_points)
+        if not self._resume or channel not in self.channels():
+            return time_points
+
+        complete = self.complete_time_points(channel)
+        remaining = [t for t in time_points if t not in complete]
+        aprint(
+            f"Resuming channel '{channel}': {len(time_points) - len(remaining)} time points already written, "
+            + f"{len(remaining)} remaining."
+        )
+        return remaining
+
+    def _resume_channel(self, name: str, shape: Tuple[int, ...], dtype: numpy.dtype) -> Any:
+        array = self.get_array(name)
+        if tuple(array.shape) != tuple(shape) or array.dtype != numpy.dtype(dtype):
+            raise ValueError(
+                f"Cannot resume channel '{name}' of shape {array.shape} and dtype {array.dtype}, "
+                + f"expected shape {tuple(shape)} and dtype {numpy.dtype(dtype)}."
+            )
+        aprint(f"Resuming existing channel: '{name}' of shape: {shape}, dtype: {dtype}")
+        return array
+
+    def _ome_zarr_pyramid(
+        self, path: str, channels: Sequence[str], force_dtype: Optional[numpy.dtype], n_scales: int, overwrite: bool
+    ) -> OMEZarrPyramid:
+        ch = channels[0]
         dexp_shape = self.shape(ch)
 
         dtype = force_dtype if force_dtype is not None else self.dtype(ch)
 
-        for _ch in self.channels():
+        for _ch in channels:
             if dexp_shape != self.shape(_ch):
                 raise ValueError(
                     f"Channels {ch} and {_ch} have different "
@@ -604,61 +983,110 @@ class ZDataset(BaseDataset):
                     "could not convert to ome-zarr."
                 )
 
-        ome_zarr_shape = (dexp_shape[0], len(self.channels()), *dexp_shape[1:])
-
-        group = zarr.group(zarr.NestedDirectoryStore(path))
-
-        arrays = []
-        datasets = []
-        for i in range(n_scales):
-            factor = 2**i
-            array_path = f"{i}"
-            shape = ome_zarr_shape[:2] + tuple(int(m.ceil(s / factor)) for s in ome_zarr_shape[2:])
-            chunks = (1,) + self._default_chunks(shape, dtype)
-            ome_array = group.create_dataset(array_path, shape=shape, dtype=dtype, chunks=chunks)
-            arrays.append(ome_array)
-            datasets.append(
-                {
-                    "path": array_path,
-                    "coordinateTransformations": create_coord_transform(self.get_resolution(), factor),
-                }
-            )
+        return OMEZarrPyramid(
+            str(path),
+            shape=dexp_shape,
+            dtype=dtype,
+            channels=channels,
+            resolution=self.get_resolution(),
+            n_scales=n_scales,
+            name=self._path,
+            overwrite=overwrite,
+        )
+
+    def to_ome_zarr(
+        self, path: str, force_dtype: Optional[int] = None, n_scales: int = 3, workers: int = 1, devices=(0,)
+    ) -> None:
+        """Converts this dataset to an OME-Zarr pyramid, the (time point, channel) stacks are converted in parallel.
+
+        Parameters
+        ----------
+        path : path of the OME-Zarr store.
+        force_dtype : dtype of the pyramid, all channels must have the same dtype otherwise.
+        n_scales : number of pyramid levels, including the full resolution.
+        workers : number of threads converting stacks concurrently,
+            negative numbers n correspond to: number_of_cores / |n|.
+        devices : CUDA devices used by the workers, in turn.
+        """
+        pyramid = self._ome_zarr_pyramid(path, self.channels(), force_dtype, n_scales, overwrite=True)
+        tasks = [(t, c) for t in range(self.nb_timepoints(self.channels()[0])) for c in pyramid.channels]
+        n_workers = compute_num_workers(workers, len(tasks))
+
+        def _convert(i: int) -> None:
+            t, channel = tasks[i]
+            with BestBackend(device_id=devices[i % len(devices)]):
+                pyramid.write(t, channel, self.get_stack(channel, t))
 
-        with BestBackend() as bkd:
-            for t in range(self.nb_timepoints(ch)):
-                aprint(f"Converting time point {t} ...", end="\r")
-                for c, channel in enumerate(self.channels()):
-                    stack = self.get_stack(channel, t)
-                    arrays[0][t, c] = stack
-                    stack = bkd.to_backend(stack)
-                    for i in range(1, n_scales):
-                        factors = (2**i,) * stack.ndim
-                        arrays[i][t, c] = bkd.to_numpy(downscale_local_mean(stack, factors))
+        with asection(f"Converting {len(tasks)} stacks to OME zarr at {path} with {n_workers} workers"):
+            with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="ome_zarr") as executor:
+                for i, _ in enumerate(executor.map(_convert, range(len(tasks)))):
+                    aprint(f"Converted stack {i + 1}/{len(tasks)}", end="\r")
 
         aprint("Done conversion to OME zarr")
 
-        group.attrs["multiscales"] = [
-            {
-                "version": CurrentFormat().version,
-                "datasets": datasets,
-                "axes": [
-                    {"name": "t", "type": "time"},
-                    {"name": "c", "type": "channel"},
-                    {"name": "z", "type": "space", "unit": "micrometer"},
-                    {"name": "y", "type": "space", "unit": "micrometer"},
-                    {"name": "x", "type": "space", "unit": "micrometer"},
-                ],
-                "type": "local_mean",
-                "metadata": {
-                    "method": DOWNSCALE_METHOD,
-                    "version": sk_version,
-                },
-            }
-        ]
-        group.attrs["omero"] = default_omero_metadata(self._path, self.channels(), dtype)
+    def set_ome_zarr_pyramid(
+        self,
+        path: Optional[str],
+        channels: Optional[Sequence[str]] = None,
+        force_dtype: Optional[numpy.dtype] = None,
+        n_scales: int = 3,
+    ) -> Optional[OMEZarrPyramid]:
+        """Writes an OME-Zarr pyramid of the given channels incrementally: each stack written with `write_stack`
+        is also downscaled and written to the pyramid, background writes included. Channels must already exist.
+
+        Parameters
+        ----------
+        path : path of the OME-Zarr store, an existing store is reused (e.g. when resuming), None disables it.
+        channels : channels of the pyramid, all channels when None.
+        force_dtype : dtype of the pyramid, all channels must have the same dtype otherwise.
+        n_scales : number of pyramid levels, including the full resolution.
+        """
+        self.flush()
+        if path is None:
+            self._pyramid = None
+        else:
+            channels = self.channels() if channels is None else list(channels)
+            self._pyramid = self._ome_zarr_pyramid(path, channels, force_dtype, n_scales, overwrite=False)
+        return self._pyramid
 
     def __getitem__(self, channel: str) -> StackIterator:
-        return StackIterator(self.get_array(channel, wrap_with_tensorstore=True), self._slicing)
+        return self._stack_iterator(self.get_array(channel, wrap_with_tensorstore=True))
+
+    def process_local_options(self) -> List[str]:
+        options = super().process_local_options()
+        if self._write_behind > 0:
+            options.append("write_behind")
+        if self._lazy_projections:
+            options.append("lazy_projections")
+        if len(self._pending_tuning) > 0:
+            options.append("codec auto")
+        return options
+
+    def __getstate__(self) -> dict:
+        # Threads cannot be pickled, a copy sent to another process writes synchronously
+        state = self.__dict__.copy()
+        state["_write_behind"] = 0
+        state["_write_executor"] = None
+        state["_write_slots"] = None
+        state["_write_futures"] = set()
+        state["_write_errors"] = []
+        state["_write_lock"] = None
+        # channels not tuned yet keep their default codec, copies in other processes must not recreate them:
+        state["_pending_tuning"] = {}
+        state["_tuning_lock"] = None
+        # copies do not outlive their operation, they write projections as they go:
+        state["_lazy_projections"] = False
+        state["_pending_projections"] = {}
+        state["_projections_lock"] = None
+        state["_channel_projection_types"] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._write_slots = threading.BoundedSemaphore(1)
+        self._write_lock = threading.Lock()
+        self._tuning_lock = threading.Lock()
+        self._projections_lock = threading.Lock()
 
     def __contains__(self, channel: str) -> bool:
         """Checks if channels exists, valid for when using multiple process."""
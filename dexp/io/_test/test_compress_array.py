@@ -1,6 +1,13 @@
 import numpy
 
-from dexp.io.compress_array import compress_array, decompress_array
+from dexp.io.compress_array import (
+    chunk_index,
+    compress_array,
+    decompress_array,
+    decompress_file_range,
+    decompress_range,
+    file_chunk_index,
+)
 
 
 def do_test(array_dc, array_uc, min_num_chunks=0):
@@ -41,3 +48,45 @@ def test_compress_many_chunks():
     array_uc = numpy.linspace(0, 1024, 1000).astype(numpy.uint16)
     array_dc = numpy.empty_like(array_uc)
     do_test(array_dc, array_uc, min_num_chunks=987)
+
+
+def test_compress_parallel_chunks():
+    array_uc = numpy.random.default_rng(0).integers(0, 1024, size=(32, 64, 64)).astype(numpy.uint16)
+
+    for index in (True, False):
+        compressed_array = compress_array(array_uc, max_chunk_bytes=2**14, num_threads=4, index=index)
+        assert len(chunk_index(compressed_array)[0]) > 2
+
+        array_dc = numpy.empty_like(array_uc)
+        decompress_array(compressed_array, array_dc, num_threads=4)
+        assert (array_uc == array_dc).all()
+
+
+def test_decompress_range():
+    array_uc = numpy.random.default_rng(0).integers(0, 1024, size=(32, 64, 64)).astype(numpy.uint16)
+    slice_nbytes = array_uc[0].nbytes
+
+    for index in (True, False):
+        compressed_array = compress_array(array_uc, max_chunk_bytes=3 * slice_nbytes + 17, index=index)
+
+        for z_start, z_stop in ((0, 1), (5, 12), (30, 32)):
+            decompressed = decompress_range(compressed_array, z_start * slice_nbytes, z_stop * slice_nbytes)
+            decompressed = decompressed.view(numpy.uint16).reshape((z_stop - z_start,) + array_uc.shape[1:])
+            assert (array_uc[z_start:z_stop] == decompressed).all()
+
+
+def test_decompress_file_range(tmp_path):
+    array = numpy.random.default_rng(0).integers(0, 2**16, size=(32, 64, 64), dtype=numpy.uint16)
+
+    for index in (True, False):
+        file_name = tmp_path / f"array_{index}.blc"
+        file_name.write_bytes(compress_array(array, max_chunk_bytes=array.nbytes // 7, index=index))
+
+        with open(file_name, "rb") as file:
+            chunk_offsets = file_chunk_index(file)
+            assert all(numpy.array_equal(a, b) for a, b in zip(chunk_offsets, chunk_index(file_name.read_bytes())))
+
+            start, stop = 5 * array[0].nbytes, 9 * array[0].nbytes
+            decompressed = decompress_file_range(file, start, stop, chunk_offsets)
+            assert numpy.array_equal(decompressed.view(numpy.uint16).reshape(4, 64, 64), array[5:9])
+            assert len(decompress_file_range(file, 0, 0)) == 0
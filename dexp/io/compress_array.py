@@ -1,13 +1,53 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
+from typing import List, Optional, Tuple
 
 import blosc
+import numpy
 from blosc import compress_ptr, decompress_ptr, get_cbuffer_sizes
 from numpy import ndarray
 
+# Magic bytes starting buffers that hold a chunk-offset header, Blosc headers start with a version byte (1 or 2):
+_INDEX_MAGIC = b"DEXPBLC1"
+_INDEX_HEADER = struct.Struct("<8sQ")
 
-def compress_array(array: ndarray, clevel: int = 3, compressor: str = "lz4", min_num_chunks: int = 0) -> bytes:
+# Default maximal size of the chunks that are compressed and decompressed concurrently:
+DEFAULT_MAX_CHUNK_BYTES = 2**24
+
+
+def _default_num_threads(num_threads: Optional[int], num_chunks: int) -> int:
+    if num_threads is None:
+        num_threads = os.cpu_count() or 1
+    return max(1, min(num_threads, num_chunks))
+
+
+def _map(function, items, num_threads: int) -> List:
+    if num_threads <= 1:
+        return [function(item) for item in items]
+
+    # Blosc only releases the GIL when asked to, that's what makes compression with threads parallel:
+    previous_releasegil = blosc.set_releasegil(True)
+    try:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            return list(executor.map(function, items))
+    finally:
+        blosc.set_releasegil(previous_releasegil)
+
+
+def compress_array(
+    array: ndarray,
+    clevel: int = 3,
+    compressor: str = "lz4",
+    min_num_chunks: int = 0,
+    max_chunk_bytes: int = DEFAULT_MAX_CHUNK_BYTES,
+    num_threads: Optional[int] = None,
+    index: bool = True,
+) -> bytes:
     """
     Compresses an arbitrary ndarray that supports the '__array_interface__' into a Blosc compressed buffer.
+    Chunks are compressed concurrently.
 
     Parameters
     ----------
@@ -15,6 +55,10 @@ def compress_array(array: ndarray, clevel: int = 3, compressor: str = "lz4", min
     clevel: Compression level
     compressor: compressor (any supported by Blosc)
     min_num_chunks: Minimum number of chunks to split array into before compression.
+    max_chunk_bytes: Maximum size of each chunk in bytes, capped by the Blosc maximum buffer size.
+    num_threads: Number of threads compressing chunks, None uses all cores.
+    index: If True the buffer starts with a chunk-offset header that enables parallel and partial decompression,
+        if False the buffer is a plain concatenation of Blosc chunks (legacy format, as written by ClearControl).
 
     Returns
     -------
@@ -23,11 +67,10 @@ def compress_array(array: ndarray, clevel: int = 3, compressor: str = "lz4", min
     """
     array_address = array.__array_interface__["data"][0]
     array_length = array.nbytes
-    end_address = array_address + array_length
     itemsize = array.itemsize
 
     # Blosc does not support 64bit buffers, only 32 bit buffers:
-    max_chunk_length = blosc.MAX_BUFFERSIZE
+    max_chunk_length = min(max_chunk_bytes, blosc.MAX_BUFFERSIZE)
 
     # Let's avoid small trailing chunks and make them all about teh same size:
     number_of_chunks = max(2, ceil(array_length / max_chunk_length)) if array_length > max_chunk_length else 1
@@ -40,73 +83,274 @@ def compress_array(array: ndarray, clevel: int = 3, compressor: str = "lz4", min
     # Let' make the chunks large enough that we are garanteed to cover the whole array:
     approx_chunk_length_in_bytes += number_of_chunks * itemsize
 
-    # this will hold the compressed data:
-    compressed_buffer = bytearray()
+    # Chunk offsets in the uncompressed array:
+    decompressed_offsets = list(range(0, array_length, approx_chunk_length_in_bytes)) + [array_length]
+    chunks = list(zip(decompressed_offsets[:-1], decompressed_offsets[1:]))
 
-    # we start reading the array data here:
-    chunk_address = array_address
-
-    # We loop through each chunk:
-    while chunk_address < end_address:
-        chunk_length_in_bytes = min(approx_chunk_length_in_bytes, end_address - chunk_address)
-        compressed_chunk = compress_ptr(
-            address=chunk_address,
-            items=chunk_length_in_bytes // itemsize,
+    def _compress(chunk: Tuple[int, int]) -> bytes:
+        start, stop = chunk
+        return compress_ptr(
+            address=array_address + start,
+            items=(stop - start) // itemsize,
             typesize=itemsize,
             clevel=clevel,
             shuffle=blosc.BITSHUFFLE,
             cname=compressor,
         )
-        if number_of_chunks == 1:
-            # If there is only one chunk, let's not be complicated about it:
-            compressed_buffer = compressed_chunk
-        else:
-            # If not, so bit it:
-            compressed_buffer.extend(compressed_chunk)
-        chunk_address += chunk_length_in_bytes
+
+    compressed_chunks = _map(_compress, chunks, _default_num_threads(num_threads, len(chunks)))
+
+    if not index and len(compressed_chunks) == 1:
+        # If there is only one chunk, let's not be complicated about it:
+        return compressed_chunks[0]
+
+    compressed_offsets = numpy.cumsum([0] + [len(chunk) for chunk in compressed_chunks], dtype=numpy.uint64)
+
+    if index:
+        header = _INDEX_HEADER.pack(_INDEX_MAGIC, len(compressed_chunks))
+        header += compressed_offsets.astype("<u8").tobytes()
+        header += numpy.asarray(decompressed_offsets, dtype="<u8").tobytes()
+    else:
+        header = b""
+
+    # this will hold the compressed data, allocated once:
+    compressed_buffer = bytearray(len(header) + int(compressed_offsets[-1]))
+    compressed_buffer[: len(header)] = header
+    for chunk, offset in zip(compressed_chunks, compressed_offsets):
+        offset = len(header) + int(offset)
+        compressed_buffer[offset : offset + len(chunk)] = chunk
 
     return bytes(compressed_buffer)
 
 
-def decompress_array(compressed_bytes, out_array: ndarray = None) -> ndarray:
+def chunk_index(compressed_bytes) -> Tuple[ndarray, ndarray, int]:
     """
-    Decompresses an array compressed with the 'compress_array' function.
+    Returns the chunk offsets of a buffer compressed with the 'compress_array' function.
+    Buffers without a chunk-offset header (legacy format) are indexed by walking through the Blosc chunk headers.
 
     Parameters
     ----------
     compressed_bytes: buffer containing compressed data
-    out_array: array of _correct_ size to put the decompressed daat in.
 
     Returns
     -------
-    Same array as passed as 'out_array'
+    Offsets of the chunks in the compressed data, offsets of the chunks in the decompressed data,
+    and offset of the compressed data in the buffer. Both offset arrays have an extra last element
+    that holds the total length.
 
     """
-
-    # get the array pointer and length in bytes:
-    array_address = out_array.__array_interface__["data"][0]
+    if bytes(compressed_bytes[: len(_INDEX_MAGIC)]) == _INDEX_MAGIC:
+        _, num_chunks = _INDEX_HEADER.unpack_from(compressed_bytes, 0)
+        offset = _INDEX_HEADER.size
+        compressed_offsets = numpy.frombuffer(compressed_bytes, dtype="<u8", count=num_chunks + 1, offset=offset)
+        offset += compressed_offsets.nbytes
+        decompressed_offsets = numpy.frombuffer(compressed_bytes, dtype="<u8", count=num_chunks + 1, offset=offset)
+        offset += decompressed_offsets.nbytes
+        return compressed_offsets.astype(numpy.int64), decompressed_offsets.astype(numpy.int64), offset
 
     # prepare the basics:
     num_of_compressed_bytes = len(compressed_bytes)
-    offset_compressed = 0
-    address_decompressed = array_address
+    compressed_offsets = [0]
+    decompressed_offsets = [0]
+
+    while num_of_compressed_bytes - compressed_offsets[-1] > 32:
+        # This is the BLOSC header:
+        offset = compressed_offsets[-1]
+        blosc_header = bytes(compressed_bytes[offset : offset + 32])
+
+        # we check how large is the chunk:
+        num_decompressed_bytes, num_compressed_bytes, _ = get_cbuffer_sizes(blosc_header)
+
+        compressed_offsets.append(offset + num_compressed_bytes)
+        decompressed_offsets.append(decompressed_offsets[-1] + num_decompressed_bytes)
+
+    return numpy.asarray(compressed_offsets), numpy.asarray(decompressed_offsets), 0
+
+
+def file_chunk_index(file) -> Tuple[ndarray, ndarray, int]:
+    """
+    Returns the chunk offsets of a file holding a buffer compressed with the 'compress_array' function.
+    Only the headers are read: the chunk-offset header if present, otherwise the Blosc header of each chunk
+    by seeking from one chunk to the next.
 
-    while num_of_compressed_bytes - offset_compressed > 32:
+    Parameters
+    ----------
+    file: binary file object opened for reading, must be seekable.
 
+    Returns
+    -------
+    Same as 'chunk_index'.
+
+    """
+    file.seek(0)
+    header = file.read(_INDEX_HEADER.size)
+    if header[: len(_INDEX_MAGIC)] == _INDEX_MAGIC:
+        _, num_chunks = _INDEX_HEADER.unpack(header)
+        offsets = numpy.frombuffer(file.read(2 * (num_chunks + 1) * 8), dtype="<u8").astype(numpy.int64)
+        return offsets[: num_chunks + 1], offsets[num_chunks + 1 :], _INDEX_HEADER.size + offsets.nbytes
+
+    # prepare the basics:
+    num_of_compressed_bytes = file.seek(0, os.SEEK_END)
+    compressed_offsets = [0]
+    decompressed_offsets = [0]
+
+    while num_of_compressed_bytes - compressed_offsets[-1] > 32:
         # This is the BLOSC header:
-        blosc_header = bytes(compressed_bytes[offset_compressed : offset_compressed + 32])
+        offset = compressed_offsets[-1]
+        file.seek(offset)
+        blosc_header = file.read(32)
 
-        # we check how large is the first chunk available:
+        # we check how large is the chunk:
         num_decompressed_bytes, num_compressed_bytes, _ = get_cbuffer_sizes(blosc_header)
 
-        # we prepare the corresponding region of the array:
-        compressed_chunk = compressed_bytes[offset_compressed : offset_compressed + num_compressed_bytes]
+        compressed_offsets.append(offset + num_compressed_bytes)
+        decompressed_offsets.append(decompressed_offsets[-1] + num_decompressed_bytes)
+
+    return numpy.asarray(compressed_offsets), numpy.asarray(decompressed_offsets), 0
+
+
+def chunk_range(index: Tuple[ndarray, ndarray, int], start: int, stop: int) -> range:
+    """
+    Returns the ids of the chunks covering a byte range of the decompressed data.
+
+    Parameters
+    ----------
+    index: chunk index as returned by 'chunk_index' or 'file_chunk_index'.
+    start: first byte of the range in the decompressed data
+    stop: end (exclusive) of the range in the decompressed data
+
+    Returns
+    -------
+    Range of chunk ids.
+
+    """
+    _, decompressed_offsets, _ = index
+
+    if not (0 <= start <= stop <= decompressed_offsets[-1]):
+        raise ValueError(f"Invalid range [{start}, {stop}) for {decompressed_offsets[-1]} decompressed bytes.")
+
+    first = int(numpy.searchsorted(decompressed_offsets, start, side="right")) - 1
+    last = int(numpy.searchsorted(decompressed_offsets, stop, side="left"))
+    return range(first, max(first, last))
+
 
-        # do the actual decompression:
-        decompress_ptr(compressed_chunk, address_decompressed)
+def _decompress_chunks(compressed_bytes, chunk_ids, index, address: int, start: int, num_threads: Optional[int]):
+    compressed_offsets, decompressed_offsets, data_offset = index
+    compressed_bytes = memoryview(compressed_bytes)
 
-        # we move the pointers forward:
-        offset_compressed += num_compressed_bytes
-        address_decompressed += num_decompressed_bytes
+    def _decompress(chunk_id: int) -> None:
+        begin = data_offset + int(compressed_offsets[chunk_id])
+        end = data_offset + int(compressed_offsets[chunk_id + 1])
+        decompress_ptr(compressed_bytes[begin:end], address + int(decompressed_offsets[chunk_id]) - start)
+
+    _map(_decompress, chunk_ids, _default_num_threads(num_threads, len(chunk_ids)))
+
+
+def decompress_array(compressed_bytes, out_array: ndarray = None, num_threads: Optional[int] = None) -> ndarray:
+    """
+    Decompresses an array compressed with the 'compress_array' function, with or without chunk-offset header.
+    Chunks are decompressed concurrently.
+
+    Parameters
+    ----------
+    compressed_bytes: buffer containing compressed data
+    out_array: array of _correct_ size to put the decompressed daat in.
+    num_threads: Number of threads decompressing chunks, None uses all cores.
+
+    Returns
+    -------
+    Same array as passed as 'out_array'
+
+    """
+
+    # get the array pointer:
+    array_address = out_array.__array_interface__["data"][0]
+
+    index = chunk_index(compressed_bytes)
+    num_chunks = len(index[0]) - 1
+
+    _decompress_chunks(compressed_bytes, range(num_chunks), index, array_address, 0, num_threads)
 
     return out_array
+
+
+def decompress_range(
+    compressed_bytes,
+    start: int,
+    stop: int,
+    index: Optional[Tuple[ndarray, ndarray, int]] = None,
+    num_threads: Optional[int] = None,
+) -> ndarray:
+    """
+    Decompresses a byte range of an array compressed with the 'compress_array' function,
+    only the chunks overlapping the range are decompressed.
+
+    Parameters
+    ----------
+    compressed_bytes: buffer containing compressed data
+    start: first byte of the range in the decompressed data
+    stop: end (exclusive) of the range in the decompressed data
+    index: chunk index as returned by 'chunk_index', computed if None.
+    num_threads: Number of threads decompressing chunks, None uses all cores.
+
+    Returns
+    -------
+    Decompressed bytes of the range as an uint8 array.
+
+    """
+    if index is None:
+        index = chunk_index(compressed_bytes)
+    _, decompressed_offsets, _ = index
+
+    # chunks covering the requested range:
+    chunk_ids = chunk_range(index, start, stop)
+
+    chunks_start = int(decompressed_offsets[chunk_ids.start])
+    buffer = numpy.empty(int(decompressed_offsets[chunk_ids.stop]) - chunks_start, dtype=numpy.uint8)
+    _decompress_chunks(
+        compressed_bytes, chunk_ids, index, buffer.__array_interface__["data"][0], chunks_start, num_threads
+    )
+
+    return buffer[start - chunks_start : stop - chunks_start]
+
+
+def decompress_file_range(
+    file,
+    start: int,
+    stop: int,
+    index: Optional[Tuple[ndarray, ndarray, int]] = None,
+    num_threads: Optional[int] = None,
+) -> ndarray:
+    """
+    Decompresses a byte range of an array compressed with the 'compress_array' function and stored in a file,
+    only the compressed chunks overlapping the range are read from the file and decompressed.
+
+    Parameters
+    ----------
+    file: binary file object opened for reading, must be seekable.
+    start: first byte of the range in the decompressed data
+    stop: end (exclusive) of the range in the decompressed data
+    index: chunk index as returned by 'file_chunk_index', computed if None.
+    num_threads: Number of threads decompressing chunks, None uses all cores.
+
+    Returns
+    -------
+    Decompressed bytes of the range as an uint8 array.
+
+    """
+    if index is None:
+        index = file_chunk_index(file)
+    compressed_offsets, decompressed_offsets, data_offset = index
+
+    chunk_ids = chunk_range(index, start, stop)
+
+    # we only read the compressed bytes of the chunks covering the range:
+    begin = int(compressed_offsets[chunk_ids.start])
+    end = int(compressed_offsets[chunk_ids.stop])
+    file.seek(data_offset + begin)
+    compressed_bytes = file.read(end - begin)
+
+    # offsets relative to the bytes read, only valid for the chunks covering the range:
+    local_index = (compressed_offsets - begin, decompressed_offsets, 0)
+
+    return decompress_range(compressed_bytes, start, stop, local_index, num_threads)
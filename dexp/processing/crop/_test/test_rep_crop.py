@@ -19,3 +19,38 @@ def test_representative_crop_cupy():
 def _test_representative_crop():
     _demo_representative_crop(display=False, fast_mode=True)
     _demo_representative_crop(display=False, fast_mode=False)
+
+
+def test_representative_crop_scores():
+    import numpy as np
+
+    from dexp.processing.crop.representative_crop import (
+        _crop_scores,
+        evaluate_crop,
+        representative_crop,
+    )
+
+    image = np.random.default_rng(0).uniform(1, 2, size=(40, 50)).astype(np.float32)
+    crop_shape = (8, 10)
+
+    with NumpyBackend():
+        # without smoothing, windowed scores are the scores of each crop:
+        scores = _crop_scores(image, crop_shape, mode="contrast", smoothing_size=0)
+        assert scores.shape == (33, 41)
+        for translation in [(0, 0), (5, 7), (32, 40)]:
+            crop_slice = tuple(slice(t, t + s) for t, s in zip(translation, crop_shape))
+            score = evaluate_crop(image[crop_slice], None, None, mode="contrast", smoothing_size=0)
+            np.testing.assert_allclose(scores[translation], score, rtol=1e-5)
+
+        # the search is exhaustive and deterministic:
+        crop, crop_slice = representative_crop(
+            image, mode="contrast", crop_size=80, min_length=1, smoothing_size=0, return_slice=True
+        )
+        best = np.unravel_index(np.argmax(scores), scores.shape)
+        assert crop_slice == tuple(slice(t, t + s) for t, s in zip(best, crop_shape))
+        assert (
+            crop_slice
+            == representative_crop(
+                image, mode="contrast", crop_size=80, min_length=1, smoothing_size=0, return_slice=True
+            )[1]
+        )
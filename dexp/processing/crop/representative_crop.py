@@ -1,8 +1,7 @@
 import math
-import time
-from random import randrange
 from typing import Optional
 
+import numpy
 from arbol import aprint
 
 from dexp.utils.backends import Backend
@@ -19,6 +18,7 @@ def representative_crop(
     fast_mode: bool = True,
     fast_mode_num_crops: int = 1500,
     max_time_in_seconds: float = 10,
+    max_voxels: int = 2**24,
     return_slice: bool = False,
     display: bool = False,
 ):
@@ -28,6 +28,9 @@ def representative_crop(
     content each crop contains. Empirically, this highly correlates with where
     I (Loic A. Royer) tend to look at in images.
 
+    The score map (e.g. sobel magnitudes of the smoothed image) is computed once for the whole image,
+    the score of every possible crop is then obtained from windowed sums of the map (summed-area tables)
+    and the best crop is the exact argmax: the search is exhaustive and deterministic.
 
     Parameters
     ----------
@@ -54,14 +57,17 @@ def representative_crop(
         If possible favours crops that have odd shape lengths.
 
     fast_mode: bool
-        In fast mode we pick random crops instead of checking every possible strided crop.
+        In fast mode the score map of images larger than 'max_voxels' is computed on a strided (downscaled)
+        image, crops are then positioned on the strided grid.
 
     fast_mode_num_crops: int
-        Number of crops to check in fast mode.
+        Unused, kept for compatibility: every crop is scored.
 
     max_time_in_seconds: float
-        Maximum amount of time in seconds that this function should run for.
-        This avoids excessive computation for very large images.
+        Unused, kept for compatibility: the search is no longer interrupted.
+
+    max_voxels: int
+        Maximum number of voxels of the score map in fast mode.
 
     return_slice : bool
         If True the slice is returned too:
@@ -75,9 +81,6 @@ def representative_crop(
 
     """
 
-    # Backend:
-    xp = Backend.get_xp_module(image)
-
     # Number of voxels in image:
     num_voxels = image.size
 
@@ -104,97 +107,28 @@ def representative_crop(
         min_length = min(cropped_shape)
         cropped_shape = tuple((min_length,) * image.ndim)
 
-    # range for translation:
-    translation_range = tuple(s - cs for s, cs in zip(image.shape, cropped_shape))
-
-    # grid for translations:
-    translation_indices = tuple(max(1, int(2 * r / cs)) for r, cs in zip(translation_range, cropped_shape))
-
-    # min and max for crop value normalisation:
-    image_min = None
-    image_max = None
-
-    # We loop through a number of crops and keep the one wit the best score:
-    best_score = -1
-    best_slice = None
-    best_crop = None
-
-    # Start time:
-    start_time = time.time()
-
-    if fast_mode and image.size > 1e6:
-
-        # We make sure that the number of crops is not too large given
-        # the relative size of the crop versus whole image:
-        fast_mode_num_crops = min(fast_mode_num_crops, int(image.size / crop_size))
-
-        for index in range(fast_mode_num_crops):
-
-            # translation:
-            translation = tuple((randrange(0, s - cs) if cs != s else 0) for s, cs in zip(image.shape, cropped_shape))
-
-            # function to get crop slice:
-            def _crop_slice(translation, cropped_shape, downscale: int = 1):
-                return tuple(slice(t, t + s, downscale) for t, s in zip(translation, cropped_shape))
-
-            # slice object for cropping:
-            crop_slice = _crop_slice(translation, cropped_shape, 2 if image.size > 1e8 else 1)
-
-            # extract crop:
-            crop = image[crop_slice]
-
-            score = evaluate_crop(
-                crop=crop,
-                image_min=image_min,
-                image_max=image_max,
-                mode=mode,
-                smoothing_size=smoothing_size,
-            )
-
-            # slice object for the actual crop:
-            crop_slice = _crop_slice(translation, cropped_shape, 1)
-
-            # update best score and image:
-            if score > best_score and not math.isinf(score):
-                best_score = score
-                best_slice = crop_slice
-
-            if time.time() > start_time + max_time_in_seconds:
-                aprint("Interrupting crop search because of timeout!")
-                break
+    # stride of the score map:
+    stride = 1
+    if fast_mode and image.size > max_voxels:
+        stride = int(math.ceil((image.size / max_voxels) ** (1 / image.ndim)))
+    strided_image = image[(slice(None, None, stride),) * image.ndim]
+    strided_crop_shape = tuple(max(1, min(cs // stride, s)) for cs, s in zip(cropped_shape, strided_image.shape))
 
-    else:
-        for index in xp.ndindex(translation_indices):
-
-            # translation:
-            translation = tuple(int(i * cs / 2) for i, cs in zip(index, cropped_shape))
-
-            # slice object for cropping:
-            crop_slice = tuple(slice(t, t + s) for t, s in zip(translation, cropped_shape))
-
-            # extract crop:
-            crop = image[crop_slice]
-
-            score = evaluate_crop(
-                crop=crop,
-                image_min=image_min,
-                image_max=image_max,
-                mode=mode,
-                smoothing_size=smoothing_size,
-            )
+    # scores of the crops at each (strided) translation:
+    scores = _crop_scores(strided_image, strided_crop_shape, mode=mode, smoothing_size=smoothing_size)
+    scores = Backend.to_numpy(scores)
+    scores[~numpy.isfinite(scores)] = -numpy.inf
+    best_index = numpy.unravel_index(numpy.argmax(scores), scores.shape)
 
-            # update best score and image:
-            if score > best_score and not math.isinf(score):
-                best_score = score
-                best_slice = crop_slice
-
-            if time.time() > start_time + max_time_in_seconds:
-                aprint("Interrupting crop search because of timeout!")
-                break
-
-    if best_slice is None:
+    if scores[best_index] == -numpy.inf:
         raise RuntimeError("Could not find representative crop.")
 
+    translation = tuple(min(int(i) * stride, s - cs) for i, s, cs in zip(best_index, image.shape, cropped_shape))
+    best_slice = tuple(slice(t, t + cs) for t, cs in zip(translation, cropped_shape))
+    aprint(
+        f"Best crop at {translation} among {scores.size} crops of shape {cropped_shape}, score: {scores[best_index]}"
+    )
+
     # We make sure to have the full and original crop!
     best_crop = image[best_slice]
 
@@ -218,6 +152,60 @@ def representative_crop(
         return best_crop
 
 
+def _crop_scores(image, crop_shape, mode, smoothing_size):
+    # Scores of all crops of the given shape, indexed by their translation: the same scores as 'evaluate_crop',
+    # the standard deviation of the score map over the crop normalised by the maximum value of the crop,
+    # but computed from the score map of the whole image.
+    xp = Backend.get_xp_module(image)
+    sp = Backend.get_sp_module(image)
+
+    image = Backend.to_backend(image)
+    smoothed = _smoothing(image.astype(xp.float32, copy=False), size=smoothing_size)
+    score_map = _score_map(smoothed, mode).astype(xp.float64, copy=False)
+
+    num_voxels = math.prod(crop_shape)
+    mean = _window_sums(score_map, crop_shape) / num_voxels
+    mean_of_squares = _window_sums(score_map * score_map, crop_shape) / num_voxels
+    std = xp.sqrt(xp.maximum(mean_of_squares - mean * mean, 0))
+
+    # maximum of each crop, windows of centered maximum filters start at 'index - size // 2':
+    maximum = sp.ndimage.maximum_filter(image, size=crop_shape, mode="nearest")
+    maximum = maximum[tuple(slice(cs // 2, cs // 2 + n) for cs, n in zip(crop_shape, std.shape))]
+    maximum = maximum.astype(xp.float64, copy=False)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return std / maximum
+
+
+def _window_sums(array, window_shape):
+    # Sums over all windows of the given shape, from cumulative sums along each axis (summed-area table):
+    xp = Backend.get_xp_module(array)
+    for axis, length in enumerate(window_shape):
+        padding = [(0, 0)] * array.ndim
+        padding[axis] = (1, 0)
+        cumulative = xp.pad(xp.cumsum(array, axis=axis), padding)
+        upper = [slice(None)] * array.ndim
+        lower = [slice(None)] * array.ndim
+        upper[axis] = slice(length, None)
+        lower[axis] = slice(None, -length)
+        array = cumulative[tuple(upper)] - cumulative[tuple(lower)]
+    return array
+
+
+def _score_map(smoothed, mode):
+    sp = Backend.get_sp_module(smoothed)
+    if mode == "contrast":
+        return smoothed
+    elif mode == "sobel":
+        return _sobel_magnitude(smoothed)
+    elif mode == "sobelmin":
+        return _sobel_minimum(smoothed)
+    elif mode == "laplace":
+        return sp.ndimage.laplace(smoothed)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+
 def evaluate_crop(crop, image_min, image_max, mode, smoothing_size):
 
     # Backend:
@@ -2,9 +2,14 @@ import numpy
 from skimage.data import camera
 from skimage.util import random_noise
 
-from dexp.processing.deconvolution.lr_deconvolution import lucy_richardson_deconvolution
+from dexp.processing.deconvolution.lr_deconvolution import (
+    _otf_cache,
+    clear_otf_cache,
+    lucy_richardson_deconvolution,
+)
 from dexp.processing.filters.fft_convolve import fft_convolve
 from dexp.processing.filters.kernels.gaussian import gaussian_kernel_nd
+from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
 from dexp.utils.backends import Backend, CupyBackend, NumpyBackend
 
 
@@ -43,3 +48,57 @@ def _test_lr_deconvolution():
     print(f"Error = {error}")
 
     assert error < 0.001
+
+
+def test_lr_deconvolution_spectral_numpy():
+    with NumpyBackend():
+        _test_lr_deconvolution_spectral()
+
+
+def _test_lr_deconvolution_spectral():
+    xp = Backend.get_xp_module()
+
+    image = Backend.to_backend(camera().astype(numpy.float32)[:256, :256] / 255)
+    psf = Backend.to_backend(gaussian_kernel_nd(size=9, ndim=2, sigma=2, dtype=numpy.float32))
+    blurry = fft_convolve(image, psf)
+
+    clear_otf_cache()
+    deconvolved = lucy_richardson_deconvolution(blurry.copy(), psf, num_iterations=5)
+    # OTFs are cached and reused by the next deconvolution,
+    # the gaussian PSF is symmetric so that the back projector shares its OTF:
+    assert len(_otf_cache) == 1
+    assert xp.all(lucy_richardson_deconvolution(blurry.copy(), psf, num_iterations=5) == deconvolved)
+    assert len(_otf_cache) == 1
+    lucy_richardson_deconvolution(blurry.copy(), psf, num_iterations=2, back_projection="wb")
+    assert len(_otf_cache) == 2
+
+    # same result as with any other convolution method:
+    reference = lucy_richardson_deconvolution(
+        blurry.copy(), psf, num_iterations=5, convolve_method=lambda x, y: fft_convolve(x, y)
+    )
+    assert xp.allclose(deconvolved, reference, atol=1e-4)
+
+
+def test_lr_deconvolution_tiled_otf_reuse():
+    with NumpyBackend():
+        image = camera().astype(numpy.float32)[:200, :200] / 255
+        psf = gaussian_kernel_nd(size=9, ndim=2, sigma=2, dtype=numpy.float32)
+
+        def deconvolve(tile):
+            return lucy_richardson_deconvolution(tile, psf, num_iterations=2, back_projection="wb")
+
+        clear_otf_cache()
+        misses = _otf_cache.misses
+        first = scatter_gather_i2i(image.copy(), deconvolve, tiles=64, margins=8)
+        # the tiles have several shapes, each with the OTFs of the PSF and of the back projector:
+        misses = _otf_cache.misses - misses
+        assert len(_otf_cache) == misses > 4
+        misses = _otf_cache.misses
+
+        # the next time point reuses all of them:
+        assert numpy.array_equal(scatter_gather_i2i(image.copy(), deconvolve, tiles=64, margins=8), first)
+        assert _otf_cache.misses == misses
+        assert _otf_cache.nbytes <= _otf_cache.max_bytes
+
+        clear_otf_cache()
+        assert len(_otf_cache) == 0 and _otf_cache.nbytes == 0
@@ -1,9 +1,16 @@
+import hashlib
 import math
-from typing import Optional, Tuple, Union
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple, Union
 
 import numpy
 
-from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolve import (
+    FFTConvolver,
+    fft_convolve,
+    fft_convolve_shape,
+)
 from dexp.processing.filters.kernels.gaussian import gaussian_kernel_nd
 from dexp.processing.filters.kernels.wiener_butterworth import wiener_butterworth_kernel
 from dexp.processing.utils.nan_to_zero import nan_to_zero
@@ -12,6 +19,83 @@ from dexp.utils import xpArray
 from dexp.utils.backends import Backend, NumpyBackend
 
 
+class _OTFCache:
+    def __init__(self, max_bytes: int):
+        """Least recently used cache of optical transfer functions (padded kernel spectra),
+        so that successive deconvolutions with the same PSF (e.g. the time points of a dataset) compute them once.
+
+        The cache is bounded by the total size of the OTFs rather than their number: each tile shape of a
+        scatter-gather has its own OTFs, up to 2^ndim shapes for the PSF and as many for the back projector.
+
+        Parameters
+        ----------
+        max_bytes : maximal total size in bytes of the cached OTFs, OTFs larger than that are not cached.
+        """
+        self.max_bytes = max_bytes
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, xpArray]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], xpArray]) -> xpArray:
+        with self._lock:
+            otf = self._entries.get(key)
+            if otf is not None:
+                self._entries.move_to_end(key)
+                return otf
+            self.misses += 1
+
+        otf = compute()
+        if otf.nbytes > self.max_bytes:
+            return otf
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._entries[key] = otf
+            self._nbytes += otf.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return otf
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_otf_cache = _OTFCache(max_bytes=2 * 1024**3)
+
+
+def clear_otf_cache() -> None:
+    """Releases the OTFs cached by Lucy-Richardson deconvolutions, e.g. at the end of a dataset deconvolution
+    so that their (GPU) memory is not held any longer."""
+    _otf_cache.clear()
+
+
+def _otf(kernel: xpArray, fft_shape: Tuple[int, ...], dtype) -> xpArray:
+    """Returns the spectrum of a kernel for the FFT shape, cached by kernel content, FFT shape, dtype and device."""
+    backend = Backend.current()
+    dtype = numpy.dtype(dtype)
+    digest = hashlib.sha1(Backend.to_numpy(kernel, dtype=dtype).tobytes()).hexdigest()
+    key = (digest, tuple(kernel.shape), fft_shape, dtype.str, type(backend), getattr(backend, "device_id", None))
+
+    def _compute() -> xpArray:
+        sp = Backend.get_sp_module()
+        return sp.fft.rfftn(Backend.to_backend(kernel, dtype=dtype), fft_shape)
+
+    return _otf_cache.get_or_compute(key, _compute)
+
+
 def lucy_richardson_deconvolution(
     image: xpArray,
     psf: xpArray,
@@ -62,7 +146,8 @@ def lucy_richardson_deconvolution(
         For example for a 3D stack where the sampling along z (first axis) is poor,
         use: (0,) so that blind-spot kernel does not extend in z.
     eps: epsilon to avoid dividing by zero
-    convolve_method : convolution method to use
+    convolve_method : convolution method to use. With the default 'fft_convolve', convolutions share an 'FFTConvolver',
+        the OTFs of the PSF and back projector are computed once and cached across calls.
     internal_dtype : dtype to use internally for computation.
 
     Returns
@@ -184,14 +269,31 @@ def lucy_richardson_deconvolution(
     # Result array:
     result = xp.full(image.shape, float(xp.mean(image)), dtype=internal_dtype)
 
+    # Default convolutions share one convolver, PSF and back projector OTFs are computed once:
+    if convolve_method is fft_convolve and psf.shape == back_projector.shape:
+        fft_shape = fft_convolve_shape(image.shape, psf.shape)
+        convolver = FFTConvolver(
+            image.shape, psf, internal_dtype=internal_dtype, kernel_spectrum=_otf(psf, fft_shape, internal_dtype)
+        )
+        back_projector_otf = _otf(back_projector, fft_shape, internal_dtype)
+        convolve_psf = convolver
+
+        def convolve_back_projector(array: xpArray) -> xpArray:
+            return convolver(array, kernel_spectrum=back_projector_otf)
+
+    else:
+
+        def convolve_psf(array: xpArray) -> xpArray:
+            return convolve_method(array, psf)
+
+        def convolve_back_projector(array: xpArray) -> xpArray:
+            return convolve_method(array, back_projector)
+
     # LR iterations:
     for i in range(num_iterations):
         # print(f"LR iteration: {i}")
         # Convolution with PSF:
-        convolved = convolve_method(
-            result,
-            psf,
-        )
+        convolved = convolve_psf(result)
         # convolved = xp.clip(convolved, a_min=0, a_max=None, out=convolved)
         # Computes relative blur:
         relative_blur = (image + eps) / (convolved + eps)
@@ -203,10 +305,7 @@ def lucy_richardson_deconvolution(
             relative_blur[relative_blur < 1 / max_correction] = 1 / max_correction
 
         # Back-projection:
-        multiplicative_correction = convolve_method(
-            relative_blur,
-            back_projector,
-        )
+        multiplicative_correction = convolve_back_projector(relative_blur)
 
         # Multiplicative correction can be optionally elevated to a power:
         if power != 1.0:
@@ -217,7 +316,7 @@ def lucy_richardson_deconvolution(
         result *= multiplicative_correction
 
     # Delete intermediates:
-    del multiplicative_correction, relative_blur, back_projector, convolved, psf
+    del multiplicative_correction, relative_blur, convolved, convolve_psf, convolve_back_projector
 
     # Clips output:
     if clip_output:
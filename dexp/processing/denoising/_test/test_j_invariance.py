@@ -0,0 +1,66 @@
+import numpy
+
+from dexp.processing.denoising.butterworth import (
+    _apply_butterworth,
+    _apply_butterworth_masked,
+    _setup_butterworth_denoiser,
+)
+from dexp.processing.denoising.j_invariance import (
+    _coarse_to_fine_search,
+    _generate_mask,
+    calibrate_denoiser,
+)
+from dexp.utils.backends import Backend
+from dexp.utils.testing import execute_both_backends
+
+
+def test_coarse_to_fine_search():
+    evaluated = []
+
+    def _evaluate(parameters):
+        evaluated.extend(parameters)
+        return [-((p["a"] - 0.3137) ** 2) - (p["b"] - 2.71) ** 2 - p["c"] for p in parameters]
+
+    ranges = {"a": (0.0, 1.0, 0.01), "b": (0.0, 10.0, 0.1), "c": [1, 0]}
+    best = _coarse_to_fine_search(_evaluate, ranges, max_evaluations=1000)
+
+    # the full grid has 20000 points, refined grids reach the requested steps:
+    assert len(evaluated) <= 1000
+    assert best["c"] == 0
+    assert abs(best["a"] - 0.3137) <= 0.01
+    assert abs(best["b"] - 2.71) <= 0.1
+
+
+def test_calibrate_denoiser_memo():
+    calls = []
+
+    def _denoise(image, sigma: float = 1.0):
+        calls.append(sigma)
+        return image * 0 + sigma
+
+    image = numpy.full((32, 32), 0.5, dtype=numpy.float32)
+    best = calibrate_denoiser(image, _denoise, {"sigma": (0.0, 1.0, 0.05)}, mode="bruteforce+lbfgs")
+
+    assert abs(best["sigma"] - 0.5) < 0.05
+    # the refined grids and the gradient estimates revisit parameters that are not denoised again:
+    assert len(calls) == len(set(calls))
+
+
+@execute_both_backends
+def test_butterworth_masked():
+    rng = numpy.random.default_rng(0)
+
+    for shape, axes in [((37, 50), None), ((20, 33, 41), None), ((20, 33, 41), (1, 2))]:
+        image = Backend.to_backend(rng.uniform(size=shape).astype(numpy.float32))
+        mask = _generate_mask(image, stride=4)
+        parameters = [((0.3,) * image.ndim, 2.0), ((0.5, 0.2, 0.7)[: image.ndim], 4.0)]
+
+        # padded lengths multiple of the stride or not:
+        for multiple in (4, 1):
+            data = _setup_butterworth_denoiser(image, axes=axes, padding=8, multiple=multiple)
+            results = _apply_butterworth_masked(data, axes, parameters, image.shape, mask)
+
+            for (freq_cutoff, order), result in zip(parameters, results):
+                reference = _apply_butterworth(data, axes, freq_cutoff, order, image.shape)[mask]
+                assert result.shape == reference.shape
+                assert numpy.allclose(Backend.to_numpy(result), Backend.to_numpy(reference), atol=1e-5)
@@ -1,5 +1,5 @@
 from functools import partial
-from typing import Iterable, Optional, Sequence, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 from scipy.signal._signaltools import _centered
@@ -34,6 +34,7 @@ def calibrate_denoise_butterworth(
     num_order: int = 32,
     crop_size_in_voxels: Optional[int] = 256**3,
     display: bool = False,
+    initial_parameters: Optional[Dict] = None,
     **other_fixed_parameters,
 ):
     """
@@ -91,6 +92,11 @@ def calibrate_denoise_butterworth(
         When True the denoised images encountered during optimisation are shown.
         (advanced)
 
+    initial_parameters: Optional[Dict]
+        Parameters returned by a previous calibration, e.g. of the previous time point. When given, the
+        search starts from them with a local optimisation instead of a global grid search.
+        (advanced)
+
     other_fixed_parameters: dict
         Any other fixed parameters. (advanced)
 
@@ -127,76 +133,86 @@ def calibrate_denoise_butterworth(
         dict(axes=axes),
     )
 
+    # Conversion of the calibrated parameters to the cut-off frequencies of each axis:
     if mode == "isotropic":
-        # Partial function:
-        _denoise_butterworth = partial(_apply_butterworth, **other_fixed_parameters, out_shape=crop.shape)
-
-        # Parameters to test when calibrating the denoising algorithm
         parameter_ranges = {"freq_cutoff": freq_cutoff_range, "order": order_range}
 
+        def _freq_cutoff(kwargs: Dict) -> Tuple[float, ...]:
+            return (kwargs.pop("freq_cutoff"),) * image.ndim
+
+        def _calibration_parameters(freq_cutoff: Sequence[float]) -> Dict:
+            return {"freq_cutoff": float(np.mean(freq_cutoff))}
+
     elif mode == "xy-z" and image.ndim == 3:
-        # Partial function with parameter impedance match:
-        def _denoise_butterworth(*args, **kwargs):
-            freq_cutoff_xy = kwargs.pop("freq_cutoff_xy")
-            freq_cutoff_z = kwargs.pop("freq_cutoff_z")
-            _freq_cutoff = (freq_cutoff_xy, freq_cutoff_xy, freq_cutoff_z)
-            return _apply_butterworth(
-                *args,
-                freq_cutoff=_freq_cutoff,
-                out_shape=crop.shape,
-                **dict_or(kwargs, other_fixed_parameters),
-            )
-
-        # Parameters to test when calibrating the denoising algorithm
         parameter_ranges = {
             "freq_cutoff_xy": freq_cutoff_range,
             "freq_cutoff_z": freq_cutoff_range,
             "order": order_range,
         }
 
+        def _freq_cutoff(kwargs: Dict) -> Tuple[float, ...]:
+            freq_cutoff_xy = kwargs.pop("freq_cutoff_xy")
+            return (kwargs.pop("freq_cutoff_z"), freq_cutoff_xy, freq_cutoff_xy)
+
+        def _calibration_parameters(freq_cutoff: Sequence[float]) -> Dict:
+            return {"freq_cutoff_xy": float(np.mean(freq_cutoff[1:])), "freq_cutoff_z": float(freq_cutoff[0])}
+
     elif mode == "full":
-        # Partial function with parameter impedance match:
-        def _denoise_butterworth(*args, **kwargs):
-            _freq_cutoff = tuple(kwargs.pop(f"freq_cutoff_{i}") for i in range(image.ndim))
-            return _apply_butterworth(
-                *args,
-                out_shape=crop.shape,
-                freq_cutoff=_freq_cutoff,
-                **dict_or(kwargs, other_fixed_parameters),
-            )
-
-        # Parameters to test when calibrating the denoising algorithm
         parameter_ranges = {f"freq_cutoff_{i}": freq_cutoff_range for i in range(image.ndim)}
         parameter_ranges["order"] = order_range
 
+        def _freq_cutoff(kwargs: Dict) -> Tuple[float, ...]:
+            return tuple(kwargs.pop(f"freq_cutoff_{i}") for i in range(image.ndim))
+
+        def _calibration_parameters(freq_cutoff: Sequence[float]) -> Dict:
+            return {f"freq_cutoff_{i}": float(fc) for i, fc in enumerate(freq_cutoff)}
+
     else:
         raise ValueError(f"Unsupported denoising mode: {mode}")
 
-    # Calibrate denoiser
+    def _denoise_butterworth(*args, **kwargs):
+        freq_cutoff = _freq_cutoff(kwargs)
+        return _apply_butterworth(
+            *args,
+            out_shape=crop.shape,
+            freq_cutoff=freq_cutoff,
+            **dict_or(kwargs, other_fixed_parameters),
+        )
+
+    def _batch_denoise_butterworth(data, parameters, mask):
+        parameters = [dict(kwargs) for kwargs in parameters]
+        parameters = [(_freq_cutoff(kwargs), kwargs["order"]) for kwargs in parameters]
+        return _apply_butterworth_masked(data, axes, parameters, crop.shape, mask)
+
+    # Warm start, local search from the given parameters:
+    if initial_parameters is not None:
+        freq_cutoff = initial_parameters["freq_cutoff"]
+        if not isinstance(freq_cutoff, Iterable):
+            freq_cutoff = (freq_cutoff,) * image.ndim
+        order = initial_parameters["order"]
+        initial_parameters = dict_or(_calibration_parameters(tuple(freq_cutoff)), {"order": float(order)})
+
+    # Calibrate denoiser, the padded crop is a multiple of the J-invariance stride for faster evaluations:
+    stride = 4
     best_parameters = dict_or(
         calibrate_denoiser(
             crop,
             _denoise_butterworth,
             denoise_parameters=parameter_ranges,
-            setup_function=partial(_setup_butterworth_denoiser, axes=axes, padding=padding),
-            mode="shgo+lbfgs",
+            setup_function=partial(_setup_butterworth_denoiser, axes=axes, padding=padding, multiple=stride),
+            mode="bruteforce+lbfgs" if initial_parameters is None else "lbfgs",
             max_evaluations=1000,
+            stride=stride,
             display=display,
+            batch_denoise_function=_batch_denoise_butterworth,
+            initial_parameters=initial_parameters,
         ),
         other_fixed_parameters,
     )
 
-    if mode == "full":
-        # We need to adjust a bit the type of parameters passed to the denoising function:
-        freq_cutoff = tuple(best_parameters.pop(f"freq_cutoff_{i}") for i in range(image.ndim))
-        best_parameters = dict_or(best_parameters, {"freq_cutoff": freq_cutoff})
-
-    elif mode == "xy-z":
-        # We need to adjust a bit the type of parameters passed to the denoising function:
-        freq_cutoff_xy = best_parameters.pop("freq_cutoff_xy")
-        freq_cutoff_z = best_parameters.pop("freq_cutoff_z")
-        freq_cutoff = (freq_cutoff_z, freq_cutoff_xy, freq_cutoff_xy)
-        best_parameters = dict_or(best_parameters, {"freq_cutoff": freq_cutoff})
+    # We need to adjust a bit the type of parameters passed to the denoising function:
+    freq_cutoff = _freq_cutoff(best_parameters)
+    best_parameters = dict_or(best_parameters, {"freq_cutoff": freq_cutoff})
 
     if isinstance(Backend.current(), CupyBackend):
         # Free plane cache to avoid running out of memory
@@ -309,8 +325,106 @@ def _apply_butterworth(
     return denoised
 
 
+def _apply_butterworth_masked(
+    data: Tuple[xpArray, Sequence[xpArray]],
+    axes: Optional[Sequence[int]],
+    parameters: Sequence[Tuple[Tuple[float, ...], float]],
+    out_shape: Tuple[int],
+    mask: Tuple[slice, ...],
+) -> List[xpArray]:
+    """
+    Applies butterworth filters to a pre computed image in the freq. domain and returns only the values within a
+    strided mask of the cropped output, i.e. equivalent to '_apply_butterworth(...)[mask]' for each parameter.
+
+    Along the filtered axes, samples with a stride s of an inverse DFT of length N = s L are given by an inverse DFT of
+    length L of the spectrum multiplied by a phase ramp and folded: s times smaller FFTs for each axis. Axes whose
+    padded length is not a multiple of the stride go through the full inverse FFT.
+
+    Parameters
+    ----------
+    data : Tuple[xpArray, Sequence[xpArray]]
+        Image in the freq. domain and a grid for each axes.
+    axes : Optional[Sequence[int]]
+        Axes selected for filtering
+    parameters : Sequence[Tuple[Tuple[float, ...], float]]
+        Freq. cutoffs and order of each filter.
+    out_shape : Tuple[int]
+        Original image input shape, used to crop the data after the inverse FFT.
+    mask : Tuple[slice, ...]
+        Slicing of the J-invariance mask, with steps.
+
+    Returns
+    -------
+    List[xpArray]
+        Filtered values within the mask, one per parameter.
+    """
+    xp = Backend.get_xp_module(data[0])
+
+    image_f, grid = data
+    ndim = image_f.ndim
+    if axes is None:
+        axes = tuple(range(ndim))
+
+    # the spectrum and grid in natural frequency order:
+    image_f = xp.fft.ifftshift(image_f, axes=axes)
+    grid = [xp.fft.ifftshift(g, axes=axes) for g in grid]
+
+    # axes folded for the strided inverse DFT, and slicings of the masked samples before and after the inverse FFT:
+    folded_axes = {}
+    real_slicing, output_slicing = [], []
+    ramp = None
+    for axis, (length, out_length, axis_mask) in enumerate(zip(image_f.shape, out_shape, mask)):
+        start = (length - out_length) // 2 + axis_mask.start
+        stride = axis_mask.step
+        count = len(range(axis_mask.start, out_length, stride))
+        if axis not in axes:
+            # not filtered, thus in real space:
+            real_slicing.append(slice(start, start + stride * count, stride))
+            output_slicing.append(slice(None))
+        elif length % stride == 0:
+            folded_axes[axis] = stride
+            real_slicing.append(slice(None))
+            output_slicing.append(slice(0, count))
+            phase = xp.exp(2j * np.pi * start * xp.arange(length) / length).astype(image_f.dtype)
+            phase = phase.reshape(tuple(length if a == axis else 1 for a in range(ndim)))
+            ramp = phase if ramp is None else ramp * phase
+        else:
+            real_slicing.append(slice(None))
+            output_slicing.append(slice(start, start + stride * count, stride))
+
+    real_slicing, output_slicing = tuple(real_slicing), tuple(output_slicing)
+    image_f = image_f[real_slicing]
+    grid = [g[real_slicing] for g in grid]
+    if ramp is not None:
+        image_f = image_f * ramp
+
+    folded_shape, sum_axes = [], []
+    for axis, length in enumerate(image_f.shape):
+        if axis in folded_axes:
+            sum_axes.append(len(folded_shape))
+            folded_shape += [folded_axes[axis], length // folded_axes[axis]]
+        else:
+            folded_shape.append(length)
+    sum_axes = tuple(sum_axes)
+    scale = float(np.prod(list(folded_axes.values())))
+
+    results = []
+    for freq_cutoff, order in parameters:
+        dist = xp.zeros(image_f.shape, dtype=np.float32)
+        for axis_grid, fc in zip(grid, freq_cutoff):
+            dist += xp.square(axis_grid / fc)
+
+        filtered = _butterworth_filter(image_f, dist, order)
+        if len(sum_axes) > 0:
+            filtered = filtered.reshape(folded_shape).sum(axis=sum_axes)
+        denoised = xp.real(xp.fft.ifftn(filtered, axes=axes)) / scale
+        results.append(denoised[output_slicing])
+
+    return results
+
+
 def _setup_butterworth_denoiser(
-    image: xpArray, axes: Optional[Tuple[int, ...]], padding: int
+    image: xpArray, axes: Optional[Tuple[int, ...]], padding: int, multiple: int = 1
 ) -> Tuple[xpArray, xpArray]:
     """Pre computes the butterworth forward step.
 
@@ -325,6 +439,9 @@ def _setup_butterworth_denoiser(
     padding: int
         Padding to be added to avoid edge effects.
 
+    multiple: int
+        Padding is extended so that the padded lengths are multiples of this, keeping the image centered.
+
     Returns
     -------
     Tuple[xpArray, xpArray]
@@ -344,7 +461,10 @@ def _setup_butterworth_denoiser(
 
     # First we need to pad the image.
     # By how much? this depends on how much low filtering we need to do:
-    pad_width = tuple((padding, padding) if selected else 0 for selected in selected_axes)
+    pad_width = []
+    for selected, length in zip(selected_axes, image.shape):
+        extra = (-(length + 2 * padding)) % multiple if selected else 0
+        pad_width.append((padding + extra // 2, padding + extra - extra // 2) if selected else (0, 0))
 
     # pad image:
     image = np.pad(image, pad_width=pad_width, mode="reflect")
@@ -1,7 +1,7 @@
 import itertools
 import math
 from functools import partial
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 
 import numpy as np
 from arbol import aprint, asection
@@ -22,6 +22,8 @@ def calibrate_denoiser(
     stride: int = 4,
     loss_function: Callable = mean_squared_error,
     display: bool = False,
+    batch_denoise_function: Optional[Callable[[Any, List[Dict[str, Any]], Tuple[slice, ...]], List[xpArray]]] = None,
+    initial_parameters: Optional[Dict[str, Any]] = None,
     **other_fixed_parameters,
 ):
     """
@@ -49,6 +51,8 @@ def calibrate_denoiser(
         Function to pre process / setup denoising input.
     mode : str
         Optimisation mode. Can be: 'bruteforce', 'lbfgs' or 'shgo'.
+        The brute-force search evaluates a grid coarsened to fit the evaluation budget,
+        then refines it around the best parameters until the steps of the numerical ranges are reached.
     max_evaluations: int
         Maximum number of function evaluations during optimisation.
     stride: int
@@ -59,6 +63,12 @@ def calibrate_denoiser(
     display_images: bool
         If True the denoised images for each parameter tested are displayed.
         this _will_ be slow.
+    batch_denoise_function: Callable, optional
+        Evaluates many parameters at once: takes the (setup) denoising input, a list of parameter dictionaries
+        and the mask slicing, returns the denoised values within the mask for each parameter dictionary.
+        Used instead of 'denoise_function' during the search, e.g. to share computations between parameters.
+    initial_parameters: dict, optional
+        Starting point of the 'shgo' and 'lbfgs' searches, e.g. the optimum of a similar image to warm-start from.
     other_fixed_parameters: dict
         Other fixed parameters to pass to the denoiser function.
 
@@ -77,6 +87,12 @@ def calibrate_denoiser(
 
     # Pass fixed parameters:
     denoise_function = partial(denoise_function, **other_fixed_parameters)
+    if batch_denoise_function is not None and len(other_fixed_parameters) > 0:
+        _batch_denoise_function = batch_denoise_function
+
+        def batch_denoise_function(denoising_input, parameters, mask):
+            parameters = [dict_or(kwargs, other_fixed_parameters) for kwargs in parameters]
+            return _batch_denoise_function(denoising_input, parameters, mask)
 
     with asection(f"Calibrating denoiser with method: {mode}"):
         best_parameters = _calibrate_denoiser_search(
@@ -89,6 +105,8 @@ def calibrate_denoiser(
             stride=stride,
             loss_function=loss_function,
             display_images=display,
+            batch_denoise_function=batch_denoise_function,
+            initial_parameters=initial_parameters,
         )
 
     aprint(f"Best parameters are: {best_parameters}")
@@ -143,6 +161,63 @@ def _product_from_dict(dictionary: Dict[str, List[Union[float, int]]]):
         yield dict(zip(keys, element))
 
 
+def _memo_key(parameters: Dict[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+    # rounding merges the parameters that only differ by floating point errors
+    return tuple(
+        (name, round(float(value), 9) if isinstance(value, (float, np.floating)) else value)
+        for name, value in sorted(parameters.items())
+    )
+
+
+def _coarse_to_fine_search(
+    evaluate: Callable[[List[Dict[str, Any]]], List[float]],
+    denoise_parameters: Dict[str, Any],
+    max_evaluations: int,
+) -> Dict[str, Any]:
+    """Grid search of the parameters maximising the score returned by 'evaluate' for a list of parameters.
+
+    The first grid spans the numerical ranges (start, stop, step) with steps enlarged to fit a quarter of the
+    evaluation budget, and all the categorical values (lists). The following grids are centered on the best
+    parameters with steps halved each round, until the requested steps are reached or the budget is exhausted.
+    """
+    numerical = {n: r for n, r in denoise_parameters.items() if isinstance(r, tuple)}
+    categorical = {n: list(r) for n, r in denoise_parameters.items() if not isinstance(r, tuple)}
+
+    bounds = {n: (r[0], r[1]) for n, r in numerical.items()}
+    steps = {n: r[2] if len(r) > 2 else (r[1] - r[0]) / 8 for n, r in numerical.items()}
+
+    num_values = math.prod(len(np.arange(*bounds[n], steps[n])) for n in numerical)
+    num_values *= math.prod(len(v) for v in categorical.values())
+    coarsening = max(1.0, (num_values / max(1, max_evaluations // 4)) ** (1 / max(1, len(numerical))))
+    current_steps = {n: steps[n] * coarsening for n in numerical}
+
+    grid = dict(categorical)
+    grid.update({n: np.arange(*bounds[n], current_steps[n]) for n in numerical})
+
+    num_evaluations = 0
+    best_score, best_parameters = -math.inf, None
+    while True:
+        candidates = list(_product_from_dict(grid))
+        scores = evaluate(candidates)
+        num_evaluations += len(candidates)
+        for score, candidate in zip(scores, candidates):
+            if score > best_score or best_parameters is None:
+                best_score, best_parameters = score, candidate
+
+        if all(current_steps[n] <= steps[n] for n in numerical) or num_evaluations >= max_evaluations:
+            break
+
+        # refined grid around the best parameters, categorical values are kept:
+        current_steps = {n: max(steps[n], current_steps[n] / 2) for n in numerical}
+        grid = {n: [v] for n, v in best_parameters.items()}
+        for n, (low, high) in bounds.items():
+            best = best_parameters[n]
+            grid[n] = sorted({float(np.clip(best + d * current_steps[n], low, high)) for d in (-1, 0, 1)})
+
+    aprint(f"Brute-force search evaluated {num_evaluations} parameters, best score: {best_score}")
+    return best_parameters
+
+
 def _calibrate_denoiser_search(
     image: xpArray,
     denoise_function: Callable[[Any], xpArray],
@@ -153,6 +228,8 @@ def _calibrate_denoiser_search(
     stride=4,
     loss_function: Callable = mean_squared_error,  # _structural_loss, #
     display_images: bool = False,
+    batch_denoise_function: Optional[Callable] = None,
+    initial_parameters: Optional[Dict[str, Any]] = None,
 ):
     """Return a parameter search history with losses for a denoise function.
 
@@ -177,6 +254,10 @@ def _calibrate_denoiser_search(
         Loss function to use
     display : bool
         When True the resulting images are displayed with napari
+    batch_denoise_function : Callable, optional
+        Denoises for many parameters at once, see 'calibrate_denoiser'.
+    initial_parameters : dict, optional
+        Starting point of the 'shgo' and 'lbfgs' searches.
 
     Returns
     -------
@@ -210,43 +291,44 @@ def _calibrate_denoiser_search(
     else:
         denoising_input = masked_image
 
-    # Function to optimise:
-    def _loss_func(**_denoiser_kwargs):
-        # We compute the J-inv loss:
-        denoised = denoise_function(denoising_input, **_denoiser_kwargs)
-        loss = loss_function(denoised[mask], image[mask])
+    # Reference values within the mask:
+    masked_reference = image[mask]
 
-        if math.isnan(loss) or math.isinf(loss):
-            loss = math.inf
+    # Losses of the parameters already evaluated, searches revisit parameters (refined grids, gradient estimates):
+    memo: Dict[Tuple, float] = {}
 
-        aprint(f"J-inv loss is: {loss}")
+    def _evaluate(parameters: List[Dict[str, Any]]) -> List[float]:
+        keys = [_memo_key(kwargs) for kwargs in parameters]
+        missing = list({key: kwargs for key, kwargs in zip(keys, parameters) if key not in memo}.items())
 
-        loss = Backend.to_numpy(loss)
+        if batch_denoise_function is not None and len(missing) > 0:
+            denoised_masked = batch_denoise_function(denoising_input, [kwargs for _, kwargs in missing], mask)
+        else:
+            denoised_masked = (denoise_function(denoising_input, **kwargs)[mask] for _, kwargs in missing)
 
-        if display_images and not (math.isnan(loss) or math.isinf(loss)):
-            denoised = denoise_function(image, **_denoiser_kwargs)
-            denoised_images.append(denoised)
+        for (key, kwargs), denoised in zip(missing, denoised_masked):
+            # We compute the J-inv loss:
+            loss = Backend.to_numpy(loss_function(denoised, masked_reference))
+            if math.isnan(loss) or math.isinf(loss):
+                loss = math.inf
 
-        return -float(loss)
+            aprint(f"J-inv loss for {kwargs} is: {loss}")
+            memo[key] = -float(loss)
 
-    best_parameters = None
+            if display_images and not math.isinf(loss):
+                denoised_images.append(denoise_function(image, **kwargs))
+
+        return [memo[key] for key in keys]
+
+    # Function to optimise:
+    def _loss_func(**_denoiser_kwargs):
+        return _evaluate([_denoiser_kwargs])[0]
+
+    best_parameters = initial_parameters
 
     if "bruteforce" in mode:
         with asection(f"Searching by brute-force for the best denoising parameters among: {denoise_parameters}"):
-
-            num_rounds = 4
-            best_loss = -math.inf
-            for _ in range(num_rounds):
-                # expand ranges:
-                expanded_denoise_parameters = {n: np.arange(*r) for (n, r) in denoise_parameters.items()}
-                # Generate all possible combinations:
-                cartesian_product_of_parameters = list(_product_from_dict(expanded_denoise_parameters))
-                for denoiser_kwargs in cartesian_product_of_parameters:
-                    with asection(f"computing J-inv loss for: {denoiser_kwargs}"):
-                        loss = _loss_func(**denoiser_kwargs)
-                        if loss > best_loss:
-                            best_loss = loss
-                            best_parameters = denoiser_kwargs
+            best_parameters = _coarse_to_fine_search(_evaluate, denoise_parameters, max_evaluations)
 
     if "shgo" in mode:
         with asection(
@@ -1,10 +1,12 @@
 import numpy
+import pytest
 from numpy.linalg import norm
 from scipy.ndimage import convolve
+from scipy.signal import fftconvolve
 from skimage.data import camera
 from skimage.util import random_noise
 
-from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolve import FFTConvolver, fft_convolve
 from dexp.utils.backends import Backend, CupyBackend, NumpyBackend
 
 
@@ -48,3 +50,57 @@ def _test_fft_convolve():
     #     viewer.add_image(_c(noisy), name='noisy')
     #     viewer.add_image(_c(psf), name='psf')
     #     viewer.add_image(_c(result), name='result')
+
+
+def test_fft_convolver_numpy():
+    with NumpyBackend():
+        _test_fft_convolver()
+
+
+def test_fft_convolver_cupy():
+    try:
+        with CupyBackend():
+            _test_fft_convolver()
+    except ModuleNotFoundError:
+        print("Cupy module not found! Test passes nevertheless!")
+
+
+def _test_fft_convolver():
+    rng = numpy.random.default_rng(0)
+
+    # odd, even and wider than image kernels:
+    for image_shape, kernel_shape in [((17, 32, 29), (5, 9, 7)), ((12, 15), (4, 6)), ((3, 40), (7, 5))]:
+        image = rng.uniform(size=image_shape).astype(numpy.float32)
+        kernel = rng.uniform(size=kernel_shape).astype(numpy.float32)
+
+        for mode in ("reflect", "edge", "wrap"):
+            # reference: linear convolution of the padded image, cropped back to the image
+            pad = [(0, 0) if mode == "wrap" else (k // 2, k // 2) for k in kernel_shape]
+            padded = image if mode == "wrap" else numpy.pad(image, pad_width=pad, mode=mode)
+            reference = fftconvolve(padded, kernel, mode="full")
+            reference = reference[
+                tuple(
+                    slice((k - 1) // 2 + p, (k - 1) // 2 + p + n)
+                    for n, k, (p, _) in zip(image_shape, kernel_shape, pad)
+                )
+            ]
+
+            convolver = FFTConvolver(image_shape, Backend.to_backend(kernel), mode=mode)
+            # repeated convolutions reuse the convolver buffer:
+            for _ in range(2):
+                result = Backend.to_numpy(convolver(Backend.to_backend(image)))
+                assert result.shape == image.shape
+                assert numpy.allclose(result, reference, atol=1e-4)
+
+            result = Backend.to_numpy(fft_convolve(Backend.to_backend(image), Backend.to_backend(kernel), mode=mode))
+            assert numpy.allclose(result, reference, atol=1e-4)
+
+        # convolution with another kernel of the same shape:
+        other = rng.uniform(size=kernel_shape).astype(numpy.float32)
+        result = convolver(Backend.to_backend(image), kernel_spectrum=convolver.spectrum(Backend.to_backend(other)))
+        assert numpy.allclose(
+            Backend.to_numpy(result), Backend.to_numpy(fft_convolve(image, other, mode="wrap")), atol=1e-4
+        )
+
+    with pytest.raises(ValueError):
+        convolver(Backend.to_backend(rng.uniform(size=(4, 4)).astype(numpy.float32)))
@@ -1,5 +1,7 @@
+from typing import Optional, Sequence, Tuple
+
 import numpy
-import scipy.fftpack
+import scipy.fft
 
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend, NumpyBackend
@@ -13,7 +15,7 @@ def fft_convolve(image1: xpArray, image2: xpArray, mode: str = "reflect", in_pla
     ----------
     image1 : First image
     image2 : Second image
-    mode : Not supported!
+    mode : Padding mode of the first image (see numpy/cupy pad function), 'wrap' disables padding.
     in_place : If true then the two input images might be modified and reused for the result.
 
     Returns
@@ -21,7 +23,6 @@ def fft_convolve(image1: xpArray, image2: xpArray, mode: str = "reflect", in_pla
     Convolved image: image1 ○ image2
     """
     xp = Backend.get_xp_module()
-    sp = Backend.get_sp_module()
 
     if image1.ndim == image2.ndim == 0:  # scalar inputs
         return image1 * image2
@@ -35,47 +36,140 @@ def fft_convolve(image1: xpArray, image2: xpArray, mode: str = "reflect", in_pla
     if internal_dtype is None:
         internal_dtype = image1.dtype
 
-    if isinstance(Backend.current(), NumpyBackend):
-        internal_dtype = numpy.float32
-
     original_dtype = image1.dtype
-    image1 = Backend.to_backend(image1, dtype=internal_dtype, force_copy=False)
-    image2 = Backend.to_backend(image2, dtype=internal_dtype, force_copy=False)
-
-    if mode != "wrap":
-        pad_width = tuple(tuple((s // 2, s // 2)) for s in image2.shape)
-        image1 = xp.pad(image1, pad_width=pad_width, mode=mode)
-
-    s1 = numpy.asarray(image1.shape)
-    s2 = numpy.asarray(image2.shape)
 
-    shape = tuple(s1 + s2 - 1)
+    convolver = FFTConvolver(image1.shape, image2, mode=mode, internal_dtype=internal_dtype)
+    result = convolver(image1)
 
-    fsize = tuple(scipy.fftpack.next_fast_len(x) for x in tuple(shape))
-
-    image1_fft = sp.fft.rfftn(image1, fsize, overwrite_x=in_place)
-    image2_fft = sp.fft.rfftn(image2, fsize, overwrite_x=in_place)
-    image1_fft *= image2_fft
-    del image2_fft
-    result = sp.fft.irfftn(image1_fft, overwrite_x=in_place)
-    if not in_place:
-        del image1_fft
-
-    fslice = tuple(slice(0, int(sz)) for sz in shape)
-    result = result[fslice]
+    result = result.astype(dtype=original_dtype, copy=False)
 
-    newshape = numpy.asarray(image1.shape)
-    currshape = numpy.array(result.shape)
-    startind = (currshape - newshape) // 2
-    endind = startind + newshape
-    myslice = [slice(startind[k], endind[k]) for k in range(len(endind))]
+    return result
 
-    result = result[tuple(myslice)]
 
-    if mode != "wrap":
-        slicing = tuple(slice(s // 2, -(s // 2)) for s in image2.shape)
-        result = result[slicing]
+def fft_convolve_shape(image_shape: Sequence[int], kernel_shape: Sequence[int], mode: str = "reflect") -> Tuple[int]:
+    """
+    Returns the shape of the FFTs of a convolution: the image padded by half the kernel size,
+    or extended by the kernel size when not padded ('wrap' mode) so that the convolution does not wrap around,
+    rounded up to fast FFT lengths.
 
-    result = result.astype(dtype=original_dtype, copy=False)
+    Parameters
+    ----------
+    image_shape : shape of the image
+    kernel_shape : shape of the kernel
+    mode : padding mode, see 'fft_convolve'
 
-    return result
+    Returns
+    -------
+    FFT shape.
+    """
+    if mode == "wrap":
+        shape = tuple(n + k - 1 for n, k in zip(image_shape, kernel_shape))
+    else:
+        shape = tuple(n + 2 * (k // 2) for n, k in zip(image_shape, kernel_shape))
+    return tuple(scipy.fft.next_fast_len(s) for s in shape)
+
+
+class FFTConvolver:
+    def __init__(
+        self,
+        image_shape: Sequence[int],
+        kernel: xpArray,
+        mode: str = "reflect",
+        internal_dtype=None,
+        kernel_spectrum: Optional[xpArray] = None,
+    ):
+        """
+        Repeated FFT based convolutions of images of a given shape with a kernel, equivalent to 'fft_convolve'.
+        The FFT shape is chosen once, the kernel spectrum is computed once and the padded image
+        is written into a reusable buffer. Not thread safe, the buffer is shared by successive convolutions.
+
+        Parameters
+        ----------
+        image_shape : shape of the images to convolve
+        kernel : convolution kernel
+        mode : padding mode of the images (see numpy/cupy pad function), 'wrap' disables padding.
+        internal_dtype : dtype to use internally for computation, defaults to the kernel dtype.
+        kernel_spectrum : precomputed spectrum of the kernel (see 'spectrum'), e.g. cached across convolvers.
+        """
+        xp = Backend.get_xp_module()
+
+        if len(image_shape) != kernel.ndim:
+            raise ValueError("Dimensions do not match.")
+
+        if internal_dtype is None:
+            internal_dtype = kernel.dtype
+
+        if isinstance(Backend.current(), NumpyBackend):
+            internal_dtype = numpy.float32
+
+        self.image_shape = tuple(image_shape)
+        self.kernel_shape = tuple(kernel.shape)
+        self.mode = mode
+        self.dtype = numpy.dtype(internal_dtype)
+        self.fft_shape = fft_convolve_shape(self.image_shape, self.kernel_shape, mode)
+
+        if mode == "wrap":
+            self.pad_width = (0,) * len(image_shape)
+        else:
+            self.pad_width = tuple(k // 2 for k in self.kernel_shape)
+
+        self._padded = tuple(slice(0, n + 2 * p) for n, p in zip(self.image_shape, self.pad_width))
+        self._center = tuple(slice(p, p + n) for n, p in zip(self.image_shape, self.pad_width))
+        self._crop = tuple(
+            slice((k - 1) // 2 + p, (k - 1) // 2 + p + n)
+            for n, k, p in zip(self.image_shape, self.kernel_shape, self.pad_width)
+        )
+        # values beyond the padded image must remain zero for non padded convolutions:
+        self._buffer = xp.zeros(self.fft_shape, dtype=self.dtype)
+
+        self.kernel_spectrum = self.spectrum(kernel) if kernel_spectrum is None else kernel_spectrum
+
+    def spectrum(self, kernel: xpArray) -> xpArray:
+        """Returns the spectrum of a kernel of the same shape, to convolve with it (see '__call__')."""
+        if tuple(kernel.shape) != self.kernel_shape:
+            raise ValueError(f"Kernel of shape {kernel.shape} does not match the expected shape {self.kernel_shape}")
+        sp = Backend.get_sp_module()
+        return sp.fft.rfftn(Backend.to_backend(kernel, dtype=self.dtype, force_copy=False), self.fft_shape)
+
+    def _pad(self, image: xpArray) -> None:
+        buffer = self._buffer
+        if self.mode == "wrap":
+            buffer[self._center] = image
+        elif self.mode != "reflect" or any(p >= n for p, n in zip(self.pad_width, self.image_shape)):
+            # other modes, or reflections longer than the image, go through a temporary padded array:
+            xp = Backend.get_xp_module()
+            buffer[self._padded] = xp.pad(image, pad_width=[(p, p) for p in self.pad_width], mode=self.mode)
+        else:
+            buffer[self._center] = image
+            # borders are reflected one axis after the other, over the whole padded extent of the other axes:
+            for axis, (p, n) in enumerate(zip(self.pad_width, self.image_shape)):
+                if p == 0:
+                    continue
+
+                def _slicing(axis_slice: slice) -> Tuple[slice, ...]:
+                    return self._padded[:axis] + (axis_slice,) + self._padded[axis + 1 :]
+
+                buffer[_slicing(slice(0, p))] = buffer[_slicing(slice(2 * p, p, -1))]
+                buffer[_slicing(slice(p + n, 2 * p + n))] = buffer[_slicing(slice(p + n - 2, n - 2, -1))]
+
+    def __call__(self, image: xpArray, kernel_spectrum: Optional[xpArray] = None) -> xpArray:
+        """
+        Convolves an image.
+
+        Parameters
+        ----------
+        image : image of the convolver shape
+        kernel_spectrum : spectrum of another kernel to convolve with (see 'spectrum'), defaults to the kernel's.
+
+        Returns
+        -------
+        Convolved image, of the internal dtype.
+        """
+        if tuple(image.shape) != self.image_shape:
+            raise ValueError(f"Image of shape {image.shape} does not match the expected shape {self.image_shape}")
+
+        sp = Backend.get_sp_module()
+        self._pad(Backend.to_backend(image, force_copy=False))
+        spectrum = sp.fft.rfftn(self._buffer, self.fft_shape)
+        spectrum *= self.kernel_spectrum if kernel_spectrum is None else kernel_spectrum
+        return sp.fft.irfftn(spectrum, self.fft_shape, overwrite_x=True)[self._crop]
@@ -0,0 +1,87 @@
+import numpy
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from dexp.processing.registration import sequence
+from dexp.utils.backends import NumpyBackend
+
+
+def _drifting_sequence(shape, length: int = 10) -> numpy.ndarray:
+    rng = numpy.random.default_rng(0)
+    image = gaussian_filter(rng.uniform(size=shape), sigma=2).astype(numpy.float32)
+    frames = []
+    shift = numpy.zeros(len(shape), dtype=int)
+    for _ in range(length):
+        shift += rng.integers(-2, 3, size=len(shape))
+        frames.append(numpy.roll(image, tuple(shift), axis=tuple(range(len(shape)))))
+    return numpy.stack(frames)
+
+
+@pytest.mark.parametrize("shape", [(48, 64), (24, 40, 48)])
+@pytest.mark.parametrize("spectrum_cache_bytes", [None, 0])
+def test_image_stabilisation_reuse_spectra(shape, spectrum_cache_bytes, monkeypatch):
+    image = _drifting_sequence(shape)
+
+    computed = []
+    projection_spectra = sequence.projection_spectra
+
+    def _counting_projection_spectra(frame, **kwargs):
+        computed.append(frame)
+        return projection_spectra(frame, **kwargs)
+
+    monkeypatch.setattr(sequence, "projection_spectra", _counting_projection_spectra)
+
+    with NumpyBackend():
+        reference = sequence.image_stabilisation(image, axis=0, max_range=4, reuse_spectra=False)
+        model = sequence.image_stabilisation(
+            image, axis=0, max_range=4, reuse_spectra=True, spectrum_cache_bytes=spectrum_cache_bytes
+        )
+
+    # same registrations as registering the frames pair by pair:
+    assert len(model) == len(image)
+    for t in range(len(image)):
+        numpy.testing.assert_allclose(model.model_list[t].shift_vector, reference.model_list[t].shift_vector)
+
+    if spectrum_cache_bytes is None:
+        # each frame is transformed once:
+        assert len(computed) == len(image)
+    else:
+        # without cache, both frames of each pair are transformed:
+        assert len(computed) > len(image)
+
+
+def test_image_stabilisation_streaming(monkeypatch):
+    image = _drifting_sequence((32, 48), length=16)
+    max_range = 4
+
+    caches = []
+
+    class _RecordingSpectrumCache(sequence._SpectrumCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            caches.append(self)
+
+    monkeypatch.setattr(sequence, "_SpectrumCache", _RecordingSpectrumCache)
+
+    loaded = []
+
+    class _LazySequence:
+        # reads frames on demand, as zarr arrays or stack iterators do:
+        shape = image.shape
+        dtype = image.dtype
+
+        def __getitem__(self, index):
+            loaded.append(index)
+            return image[index]
+
+    with NumpyBackend():
+        reference = sequence.image_stabilisation(image, axis=0, max_range=max_range)
+        model = sequence.image_stabilisation(_LazySequence(), axis=0, max_range=max_range, preload_images=True)
+
+    for t in range(len(image)):
+        numpy.testing.assert_allclose(model.model_list[t].shift_vector, reference.model_list[t].shift_vector)
+
+    # frames are read once and in order, without preloading, and at most a window of spectra is resident:
+    assert loaded == list(range(len(image)))
+    assert caches[-1].peak_length <= max_range
+    assert len(caches[-1]) == 0
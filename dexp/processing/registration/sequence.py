@@ -1,9 +1,9 @@
-from typing import List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-import dask
 import numpy
 from arbol import aprint, asection
-from dask.array import Array
 from joblib import Parallel, delayed
 
 from dexp.processing.registration.model.sequence_registration_model import (
@@ -13,13 +13,18 @@ from dexp.processing.registration.model.translation_registration_model import (
     TranslationRegistrationModel,
 )
 from dexp.processing.registration.translation_nd_proj import (
+    projection_spectra,
     register_translation_proj_nd,
+    register_translation_spectra,
 )
 from dexp.processing.utils.center_of_mass import center_of_mass
 from dexp.processing.utils.linear_solver import linsolve
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend, NumpyBackend
 
+# Parameters of the pairwise registrations applied to each frame before its Fourier transform:
+_PREPROCESSING_PARAMETERS = ("denoise_input_sigma", "gamma", "log_compression", "edge_filter")
+
 
 def image_stabilisation(
     image: xpArray,
@@ -39,6 +44,8 @@ def image_stabilisation(
     debug_output: str = None,
     workers: int = 1,
     internal_dtype=None,
+    reuse_spectra: bool = True,
+    spectrum_cache_bytes: Optional[int] = None,
     **kwargs,
 ) -> SequenceRegistrationModel:
     """
@@ -46,9 +53,11 @@ def image_stabilisation(
 
     Parameters
     ----------
-    image: image to stabilise.
+    image: image to stabilise, an array or a lazy one (dask, zarr, tensorstore, ...) read frame by frame,
+        or a StackIterator for sequences along the first axis.
     axis: sequence axis along which to stabilise image.
-    preload_images: boolean indicating to preload data or not.
+    preload_images: boolean indicating to preload data or not, when registering frames pair by pair.
+        When reusing spectra, frames are streamed instead: read in order and released once transformed.
     mode: registration mode. For now only 'translation' is available.
     max_range: maximal distance, in time points, between pairs of images to registrate.
     min_confidence: minimal confidence to accept a pairwise registration
@@ -60,7 +69,15 @@ def image_stabilisation(
     order_reg: order for linear solver regularisation term.
     alpha_reg: multiplicative coefficient for regularisation term.
     detrend: removes linear detrend from stabilized image.
+    debug_output: path prefix of the debug plots, None disables them.
+    workers: number of parallel pairwise registrations, or of threads loading frames ahead when reusing spectra.
     internal_dtype : internal dtype for computation
+    reuse_spectra: each frame is preprocessed and Fourier transformed once, pairwise registrations are computed
+        from the cached spectra instead of from the frames. Only for the default 2D registration method.
+        Pairs are registered by increasing time and the spectra of a frame are released after its last pair,
+        so that at most the spectra of 'max_range' frames are resident at once.
+    spectrum_cache_bytes: optional size limit in bytes of the resident spectra, frames evicted from a smaller cache
+        are transformed again when needed.
     **kwargs: argument passthrough to the pairwise registration method, see 'register_translation_nd'.
 
     Returns
@@ -68,24 +85,31 @@ def image_stabilisation(
     Sequence registration model
 
     """
-    assert 0 <= axis < image.ndim
+    assert 0 <= axis < len(image.shape)
     length = image.shape[axis]
 
     xp = Backend.get_xp_module()
 
+    from_spectra = reuse_spectra and mode == "translation" and "register_translation_2d" not in kwargs
+    # frames of lazy arrays are read on demand:
+    in_memory = isinstance(image, numpy.ndarray) or Backend.get_xp_module(image) is not numpy
+
+    def _load_frame(index: int) -> xpArray:
+        if in_memory:
+            return Backend.get_xp_module(image).take(image, index, axis=axis)
+        return numpy.asarray(image[index] if axis == 0 else image[(slice(None),) * axis + (index,)])
+
     image_sequence = None
-    if preload_images:
+    if preload_images and not from_spectra:
         with asection("Preloading images to backend..."):
-            image_sequence = list(
-                Backend.to_backend(Backend.get_xp_module(image).take(image, i, axis=axis)) for i in range(length)
-            )
+            image_sequence = list(Backend.to_backend(_load_frame(i)) for i in range(length))
 
     scales = list(i for i in range(max_range) if i < length)
 
     aprint(f"Scales: {scales}")
 
     with asection(f"Registering image sequence of length: {length}"):
-        ndim = image.ndim - 1
+        ndim = len(image.shape) - 1
 
         uv_set = set()
         with asection("Enumerating pairwise registrations needed..."):
@@ -106,22 +130,18 @@ def image_stabilisation(
 
         with asection(f"Computing pairwise registrations for {len(uv_set)} (u,v) pairs..."):
 
+            def _get_frame(index: int) -> xpArray:
+                if image_sequence:
+                    return image_sequence[index]
+                return _load_frame(index)
+
             def _compute_model(pair: Tuple[int, int]) -> Optional[TranslationRegistrationModel]:
                 u, v = pair
-                if image_sequence:
-                    image_u = image_sequence[u]
-                    image_v = image_sequence[v]
-                elif isinstance(image, Array):
-                    image_u = dask.array.take(image, u, axis=axis)
-                    image_v = dask.array.take(image, v, axis=axis)
-                else:
-                    image_u = xp.take(image, u, axis=axis)
-                    image_v = xp.take(image, v, axis=axis)
                 model = _pairwise_registration(
                     u,
                     v,
-                    image_u,
-                    image_v,
+                    _get_frame(u),
+                    _get_frame(v),
                     mode,
                     min_confidence,
                     enable_com,
@@ -132,7 +152,23 @@ def image_stabilisation(
                 )
                 return model
 
-            pairwise_models = Parallel(n_jobs=workers)(delayed(_compute_model)(pair) for pair in uv_set)
+            if from_spectra:
+                pairwise_models = _pairwise_registrations_from_spectra(
+                    uv_set,
+                    _get_frame,
+                    not in_memory,
+                    length,
+                    min_confidence,
+                    enable_com,
+                    quantile,
+                    bounding_box,
+                    internal_dtype,
+                    spectrum_cache_bytes,
+                    workers,
+                    **kwargs,
+                )
+            else:
+                pairwise_models = Parallel(n_jobs=workers)(delayed(_compute_model)(pair) for pair in uv_set)
             pairwise_models = [model for model in pairwise_models if model is not None]
 
         nb_models = len(pairwise_models)
@@ -163,65 +199,49 @@ def image_stabilisation(
 
                 if mode == "translation":
 
-                    # prepares list of models:
-                    translation_models: List[TranslationRegistrationModel] = list(
-                        TranslationRegistrationModel(xp.zeros((ndim,), dtype=internal_dtype)) for _ in range(length)
+                    # pairwise registrations as arrays:
+                    us = numpy.asarray([model.u for model in pairwise_models], dtype=numpy.int64)
+                    vs = numpy.asarray([model.v for model in pairwise_models], dtype=numpy.int64)
+                    shift_vectors = numpy.asarray(
+                        [Backend.to_numpy(model.shift_vector) for model in pairwise_models], dtype=numpy.float32
+                    ).reshape(nb_models, ndim)
+                    confidences = numpy.asarray([float(model.overall_confidence()) for model in pairwise_models])
+
+                    # Each pairwise registration defines a constraint x_u - x_v = shift, relative to the first one,
+                    # the last constraint forces the solution to have no displacement for the first time point.
+                    # The system is built directly in sparse form and solved for all dimensions at once:
+                    rows = numpy.concatenate([numpy.arange(nb_models), numpy.arange(nb_models), [nb_models]])
+                    columns = numpy.concatenate([us, vs, [0]])
+                    values = numpy.concatenate([numpy.ones(nb_models), -numpy.ones(nb_models), [1]]).astype(
+                        numpy.float32
                     )
+                    a = sp.sparse.csr_matrix((values, (rows, columns)), shape=(nb_models + 1, length))
 
-                    # initialise count for average:
-                    for model in translation_models:
-                        model.count = 0
-
-                    for d in range(ndim):
-
-                        # instantiates system to solve with zeros:
-                        a = xp.zeros((nb_models + 1, length), dtype=xp.float32)
-                        y = xp.zeros((nb_models + 1,), dtype=xp.float32)
-
-                        # iterates through all pairwise registrations:
-                        zero_vector = None
-                        for tp, model in enumerate(pairwise_models):
-                            u = model.u
-                            v = model.v
-                            confidence = model.overall_confidence()
-
-                            if tp == 0:
-                                # we make sure that all shifts are relative to the first timepoint:
-                                zero_vector = model.shift_vector[d].copy()
-
-                            vector = model.shift_vector[d] - zero_vector
+                    y = numpy.zeros((nb_models + 1, ndim), dtype=numpy.float32)
+                    y[:-1] = shift_vectors - shift_vectors[:1]
 
-                            # Each pairwise registration defines a constraint that is added to the matrix:
-                            y[tp] = vector.copy()
-                            a[tp, u] = +1
-                            a[tp, v] = -1
-
-                            # For each time point we collect the average confidence of all the pairwise_registrations:
-                            translation_models[u].confidence += confidence
-                            translation_models[u].count += 1
-                            translation_models[v].confidence += confidence
-                            translation_models[v].count += 1
+                    # solve system:
+                    x_opt = linsolve(
+                        a, y, tolerance=tolerance, order_error=order_error, order_reg=order_reg, alpha_reg=alpha_reg
+                    )
 
-                        # Forces solution to have no displacement for first time point:
-                        y[-1] = 0
-                        a[-1, 0] = 1
+                    # detrend:
+                    if detrend:
+                        x_opt = sp.signal.detrend(x_opt, axis=0)
 
-                        # move matrix to sparse domain (much faster!):
-                        a = sp.sparse.coo_matrix(a)
+                    # For each time point we collect the average confidence of all its pairwise registrations:
+                    confidence_sums = numpy.bincount(us, confidences, minlength=length)
+                    confidence_sums += numpy.bincount(vs, confidences, minlength=length)
+                    counts = numpy.bincount(us, minlength=length) + numpy.bincount(vs, minlength=length)
+                    average_confidences = confidence_sums / numpy.maximum(counts, 1)
 
-                        # solve system:
-                        x_opt = linsolve(
-                            a, y, tolerance=tolerance, order_error=order_error, order_reg=order_reg, alpha_reg=alpha_reg
+                    # sets the shift vectors for the resulting sequence reg model:
+                    translation_models: List[TranslationRegistrationModel] = list(
+                        TranslationRegistrationModel(
+                            xp.asarray(-x_opt[tp], dtype=internal_dtype), confidence=average_confidences[tp]
                         )
-
-                        # detrend:
-                        if detrend:
-                            x_opt = sp.signal.detrend(x_opt)
-
-                        # sets the shift vectors for the resulting sequence reg model, and compute average confidences:
-                        for tp in range(length):
-                            translation_models[tp].shift_vector[d] = -x_opt[tp]
-                            translation_models[tp].confidence /= translation_models[tp].count
+                        for tp in range(length)
+                    )
 
                     model = SequenceRegistrationModel(model_list=translation_models)
 
@@ -255,26 +275,177 @@ def _pairwise_registration(
 
     if mode == "translation":
         model = register_translation_proj_nd(image_u, image_v, _display_phase_correlation=False, **kwargs)
-        model.u = u
-        model.v = v
-        confidence = model.overall_confidence()
-
-        if confidence < min_confidence:
-            if enable_com:
-                offset_mode = f"p={quantile * 100}"
-                com_u = center_of_mass(
-                    image_u, mode="full", projection_type="max-min", offset_mode=offset_mode, bounding_box=bounding_box
-                )
-                com_v = center_of_mass(
-                    image_v, mode="full", projection_type="max-min", offset_mode=offset_mode, bounding_box=bounding_box
-                )
-                model = TranslationRegistrationModel(shift_vector=com_u - com_v, confidence=min_confidence)
-                model.u = u
-                model.v = v
-            else:
-                model = None
+        model = _confident_model(
+            model, u, v, lambda: (image_u, image_v), min_confidence, enable_com, quantile, bounding_box
+        )
 
     else:
         raise ValueError(f"Unsupported sequence stabilisation mode: {mode}")
 
     return model
+
+
+def _confident_model(
+    model: TranslationRegistrationModel,
+    u: int,
+    v: int,
+    get_images: Callable[[], Tuple[xpArray, xpArray]],
+    min_confidence: float,
+    enable_com: bool,
+    quantile: float,
+    bounding_box: bool,
+) -> Optional[TranslationRegistrationModel]:
+    # Discards models with a too low confidence, or falls back to the center of mass shift of the images:
+    model.u = u
+    model.v = v
+    confidence = model.overall_confidence()
+
+    if confidence < min_confidence:
+        if enable_com:
+            image_u, image_v = get_images()
+            offset_mode = f"p={quantile * 100}"
+            com_u = center_of_mass(
+                image_u, mode="full", projection_type="max-min", offset_mode=offset_mode, bounding_box=bounding_box
+            )
+            com_v = center_of_mass(
+                image_v, mode="full", projection_type="max-min", offset_mode=offset_mode, bounding_box=bounding_box
+            )
+            model = TranslationRegistrationModel(shift_vector=com_u - com_v, confidence=min_confidence)
+            model.u = u
+            model.v = v
+        else:
+            model = None
+
+    return model
+
+
+class _SpectrumCache:
+    def __init__(self, compute: Callable[[int], List[Tuple[xpArray, numpy.dtype]]], max_bytes: Optional[int] = None):
+        """Cache of the spectra of the frames of a sequence in use, released explicitly once no longer needed.
+        Spectra missing from the cache are computed, and cached if they fit in the optional budget in bytes,
+        least recently used spectra being evicted first."""
+        self._compute = compute
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, List[Tuple[xpArray, numpy.dtype]]]" = OrderedDict()
+        self.nbytes = 0
+        self.peak_nbytes = 0
+        self.peak_length = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, index: int) -> List[Tuple[xpArray, numpy.dtype]]:
+        spectra = self._entries.get(index)
+        if spectra is not None:
+            self.hits += 1
+            self._entries.move_to_end(index)
+            return spectra
+
+        self.misses += 1
+        spectra = self._compute(index)
+        self.put(index, spectra)
+        return spectra
+
+    def put(self, index: int, spectra: List[Tuple[xpArray, numpy.dtype]]) -> None:
+        nbytes = _spectra_nbytes(spectra)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        self._entries[index] = spectra
+        self.nbytes += nbytes
+        while self.max_bytes is not None and self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= _spectra_nbytes(evicted)
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+        self.peak_length = max(self.peak_length, len(self._entries))
+
+    def release(self, index: int) -> None:
+        spectra = self._entries.pop(index, None)
+        if spectra is not None:
+            self.nbytes -= _spectra_nbytes(spectra)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _spectra_nbytes(spectra: List[Tuple[xpArray, numpy.dtype]]) -> int:
+    return sum(spectrum.nbytes for spectrum, _ in spectra)
+
+
+def _pairwise_registrations_from_spectra(
+    pairs: Iterable[Tuple[int, int]],
+    get_frame: Callable[[int], xpArray],
+    load_ahead: bool,
+    length: int,
+    min_confidence: float,
+    enable_com: bool,
+    quantile: float,
+    bounding_box: bool,
+    internal_dtype,
+    max_bytes: Optional[int],
+    workers: int,
+    **kwargs,
+) -> List[TranslationRegistrationModel]:
+    # Registers pairs of frames from their spectra while streaming the sequence: pairs are visited by increasing
+    # last frame, so frames are read in order and each is preprocessed and Fourier transformed once.
+    # The spectra of a frame are released after its last pair, only the sliding window of frames in use
+    # stays resident. With 'load_ahead', frames are read ahead by 'workers' threads.
+    # Models are returned in the order of the given pairs.
+    preprocessing = {key: kwargs.pop(key) for key in _PREPROCESSING_PARAMETERS if key in kwargs}
+    order = list(pairs)
+    pairs = sorted(order, key=lambda pair: (pair[1], pair[0]))
+
+    # frames released after each pair:
+    last_pair = {}
+    for position, pair in enumerate(pairs):
+        for index in pair:
+            last_pair[index] = position
+    releases: Dict[int, List[int]] = {}
+    for index, position in last_pair.items():
+        releases.setdefault(position, []).append(index)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="stabilisation") as executor:
+        loading: Dict[int, Future] = {}
+
+        def _frame(index: int) -> xpArray:
+            if not load_ahead:
+                return get_frame(index)
+            for ahead in range(index, min(index + max(1, workers), length)):
+                if ahead not in loading and ahead not in cache and last_pair.get(ahead, -1) >= position:
+                    loading[ahead] = executor.submit(get_frame, ahead)
+            future = loading.pop(index, None)
+            return future.result() if future is not None else get_frame(index)
+
+        def _spectra(index: int) -> List[Tuple[xpArray, numpy.dtype]]:
+            frame = Backend.to_backend(_frame(index), dtype=internal_dtype)
+            return projection_spectra(frame, **preprocessing)
+
+        cache = _SpectrumCache(_spectra, max_bytes=max_bytes)
+
+        models = {}
+        for position, (u, v) in enumerate(pairs):
+            model = register_translation_spectra(cache.get(u), cache.get(v), **kwargs)
+            model = _confident_model(
+                model,
+                u,
+                v,
+                lambda: (
+                    Backend.to_backend(get_frame(u), dtype=internal_dtype),
+                    Backend.to_backend(get_frame(v), dtype=internal_dtype),
+                ),
+                min_confidence,
+                enable_com,
+                quantile,
+                bounding_box,
+            )
+            models[(u, v)] = model
+
+            for index in releases.get(position, ()):
+                cache.release(index)
+
+    aprint(
+        f"Spectra of {length} frames computed {cache.misses} times, reused {cache.hits} times, "
+        + f"at most {cache.peak_length} frames resident ({cache.peak_nbytes / 1e6:.1f} MB)"
+    )
+    return [models[pair] for pair in order]
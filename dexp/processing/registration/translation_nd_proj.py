@@ -1,9 +1,18 @@
-from typing import Callable
+from typing import Callable, List, Sequence, Tuple
+
+import numpy
 
 from dexp.processing.registration.model.translation_registration_model import (
     TranslationRegistrationModel,
 )
 from dexp.processing.registration.translation_2d import register_translation_2d_dexp
+from dexp.processing.registration.translation_nd import (
+    _correlation_peak,
+    _internal_dtype,
+    _phase_correlation_from_spectra,
+    _preprocess_for_correlation,
+    _spectrum,
+)
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend
 
@@ -79,25 +88,9 @@ def register_translation_proj_nd(
         # print(shifts_p1)
         # print(shifts_p2)
 
-        if drop_worse:
-            worse_index = xp.argmin(xp.asarray([confidence_p0, confidence_p1, confidence_p2]))
-
-            if worse_index == 0:
-                shifts = xp.asarray([0.5 * (shifts_p1[0] + shifts_p2[0]), shifts_p2[1], shifts_p1[1]])
-                confidence = (confidence_p1 * confidence_p2) ** 0.5
-            elif worse_index == 1:
-                shifts = xp.asarray([shifts_p2[0], 0.5 * (shifts_p0[0] + shifts_p2[1]), shifts_p0[1]])
-                confidence = (confidence_p0 * confidence_p2) ** 0.5
-            elif worse_index == 2:
-                shifts = xp.asarray([shifts_p1[0], shifts_p0[0], 0.5 * (shifts_p0[1] + shifts_p1[1])])
-                confidence = (confidence_p0 * confidence_p1) ** 0.5
-
-        else:
-            shifts_p0 = xp.asarray([0, shifts_p0[0], shifts_p0[1]])
-            shifts_p1 = xp.asarray([shifts_p1[0], 0, shifts_p1[1]])
-            shifts_p2 = xp.asarray([shifts_p2[0], shifts_p2[1], 0])
-            shifts = (shifts_p0 + shifts_p1 + shifts_p2) / 2
-            confidence = (confidence_p0 * confidence_p1 * confidence_p2) ** 0.33
+        shifts, confidence = _combine_projection_registrations(
+            [(shifts_p0, confidence_p0), (shifts_p1, confidence_p1), (shifts_p2, confidence_p2)], drop_worse
+        )
 
         # if confidence>0.1:
         #     print(f"shift={shifts}, confidence={confidence}")
@@ -122,6 +115,126 @@ def register_translation_proj_nd(
     return model
 
 
+def _combine_projection_registrations(
+    registrations: Sequence[Tuple[xpArray, xpArray]], drop_worse: bool = True
+) -> Tuple[xpArray, xpArray]:
+    # Combines the (shifts, confidence) of the registrations of the projections along axis 0, 1 and 2 of 3D images:
+    xp = Backend.get_xp_module()
+    (shifts_p0, confidence_p0), (shifts_p1, confidence_p1), (shifts_p2, confidence_p2) = registrations
+
+    if drop_worse:
+        worse_index = xp.argmin(xp.asarray([confidence_p0, confidence_p1, confidence_p2]))
+
+        if worse_index == 0:
+            shifts = xp.asarray([0.5 * (shifts_p1[0] + shifts_p2[0]), shifts_p2[1], shifts_p1[1]])
+            confidence = (confidence_p1 * confidence_p2) ** 0.5
+        elif worse_index == 1:
+            shifts = xp.asarray([shifts_p2[0], 0.5 * (shifts_p0[0] + shifts_p2[1]), shifts_p0[1]])
+            confidence = (confidence_p0 * confidence_p2) ** 0.5
+        elif worse_index == 2:
+            shifts = xp.asarray([shifts_p1[0], shifts_p0[0], 0.5 * (shifts_p0[1] + shifts_p1[1])])
+            confidence = (confidence_p0 * confidence_p1) ** 0.5
+
+    else:
+        shifts_p0 = xp.asarray([0, shifts_p0[0], shifts_p0[1]])
+        shifts_p1 = xp.asarray([shifts_p1[0], 0, shifts_p1[1]])
+        shifts_p2 = xp.asarray([shifts_p2[0], shifts_p2[1], 0])
+        shifts = (shifts_p0 + shifts_p1 + shifts_p2) / 2
+        confidence = (confidence_p0 * confidence_p1 * confidence_p2) ** 0.33
+
+    return shifts, confidence
+
+
+def projection_spectra(
+    image: xpArray,
+    internal_dtype=None,
+    denoise_input_sigma: float = 1.5,
+    gamma: float = 1,
+    log_compression: bool = True,
+    edge_filter: bool = True,
+    window: float = 0.5,
+) -> List[Tuple[xpArray, numpy.dtype]]:
+    """
+    Preprocesses an image as 'register_translation_proj_nd' does and Fourier transforms it (its 3 projections
+    for 3D images), so that it can be registered to several other images without being processed again,
+    see 'register_translation_spectra'.
+
+    Parameters
+    ----------
+    image : 2D or 3D image.
+    internal_dtype : Internal dtype for computation
+    denoise_input_sigma, gamma, log_compression, edge_filter : preprocessing, see 'register_translation_nd'.
+    window : exponent of the Hann window applied before the Fourier transform.
+
+    Returns
+    -------
+    Spectra of the image or of its projections, with the dtype of their phase correlations.
+    """
+    xp = Backend.get_xp_module()
+    image = Backend.to_backend(image)
+
+    if image.ndim == 2:
+        images = [_preprocess_image(image, in_place=False, dtype=internal_dtype)]
+    elif image.ndim == 3:
+        images = [_project_preprocess_image(image, axis=axis, dtype=xp.float32) for axis in range(3)]
+    else:
+        raise ValueError(f"Unsupported number of dimensions ({image.ndim}) for registration.")
+
+    spectra = []
+    for projection in images:
+        dtype = _internal_dtype(projection, internal_dtype)
+        projection = _preprocess_for_correlation(
+            projection,
+            internal_dtype=dtype,
+            denoise_input_sigma=denoise_input_sigma,
+            gamma=gamma,
+            log_compression=log_compression,
+            edge_filter=edge_filter,
+        )
+        spectra.append((_spectrum(projection, window=window), dtype))
+
+    return spectra
+
+
+def register_translation_spectra(
+    spectra_a: Sequence[Tuple[xpArray, numpy.dtype]],
+    spectra_b: Sequence[Tuple[xpArray, numpy.dtype]],
+    drop_worse: bool = True,
+    force_numpy: bool = False,
+    **kwargs,
+) -> TranslationRegistrationModel:
+    """
+    Registers two images from their spectra computed by 'projection_spectra', gives the same result as
+    'register_translation_proj_nd' with the default 2D registration method.
+
+    Parameters
+    ----------
+    spectra_a : spectra of the first image
+    spectra_b : spectra of the second image
+    drop_worse : drops the worst 2D registrations before combining the projection
+        registration vectors to a full nD registration vector.
+    force_numpy : Forces output model to be allocated with numpy arrays.
+    kwargs : max_range_ratio, decimate, quantile and sigma, see 'register_translation_nd'.
+
+    Returns
+    -------
+    Translation-only registration model
+    """
+    registrations = []
+    for (G_a, dtype), (G_b, _) in zip(spectra_a, spectra_b):
+        correlation = _phase_correlation_from_spectra(G_a, G_b, internal_dtype=dtype)
+        shifts, confidence, _, _ = _correlation_peak(correlation, **kwargs)
+        model = TranslationRegistrationModel(shift_vector=shifts, confidence=confidence, force_numpy=force_numpy)
+        registrations.append(model.get_shift_and_confidence())
+
+    if len(registrations) == 1:
+        shifts, confidence = registrations[0]
+    else:
+        shifts, confidence = _combine_projection_registrations(registrations, drop_worse)
+
+    return TranslationRegistrationModel(shift_vector=shifts, confidence=confidence, force_numpy=force_numpy)
+
+
 def _project_preprocess_image(
     image, axis: int, smoothing: float = 0, quantile: int = None, gamma: float = 1, dtype=None
 ):
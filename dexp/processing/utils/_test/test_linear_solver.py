@@ -1,7 +1,10 @@
+import numpy
 import pytest
+import scipy.sparse
 from arbol import aprint, asection
 
 from dexp.processing.utils.linear_solver import linsolve
+from dexp.utils.backends import NumpyBackend
 from dexp.utils.backends.backend import Backend
 from dexp.utils.testing.testing import execute_both_backends
 
@@ -35,3 +38,17 @@ def _run_solver(w=37, h=41, noise=1e-2, **kwargs):
     aprint(f"error : {xp.absolute(x - x_gt)} ")
 
     return mean_abs_error
+
+
+def test_linear_solver_sparse_columns() -> None:
+    rng = numpy.random.default_rng(0)
+    a = scipy.sparse.random(60, 25, density=0.2, random_state=0, format="csr")
+    y = a @ rng.uniform(size=(25, 3)) + 1e-2 * rng.normal(size=(60, 3))
+
+    with NumpyBackend():
+        # systems sharing their matrix are solved at once, as they would be one by one:
+        x = linsolve(a, y, tolerance=1e-9, order_error=2, order_reg=1, alpha_reg=1e-2)
+        columns = [linsolve(a, y[:, k], tolerance=1e-9, order_error=2, order_reg=1, alpha_reg=1e-2) for k in range(3)]
+
+    assert x.shape == (25, 3)
+    numpy.testing.assert_allclose(x, numpy.stack(columns, axis=1), atol=1e-3)
@@ -2,8 +2,9 @@ import numpy as np
 import pytest
 from arbol import aprint
 
+from dexp.datasets.statistics import stack_statistics
 from dexp.processing.utils.normalise import Normalise
-from dexp.utils.backends import Backend
+from dexp.utils.backends import Backend, NumpyBackend
 from dexp.utils.testing.testing import execute_both_backends
 
 
@@ -40,3 +41,27 @@ def test_normalise(dexp_nuclei_background_data):
     error = xp.median(xp.abs(image - image_denormalised)).item()
     aprint(f"Error = {error}")
     assert error < 1e-6
+
+
+def test_normalise_statistics():
+    image = np.random.default_rng(0).integers(100, 4000, size=(8, 64, 64)).astype(np.uint16)
+
+    with NumpyBackend():
+        statistics = stack_statistics(image)
+        reference = Normalise(image, quantile=0.01)
+        normalise = Normalise(image, quantile=0.01, statistics=statistics)
+
+    assert normalise.min_value == pytest.approx(np.quantile(image, 0.01))
+    assert normalise.max_value == pytest.approx(np.quantile(image, 0.99))
+    assert normalise.min_value == pytest.approx(reference.min_value)
+    assert normalise.max_value == pytest.approx(reference.max_value)
+
+    # binned histograms of floating point images are not used for quantiles, an outlier would make them too coarse:
+    image = np.random.default_rng(0).normal(100, 10, size=(8, 64, 64)).astype(np.float32)
+    image[0, 0, 0] = 1e7
+
+    with NumpyBackend():
+        normalise = Normalise(image, quantile=0.005, statistics=stack_statistics(image))
+
+    assert normalise.min_value == pytest.approx(np.quantile(image, 0.005), rel=1e-5)
+    assert normalise.max_value == pytest.approx(np.quantile(image, 0.995), rel=1e-5)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from dexp.processing.utils.quantile import fast_quantile
+from dexp.utils.backends import Backend
+from dexp.utils.testing.testing import execute_both_backends
+
+LEVELS = (0.0, 0.005, 0.1, 0.5, 0.9, 0.995, 1.0)
+
+
+@execute_both_backends
+@pytest.mark.parametrize("dtype", [np.uint8, np.int8, np.uint16, np.int16])
+def test_fast_quantile_integers(dtype):
+    xp = Backend.get_xp_module()
+    info = np.iinfo(dtype)
+    image = np.random.default_rng(0).integers(info.min, info.max, size=(16, 32, 32), endpoint=True).astype(dtype)
+    image = Backend.to_backend(image)
+
+    # exact, as numpy's quantiles:
+    expected = Backend.to_numpy(xp.quantile(image.astype(xp.float64), q=xp.asarray(LEVELS)))
+    np.testing.assert_allclose(fast_quantile(image, LEVELS), expected)
+    assert fast_quantile(image, 0.5) == pytest.approx(float(expected[3]))
+
+
+@execute_both_backends
+def test_fast_quantile_floats():
+    xp = Backend.get_xp_module()
+    image = Backend.to_backend(np.random.default_rng(0).gamma(2.0, size=(32, 64, 64)).astype(np.float32))
+    expected = Backend.to_numpy(xp.quantile(image, q=xp.asarray(LEVELS, dtype=xp.float32)))
+
+    # exact, as numpy's quantiles:
+    np.testing.assert_allclose(fast_quantile(image, LEVELS), expected, rtol=1e-5)
+
+    # sampled estimates have quantile levels close to the requested ones:
+    sample_size = 2**16
+    tolerance = np.sqrt(np.log(2 / 1e-6) / (2 * sample_size))
+    estimates = Backend.to_backend(fast_quantile(image, LEVELS[1:-1], sample_size=sample_size).astype(np.float32))
+    levels = Backend.to_numpy(xp.mean(image.ravel()[:, None] <= estimates[None, :], axis=0))
+    np.testing.assert_allclose(levels, LEVELS[1:-1], atol=tolerance)
+
+    # a single outlier does not move the quantiles:
+    image = np.random.default_rng(0).normal(100, 10, size=(32, 64, 64)).astype(np.float32)
+    image[0, 0, 0] = 1e7
+    image = Backend.to_backend(image)
+    expected = Backend.to_numpy(xp.quantile(image, q=xp.asarray((0.005, 0.995), dtype=xp.float32)))
+
+    np.testing.assert_allclose(fast_quantile(image, (0.005, 0.995)), expected, rtol=1e-5)
+    np.testing.assert_allclose(fast_quantile(image, (0.005, 0.995), sample_size=2**16), expected, rtol=0.01)
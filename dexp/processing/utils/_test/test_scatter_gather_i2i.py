@@ -3,7 +3,7 @@ from arbol import aprint
 
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
 from dexp.utils.backends import Backend
-from dexp.utils.testing.testing import execute_both_backends
+from dexp.utils.testing.testing import cupy_only, execute_both_backends
 from dexp.utils.timeit import timeit
 
 
@@ -35,3 +35,54 @@ def test_scatter_gather_i2i(ndim=3, length_xy=128, splits=4, filter_size=7):
     aprint(f"Error = {error}")
 
     assert error < 0.0001
+
+
+@execute_both_backends
+def test_scatter_gather_i2i_pipelined(ndim=3, length_xy=96, splits=3, filter_size=5):
+    sp = Backend.get_sp_module()
+    rng = np.random.default_rng(0)
+
+    image = rng.uniform(0, 1, size=(length_xy,) * ndim).astype(np.float32)
+
+    def f(x):
+        return sp.ndimage.uniform_filter(x, size=filter_size)
+
+    tiles = (length_xy // splits,) * ndim
+    for to_numpy in (True, False):
+        with timeit("scatter_gather(f)"):
+            result = scatter_gather_i2i(image, f, tiles=tiles, margins=filter_size // 2, to_numpy=to_numpy)
+
+        with timeit("pipelined scatter_gather(f)"):
+            result_pipelined = scatter_gather_i2i(
+                image, f, tiles=tiles, margins=filter_size // 2, to_numpy=to_numpy, pipelined=True
+            )
+
+        assert np.array_equal(Backend.to_numpy(result), Backend.to_numpy(result_pipelined))
+
+
+@cupy_only
+def test_scatter_gather_i2i_pipelined_streams(monkeypatch, ndim=3, length_xy=64, splits=4, filter_size=5):
+    import cupy
+
+    sp = Backend.get_sp_module()
+    image = np.random.default_rng(0).uniform(0, 1, size=(length_xy,) * ndim).astype(np.float32)
+
+    def f(x):
+        return sp.ndimage.uniform_filter(x, size=filter_size)
+
+    streams = []
+    original_stream = cupy.cuda.Stream
+
+    def counting_stream(*args, **kwargs):
+        streams.append(original_stream(*args, **kwargs))
+        return streams[-1]
+
+    monkeypatch.setattr(cupy.cuda, "Stream", counting_stream)
+
+    tiles = (length_xy // splits,) * ndim
+    result = scatter_gather_i2i(image, f, tiles=tiles, margins=filter_size // 2)
+    result_pipelined = scatter_gather_i2i(image, f, tiles=tiles, margins=filter_size // 2, pipelined=True)
+    assert np.array_equal(Backend.to_numpy(result), Backend.to_numpy(result_pipelined))
+
+    # one stream per transfer thread, not per tile:
+    assert 0 < len(streams) <= 2
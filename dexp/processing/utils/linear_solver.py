@@ -24,35 +24,61 @@ def linsolve(
     limited: bool = True,
     verbose: bool = False,
 ) -> xpArray:
-    xp = Backend.get_xp_module()
+    """
+    Solves the linear system a @ x = y by minimising the regularised error:
+    beta * |a @ x - y|_order_error + alpha_reg * alpha * |x|_order_reg, with the analytic gradient.
+
+    Parameters
+    ----------
+    a : system matrix of shape (m, n), dense or scipy sparse.
+    y : observations of shape (m,), or (m, k) to solve k independent systems with the same matrix at once,
+        each with its own error and regularisation terms.
+    x0 : initial solution of shape (n,) or (n, k), zeros by default.
+    maxiter : maximum number of iterations.
+    maxfun : maximum number of function evaluations.
+    tolerance : tolerance of the optimisation.
+    order_error : order of the norm of the error term.
+    order_reg : order of the norm of the regularisation term.
+    alpha_reg : weight of the regularisation term.
+    l2_init : initialises the solution with the least squares solution.
+    bounds : bounds of the solution entries, (n * k) bounds for k systems.
+    limited : uses L-BFGS-B instead of BFGS.
+    verbose : prints the optimiser progress.
 
+    Returns
+    -------
+    Solution of shape (n,) or (n, k).
+    """
     a = Backend.to_backend(a)
     y = Backend.to_backend(y)
+    shape = (a.shape[1],) + tuple(y.shape[1:])
 
     if x0 is None:
         if l2_init:
             x0 = linsolve(a, y, x0=x0, maxiter=maxiter, tolerance=tolerance, order_error=2, alpha_reg=0, l2_init=False)
         else:
-            x0 = numpy.zeros(a.shape[1])
+            x0 = numpy.zeros(shape)
 
+    x0 = Backend.to_numpy(x0).ravel()
     beta = (1.0 / y.shape[0]) ** (1.0 / order_error)
-    alpha = (1.0 / x0.shape[0]) ** (1.0 / order_reg)
+    alpha = (1.0 / shape[0]) ** (1.0 / order_reg)
 
     def fun(x):
-        x = Backend.to_backend(x)
-        if alpha_reg == 0:
-            objective = beta * float(xp.linalg.norm(a @ x - y, ord=order_error))
-            # aprint(f"objective={objective}, regterm=N/A ")
-        else:
-            objective = beta * float(xp.linalg.norm(a @ x - y, ord=order_error))
-            regularisation_term = (alpha_reg * alpha) * float(xp.linalg.norm(x, ord=order_reg))
-            # aprint(f"objective={objective}, regterm={regularisation_term} ")
-            objective += regularisation_term
-        return objective
+        x = Backend.to_backend(x).reshape(shape)
+        error = a @ x - y
+        objective, gradient = _norm_and_gradient(error, order_error)
+        objective = beta * objective
+        gradient = beta * (a.T @ gradient)
+        if alpha_reg != 0:
+            regularisation_term, regularisation_gradient = _norm_and_gradient(x, order_reg)
+            objective += (alpha_reg * alpha) * regularisation_term
+            gradient += (alpha_reg * alpha) * regularisation_gradient
+        return objective, Backend.to_numpy(gradient).ravel().astype(numpy.float64)
 
     result = minimize(
         fun,
         x0,
+        jac=True,
         method="L-BFGS-B" if limited else "BFGS",
         tol=tolerance,
         bounds=bounds if limited else None,
@@ -73,6 +99,18 @@ def linsolve(
             f"Convergence failed: '{result.message}' after {result.nit} "
             + "iterations and {result.nfev} function evaluations."
         )
-        return Backend.to_backend(x0)
+        return Backend.to_backend(x0.reshape(shape))
+
+    return Backend.to_backend(result.x.reshape(shape))
+
+
+def _norm_and_gradient(x: xpArray, order: float) -> Tuple[float, xpArray]:
+    # Sum of the norms of the columns of x (of x itself when 1D) and its gradient with respect to x:
+    xp = Backend.get_xp_module()
 
-    return Backend.to_backend(result.x)
+    norms = xp.linalg.norm(x, ord=order, axis=0)
+    magnitude = xp.absolute(x)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        gradient = xp.sign(x) * magnitude ** (order - 1) / norms ** (order - 1)
+    gradient = xp.nan_to_num(gradient, nan=0.0, posinf=0.0, neginf=0.0)
+    return float(xp.sum(norms)), gradient
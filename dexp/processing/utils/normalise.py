@@ -1,8 +1,9 @@
-from typing import Callable, Tuple
+from typing import Callable, Dict, Optional, Tuple
 
 import numpy as np
 
 from dexp.processing.utils.element_wise_affine import element_wise_affine
+from dexp.processing.utils.quantile import fast_quantile, histogram_quantiles
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend, NumpyBackend
 
@@ -15,6 +16,8 @@ class Normalise:
         high: float = 1.0,
         minmax: Tuple[float, float] = None,
         quantile: float = 0,
+        statistics: Optional[Dict[str, np.ndarray]] = None,
+        quantile_sample_size: Optional[int] = None,
         clip: bool = False,
         do_normalise: bool = True,
         in_place: bool = True,
@@ -32,7 +35,14 @@ class Normalise:
         low, high : normalisation range
         minmax : min and max values of the image if already known.
         quantile : if quantile>0 then quantile normalisation is used to find the min and max values.
-            Value must be within [0,1]
+            Value must be within [0,1]. Quantiles are computed with 'fast_quantile': from a single-pass histogram for
+            integer images of at most 16 bits, with the backend's quantile function for other images.
+        statistics : precomputed statistics of the image (see 'dexp.datasets.statistics.stack_statistics', and
+            'dexp.datasets.statistics.statistics_at' for those stored for a time point of a dataset),
+            the min and max values, and the quantiles of exact histograms, are then taken from them instead of computed
+            from the image. Quantiles of binned (floating point) histograms are computed from the image.
+        quantile_sample_size : if given, quantiles of floating point images are estimated from a random sample
+            of that many voxels instead of from the whole image.
         clip : clip after normalisation/denormalisation
         do_normalise : If False, the returned functions are pass-through identity functions
             -- usefull to turn on and off normalisation while still using the functions themselves.
@@ -73,11 +83,23 @@ class Normalise:
         if not self.do_normalise:
             return
 
-        if minmax is None:
+        if minmax is None and statistics is not None and (quantile == 0 or statistics["exact"]):
+            min_value, max_value = statistics["min"], statistics["max"]
+            if quantile > 0:
+                quantiles = histogram_quantiles(
+                    statistics["histogram"],
+                    statistics["histogram_range"],
+                    (quantile, 1 - quantile),
+                    exact=True,
+                    value_range=(min_value, max_value),
+                )
+                if quantiles[0] < quantiles[1]:
+                    min_value, max_value = quantiles
+
+        elif minmax is None:
             min_value, max_value = 0, 0
             if quantile > 0:
-                min_value = xp.quantile(image, q=quantile)
-                max_value = xp.quantile(image, q=1 - quantile)
+                min_value, max_value = fast_quantile(image, (quantile, 1 - quantile), sample_size=quantile_sample_size)
 
             # if we did not use quantiles or we get some weird result, let's fallback to standard min max:
             if min_value >= max_value:
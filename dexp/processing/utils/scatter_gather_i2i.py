@@ -1,11 +1,14 @@
-from typing import Callable, Optional, Sequence, Tuple, Union
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
 
 import numpy
 
 from dexp.processing.utils.nd_slice import nd_split_slices, remove_margin_slice
 from dexp.processing.utils.normalise import Normalise
 from dexp.utils import xpArray
-from dexp.utils.backends import Backend
+from dexp.utils.backends import Backend, CupyBackend
 
 
 def scatter_gather_i2i(
@@ -17,6 +20,8 @@ def scatter_gather_i2i(
     clip: bool = False,
     to_numpy: bool = True,
     internal_dtype: Optional[numpy.dtype] = None,
+    pipelined: bool = False,
+    statistics: Optional[Dict[str, numpy.ndarray]] = None,
 ) -> xpArray:
     """
     Image-2-image scatter-gather.
@@ -38,6 +43,11 @@ def scatter_gather_i2i(
     to_numpy : should the result be a numpy array? Very usefull when the compute backend
         cannot hold the whole input and output images in memory.
     internal_dtype : internal dtype for computation
+    pipelined : overlaps the computation of each tile with the transfer of the next tile to the backend
+        and of the previous tile back from it. Transfers run in worker threads, and on their own CUDA
+        streams with a cupy backend. The result is identical to the sequential computation.
+    statistics : precomputed statistics of the input image, normalisation then takes its quantiles from them
+        (see 'Normalise').
 
     Returns
     -------
@@ -66,7 +76,9 @@ def scatter_gather_i2i(
         result = Backend.get_xp_module(image).empty_like(image, dtype=internal_dtype)
 
     # Normalise:
-    norm = Normalise(Backend.to_backend(image), do_normalise=normalise, clip=clip, quantile=0.005)
+    norm = Normalise(
+        Backend.to_backend(image), do_normalise=normalise, clip=clip, quantile=0.005, statistics=statistics
+    )
 
     # image shape:
     shape = image.shape
@@ -88,6 +100,10 @@ def scatter_gather_i2i(
             result = Backend.to_numpy(result, dtype=internal_dtype)
         else:
             result = Backend.to_backend(result, dtype=internal_dtype)
+    elif pipelined:
+        _scatter_gather_pipeline(
+            norm.backward, function, image, internal_dtype, norm.forward, result, shape, slices, to_numpy
+        )
     else:
         _scatter_gather_loop(
             norm.backward, function, image, internal_dtype, norm.forward, result, shape, slices, to_numpy
@@ -123,6 +139,88 @@ def _scatter_gather_loop(
         result[tile_slice_no_margins] = image_tile
 
 
+# CUDA streams of the transfer threads, per device:
+_thread_streams = threading.local()
+
+
+def _transfer_stream(device_id: int):
+    # Each transfer thread creates its stream once and reuses it for all the tiles it transfers:
+    import cupy
+
+    if not hasattr(_thread_streams, "streams"):
+        _thread_streams.streams = {}
+    if device_id not in _thread_streams.streams:
+        _thread_streams.streams[device_id] = cupy.cuda.Stream(non_blocking=True)
+    return _thread_streams.streams[device_id]
+
+
+def _transfer_context(backend: Backend) -> ExitStack:
+    # Worker threads are not in the backend context, device and stream must be set explicitly:
+    stack = ExitStack()
+    if isinstance(backend, CupyBackend):
+        stack.enter_context(backend.cupy_device)
+        stream = stack.enter_context(_transfer_stream(backend.device_id))
+        stack.callback(stream.synchronize)
+    return stack
+
+
+def _scatter_gather_pipeline(
+    denorm_fun: Callable,
+    function: Callable,
+    image: xpArray,
+    internal_dtype: numpy.dtype,
+    norm_fun: Callable,
+    result: Callable,
+    shape: Tuple[int, ...],
+    slices: Sequence[Tuple[slice, ...]],
+    to_numpy: bool,
+) -> None:
+
+    backend = Backend.current()
+    slices = list(slices)
+
+    def _load(tile_slice: Tuple[slice, ...]) -> xpArray:
+        with _transfer_context(backend):
+            return backend._to_backend(image[tile_slice], dtype=internal_dtype)
+
+    def _store(image_tile: xpArray, tile_slice: Tuple[slice, ...], tile_slice_no_margins: Tuple[slice, ...]) -> None:
+        with _transfer_context(backend):
+            image_tile = backend._to_numpy(image_tile, dtype=internal_dtype)
+            remove_margin_slice_tuple = remove_margin_slice(shape, tile_slice, tile_slice_no_margins)
+            result[tile_slice_no_margins] = image_tile[remove_margin_slice_tuple]
+
+    # One thread per direction, so that at most one tile is loaded ahead and one tile is pending storage:
+    with ThreadPoolExecutor(max_workers=1) as loader, ThreadPoolExecutor(max_workers=1) as storer:
+        next_tile: Future = loader.submit(_load, slices[0][0])
+        pending_store: Optional[Future] = None
+
+        try:
+            for i, (tile_slice, tile_slice_no_margins) in enumerate(slices):
+                image_tile = next_tile.result()
+                if i + 1 < len(slices):
+                    next_tile = loader.submit(_load, slices[i + 1][0])
+
+                image_tile = denorm_fun(function(norm_fun(image_tile)))
+
+                if to_numpy:
+                    # the tile must be fully computed before being read from another stream:
+                    backend.synchronise()
+                    if pending_store is not None:
+                        pending_store.result()
+                    pending_store = storer.submit(_store, image_tile, tile_slice, tile_slice_no_margins)
+                else:
+                    image_tile = Backend.to_backend(image_tile, dtype=internal_dtype)
+                    remove_margin_slice_tuple = remove_margin_slice(shape, tile_slice, tile_slice_no_margins)
+                    result[tile_slice_no_margins] = image_tile[remove_margin_slice_tuple]
+
+            if pending_store is not None:
+                pending_store.result()
+
+        except Exception:
+            next_tile.cancel()
+            raise
+
+
 # Dask turned out not too work great here, HUGE overhead compared to the light approach above.
 # def scatter_gather_dask(backend: Backend,
 #                         function,
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import dask
+import numpy as np
+import pytest
+from dask.distributed import Client, LocalCluster, get_worker
+
+from dexp.datasets import ZDataset
+from dexp.utils.dask import DaskExecutor
+from dexp.utils.testing.testing import local_cluster_only
+
+
+@dask.delayed
+def _process(time_point: int, in_path: str, out_dataset: ZDataset, channel: str) -> str:
+    stack = np.asarray(ZDataset(in_path, mode="r")[channel][time_point])
+    out_dataset.write_stack(channel, time_point, stack * 2)
+    return get_worker().address
+
+
+@local_cluster_only
+def test_dask_executor_scheduler_file(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 1000, size=(6, 4, 8, 8)).astype(np.uint16)
+
+    in_path = str(tmp_path / "in.zarr")
+    in_dataset = ZDataset(in_path, mode="w")
+    for channel in ("first", "second"):
+        in_dataset.add_channel(channel, shape=array.shape, dtype=array.dtype)
+        in_dataset.write_array(channel, array)
+    in_dataset.close()
+
+    out_dataset = ZDataset(tmp_path / "out.zarr", mode="w")
+    tasks = {}
+    for channel in ("first", "second"):
+        out_dataset.add_channel(channel, shape=array.shape, dtype=array.dtype)
+        for t in range(len(array)):
+            tasks[(channel, t)] = _process(t, in_path, out_dataset, channel)
+
+    # multi-process scheduler, as a remote one, that tasks are sent to through a scheduler file:
+    scheduler_file = str(tmp_path / "scheduler.json")
+    with LocalCluster(n_workers=2, threads_per_worker=1, processes=True, dashboard_address=None) as cluster:
+        with Client(cluster) as client:
+            client.write_scheduler_file(scheduler_file)
+
+            with DaskExecutor(scheduler_file) as executor:
+                assert len(executor.workers()) == 2
+                workers = executor.compute(tasks)
+
+            # remote clusters are not shut down by the executor:
+            assert len(client.scheduler_info()["workers"]) == 2
+
+    out_dataset.close()
+
+    # each worker is preferably given contiguous time points:
+    assert list(workers) == sorted(tasks)
+    assert len(set(workers.values())) == 2
+
+    out_dataset = ZDataset(tmp_path / "out.zarr", mode="r")
+    for channel in ("first", "second"):
+        np.testing.assert_array_equal(np.asarray(out_dataset.get_array(channel)), array * 2)
+
+
+def test_dask_executor_threads(tmp_path: Path):
+    array = np.random.default_rng(0).integers(0, 1000, size=(6, 4, 8, 8)).astype(np.uint16)
+
+    in_dataset = ZDataset(tmp_path / "in.zarr", mode="w")
+    in_dataset.add_channel("channel", shape=array.shape, dtype=array.dtype)
+    in_dataset.write_array("channel", array)
+    in_dataset.set_prefetch(2)
+
+    out_dataset = ZDataset(tmp_path / "out.zarr", mode="w", write_behind=2, lazy_projections=True)
+    out_dataset.add_channel("channel", shape=array.shape, dtype=array.dtype)
+
+    stacks = in_dataset["channel"]
+
+    @dask.delayed
+    def _double(time_point: int) -> None:
+        out_dataset.write_stack("channel", time_point, np.asarray(stacks[time_point]) * 2)
+
+    # worker processes would ignore the prefetching, write-behind and lazy projections:
+    with pytest.warns(UserWarning, match="lazy_projections, prefetch, write_behind"):
+        DaskExecutor("cpu:2").check_datasets(in_dataset, out_dataset)
+
+    # threads of the current process use the datasets as is:
+    with DaskExecutor("threads:2") as executor:
+        assert not executor.uses_processes
+        executor.check_datasets(in_dataset, out_dataset)
+        executor.compute({("channel", t): _double(t) for t in range(len(array))})
+
+    out_dataset.close()
+    out_dataset = ZDataset(tmp_path / "out.zarr", mode="r")
+    np.testing.assert_array_equal(np.asarray(out_dataset.get_array("channel")), array * 2)
+    np.testing.assert_array_equal(
+        np.asarray(out_dataset.get_projection_array("channel", axis=0)), (array * 2).max(axis=1)
+    )
@@ -0,0 +1,68 @@
+import errno
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from dexp.utils import parallel_copy as pc
+
+
+def _make_tree(path: Path) -> None:
+    rng = np.random.default_rng(0)
+    (path / "stacks" / "C0L0").mkdir(parents=True)
+    (path / "empty_folder").mkdir()
+    (path / "C0L0.index.txt").write_text("0\t0.0\t48, 32, 8\n")
+    (path / "empty_file").write_bytes(b"")
+    for i in range(5):
+        (path / "stacks" / "C0L0" / f"{i:06}.raw").write_bytes(rng.bytes(int(rng.integers(1, 100_000))))
+
+
+def _assert_same_tree(source: Path, dest: Path) -> None:
+    for root, dirs, files in os.walk(source):
+        dest_root = dest / Path(root).relative_to(source)
+        assert dest_root.is_dir()
+        for file in files:
+            assert (Path(root) / file).read_bytes() == (dest_root / file).read_bytes()
+    assert not list(dest.rglob("*" + pc.PARTIAL_SUFFIX))
+
+
+@pytest.mark.parametrize("unsupported", [None, "copy_file_range", "sendfile"])
+def test_parallel_copy(tmp_path: Path, monkeypatch, unsupported: str):
+    if unsupported is not None and hasattr(os, unsupported):
+
+        def _unsupported(*args, **kwargs):
+            raise OSError(errno.EXDEV, "Unsupported")
+
+        monkeypatch.setattr(os, unsupported, _unsupported)
+        if unsupported == "sendfile" and hasattr(os, "copy_file_range"):
+            monkeypatch.setattr(os, "copy_file_range", _unsupported)
+
+    source, dest = tmp_path / "source", tmp_path / "dest"
+    _make_tree(source)
+
+    # small chunks so that files are copied in several ranges
+    nb_files, nb_bytes = pc.parallel_copy(str(source), str(dest), nb_threads=3, chunk_size=10_000)
+    assert nb_files == 7
+    assert nb_bytes == sum(file.stat().st_size for file in source.rglob("*") if file.is_file())
+    _assert_same_tree(source, dest)
+
+
+def test_parallel_copy_resume(tmp_path: Path):
+    source, dest = tmp_path / "source", tmp_path / "dest"
+    _make_tree(source)
+
+    pc.parallel_copy(str(source), str(dest), nb_threads=2)
+    assert pc.parallel_copy(str(source), str(dest), nb_threads=2) == (0, 0)
+
+    # modified files and interrupted copies are copied again
+    modified = source / "stacks" / "C0L0" / "000001.raw"
+    modified.write_bytes(b"modified")
+    (dest / "C0L0.index.txt").unlink()
+    (dest / ("C0L0.index.txt" + pc.PARTIAL_SUFFIX)).write_bytes(b"0\t0")
+
+    nb_files, nb_bytes = pc.parallel_copy(str(source), str(dest), nb_threads=2)
+    assert nb_files == 2
+    _assert_same_tree(source, dest)
+
+    assert pc.parallel_copy(str(source), str(dest), nb_threads=2, resume=False)[0] == 7
@@ -4,7 +4,7 @@ import math
 import os
 import threading
 import types
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 import numpy
 from arbol import aprint
@@ -68,7 +68,14 @@ class CupyBackend(Backend):
         except:  # noqa: E722
             return []
 
-    device_locks = tuple(threading.Lock() for _ in range(num_devices.__func__()))
+    # Locks of the devices used exclusively, created on first use so that importing this module does not probe the GPUs:
+    _device_locks: Dict[int, threading.Lock] = {}
+    _device_locks_lock = threading.Lock()
+
+    @staticmethod
+    def device_lock(device_id: int) -> threading.Lock:
+        with CupyBackend._device_locks_lock:
+            return CupyBackend._device_locks.setdefault(device_id, threading.Lock())
 
     def __init__(
         self,
@@ -161,7 +168,7 @@ class CupyBackend(Backend):
 
         # lock device:
         if self.exclusive:
-            CupyBackend.device_locks[self.device_id].acquire(blocking=True)
+            CupyBackend.device_lock(self.device_id).acquire(blocking=True)
 
         # setup device:
         self.cupy_device.__enter__()
@@ -194,7 +201,7 @@ class CupyBackend(Backend):
 
         # unlock device:
         if self.exclusive:
-            CupyBackend.device_locks[self.device_id].release()
+            CupyBackend.device_lock(self.device_id).release()
 
     def synchronise(self):
         self.cupy_device.synchronize()
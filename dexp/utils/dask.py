@@ -1,16 +1,201 @@
-from typing import Sequence, Union
+import os
+import warnings
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Union
 
-from dask.distributed import Client
-from dask_cuda import LocalCUDACluster
+import dask
+from arbol import aprint
+from dask.delayed import Delayed
+from dask.distributed import Client, WorkerPlugin
+
+from dexp.processing.utils.mkl_util import set_mkl_threads
+from dexp.utils.backends import Backend, BestBackend, NumpyBackend
+from dexp.utils.backends.cupy_backend import is_cupy_available
+
+# Device specification of a local pool of CPU worker processes, optionally followed by ':' and the number of workers:
+CPU_DEVICES = "cpu"
+
+# Device specification of in-process execution by a pool of threads, optionally followed by ':' and the number of
+# threads. Datasets are then not copied to worker processes, their process-local options (prefetching, ...) apply:
+THREAD_DEVICES = "threads"
+
+# Set in the worker processes of local CPU clusters, their tasks run with the numpy backend:
+_cpu_worker = False
+
+
+def is_scheduler_file(devices: Union[str, Sequence[int]]) -> bool:
+    return isinstance(devices, str) and not is_cpu_devices(devices) and not is_thread_devices(devices)
+
+
+def is_cpu_devices(devices: Union[str, Sequence[int]]) -> bool:
+    return isinstance(devices, str) and devices.split(":")[0].strip().lower() == CPU_DEVICES
+
+
+def is_thread_devices(devices: Union[str, Sequence[int]]) -> bool:
+    return isinstance(devices, str) and devices.split(":")[0].strip().lower() == THREAD_DEVICES
+
+
+def _num_workers(devices: str) -> int:
+    _, _, num_workers = devices.partition(":")
+    num_workers = int(num_workers) if num_workers.strip() else os.cpu_count()
+    if num_workers < 0:
+        num_workers = os.cpu_count() // -num_workers
+    return max(1, num_workers)
+
+
+class _CPUWorkerSetup(WorkerPlugin):
+    name = "dexp-cpu-worker"
+
+    def __init__(self, num_threads: int):
+        self.num_threads = num_threads
+
+    def setup(self, worker) -> None:
+        global _cpu_worker
+        _cpu_worker = True
+        set_mkl_threads(self.num_threads)
+
+
+def worker_backend(*args, **kwargs) -> Backend:
+    """
+    Returns the backend of the tasks of dataset operations: the numpy backend in the workers of local CPU clusters,
+    the best available backend otherwise (cupy on GPU workers).
+    """
+    if _cpu_worker:
+        return NumpyBackend(*args, **kwargs)
+    return BestBackend(*args, **kwargs)
 
 
 def get_dask_client(scheduler_file_or_devices: Union[str, Sequence[int]]) -> Client:
 
-    if isinstance(scheduler_file_or_devices, str):
+    if is_cpu_devices(scheduler_file_or_devices):
+        from dask.distributed import LocalCluster
+
+        # each worker processes one time point at a time, with an equal share of the cores for its numerical libraries:
+        num_workers = _num_workers(scheduler_file_or_devices)
+        num_threads = max(1, os.cpu_count() // num_workers)
+        threads_env = {
+            name: str(num_threads)
+            for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+        }
+        cluster = LocalCluster(n_workers=num_workers, threads_per_worker=1, processes=True, env=threads_env)
+        client = Client(cluster)
+        client.register_worker_plugin(_CPUWorkerSetup(num_threads))
+        aprint(f"Local CPU cluster of {num_workers} workers with {num_threads} threads each")
+
+    elif isinstance(scheduler_file_or_devices, str):
         client = Client(scheduler_file=scheduler_file_or_devices)
 
     else:
+        from dask_cuda import LocalCUDACluster
+
         cluster = LocalCUDACluster(CUDA_VISIBLE_DEVICES=scheduler_file_or_devices)
         client = Client(cluster)
 
     return client
+
+
+class DaskExecutor:
+    def __init__(self, devices: Union[str, Sequence[int]] = CPU_DEVICES):
+        """
+        Executes the tasks of dataset operations on a dask cluster, to be used as a context manager.
+
+        Tasks are indexed by (channel, time point), each worker is given a contiguous range of time points
+        of a channel, so consecutive stacks (and the chunks they share) are read and written by the same worker
+        and node. Idle workers may still steal tasks.
+
+        Parameters
+        ----------
+        devices : where tasks are executed:
+            a sequence of CUDA device ids for a local cluster with one worker process per GPU,
+            'cpu' or 'cpu:N' for a local cluster of N worker processes (one per core by default,
+            negative numbers n mean number_of_cores / |n|), each processing one task at a time with the numpy backend
+            and number_of_cores / N threads, 'threads' or 'threads:N' for N threads of the current process
+            with the best available backend, or the path of a dask scheduler file to connect to a running,
+            possibly multi-node, cluster. Without GPUs, or when no device is given, tasks run on a local CPU cluster.
+            Only with threads are the tasks' datasets used as is, other executors send copies to worker processes.
+        """
+        if not isinstance(devices, str) and (len(devices) == 0 or not is_cupy_available()):
+            aprint("No CUDA device available, running on CPU workers")
+            devices = CPU_DEVICES
+
+        self.devices = devices
+        self.client: Optional[Client] = None
+
+    @property
+    def uses_processes(self) -> bool:
+        """True when tasks run in worker processes, on copies of their arguments."""
+        return not is_thread_devices(self.devices)
+
+    def check_datasets(self, *datasets) -> None:
+        """Warns about the options of the given datasets that worker processes ignore (see
+        `BaseDataset.process_local_options`), they only apply when running with threads."""
+        if not self.uses_processes:
+            return
+        options = sorted({option for dataset in datasets for option in dataset.process_local_options()})
+        if len(options) > 0:
+            warnings.warn(
+                f"Options {', '.join(options)} are ignored by the worker processes of devices '{self.devices}', "
+                + f"use '{THREAD_DEVICES}' devices to run in the current process instead."
+            )
+
+    def __enter__(self) -> "DaskExecutor":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self.client is None and self.uses_processes:
+            self.client = get_dask_client(self.devices)
+            aprint("Dask client", self.client)
+
+    def close(self) -> None:
+        if self.client is None:
+            return
+        cluster = self.client.cluster
+        self.client.close()
+        # remote clusters are left running, only the local ones are shut down:
+        if cluster is not None and not is_scheduler_file(self.devices):
+            cluster.close()
+        self.client = None
+
+    def workers(self) -> List[str]:
+        """Returns the addresses of the workers of the cluster, none when running with threads."""
+        if not self.uses_processes:
+            return []
+        self.start()
+        return sorted(self.client.scheduler_info()["workers"])
+
+    def compute(self, tasks: Dict[Hashable, Delayed]) -> Dict[Hashable, Any]:
+        """
+        Computes tasks on the cluster.
+
+        Parameters
+        ----------
+        tasks : delayed tasks indexed by (channel, time point), or any sortable key whose order gives data locality.
+
+        Returns
+        -------
+        Results of the tasks, with the same keys.
+        """
+        if len(tasks) == 0:
+            return {}
+
+        keys = sorted(tasks)
+        if not self.uses_processes:
+            num_threads = _num_workers(self.devices)
+            aprint(f"Computing {len(keys)} tasks on {num_threads} threads")
+            results = dask.compute(*(tasks[key] for key in keys), scheduler="threads", num_workers=num_threads)
+            return dict(zip(keys, results))
+
+        workers = self.workers()
+        # contiguous blocks of tasks, one per worker:
+        block_size = -(-len(keys) // max(1, len(workers)))
+
+        futures = []
+        for i, key in enumerate(keys):
+            worker = [workers[i // block_size]] if workers else None
+            futures.append(self.client.compute(tasks[key], workers=worker, allow_other_workers=True))
+
+        aprint(f"Computing {len(keys)} tasks on {len(workers)} workers")
+        return dict(zip(keys, self.client.gather(futures)))
@@ -0,0 +1,227 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from os.path import dirname, isfile, join, relpath
+from typing import List, Tuple
+
+from arbol import aprint, asection
+
+# Suffix of files being copied, they are renamed once complete so partial files are never mistaken for complete ones
+PARTIAL_SUFFIX = ".dexp_partial"
+
+# Errors raised by 'copy_file_range' and 'sendfile' when the file systems do not support them:
+_UNSUPPORTED_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTSUP, errno.EBADF)
+
+# Block size used when copying through user space:
+_BLOCK_SIZE = 2**24
+
+
+def _copy_range_copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    copied = 0
+    while copied < count:
+        n = os.copy_file_range(src_fd, dst_fd, count - copied, offset + copied, offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _copy_range_sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    copied = 0
+    while copied < count:
+        n = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _copy_range_pread(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    copied = 0
+    while copied < count:
+        data = os.pread(src_fd, min(_BLOCK_SIZE, count - copied), offset + copied)
+        if len(data) == 0:
+            break
+        os.pwrite(dst_fd, data, offset + copied)
+        copied += len(data)
+    return copied
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """
+    Copies a byte range between two file descriptors, at the same offset in both files.
+    Uses 'copy_file_range' (in-kernel, reflinks or server-side copies on supporting file systems) when available,
+    otherwise 'sendfile', otherwise reads and writes through user space.
+
+    Parameters
+    ----------
+    src_fd: source file descriptor
+    dst_fd: destination file descriptor
+    offset: offset of the range in both files
+    count: number of bytes to copy
+
+    Returns
+    -------
+    Number of bytes copied, less than count only if the source file is shorter.
+
+    """
+    for method in (_copy_range_copy_file_range, _copy_range_sendfile):
+        if method is _copy_range_copy_file_range and not hasattr(os, "copy_file_range"):
+            continue
+        if method is _copy_range_sendfile and not hasattr(os, "sendfile"):
+            continue
+        try:
+            return method(src_fd, dst_fd, offset, count)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    return _copy_range_pread(src_fd, dst_fd, offset, count)
+
+
+def _list_files(source_path: str, dest_path: str) -> List[Tuple[str, str, int]]:
+    if isfile(source_path):
+        os.makedirs(dirname(dest_path) or ".", exist_ok=True)
+        return [(source_path, dest_path, os.path.getsize(source_path))]
+
+    files = []
+    for root, dirs, file_names in os.walk(source_path):
+        dest_root = join(dest_path, relpath(root, source_path))
+        os.makedirs(dest_root, exist_ok=True)
+        for file_name in file_names:
+            if file_name.endswith(PARTIAL_SUFFIX):
+                continue
+            src = join(root, file_name)
+            files.append((src, join(dest_root, file_name), os.path.getsize(src)))
+    return files
+
+
+def _is_complete(src: str, dst: str) -> bool:
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+class _FileCopy:
+    def __init__(self, src: str, dst: str, size: int, nb_ranges: int):
+        self.src = src
+        self.dst = dst
+        self.size = size
+        self.nb_ranges = nb_ranges
+        self.remaining = nb_ranges
+        self.lock = threading.Lock()
+
+    @property
+    def partial(self) -> str:
+        return self.dst + PARTIAL_SUFFIX
+
+    def allocate(self) -> None:
+        # the partial file of files copied in several ranges is allocated upfront, ranges are then written in any order:
+        with open(self.partial, "wb") as partial_file:
+            partial_file.truncate(self.size)
+
+    def copy(self, offset: int, count: int) -> int:
+        mode = "r+b" if self.nb_ranges > 1 else "wb"
+        with open(self.src, "rb") as src_file, open(self.partial, mode) as dst_file:
+            copied = copy_range(src_file.fileno(), dst_file.fileno(), offset, count)
+        if copied != count:
+            raise IOError(f"File '{self.src}' was truncated during copy, copied {copied} bytes instead of {count}.")
+
+        with self.lock:
+            self.remaining -= 1
+            complete = self.remaining == 0
+
+        if complete:
+            # timestamps are what tells a complete copy when resuming:
+            shutil.copystat(self.src, self.partial)
+            os.replace(self.partial, self.dst)
+
+        return copied
+
+
+def parallel_copy(
+    source_path: str,
+    dest_path: str,
+    nb_threads: int = 8,
+    chunk_size: int = 2**28,
+    resume: bool = True,
+    report_interval: float = 5.0,
+) -> Tuple[int, int]:
+    """
+    Copies a file or folder tree (e.g. a zarr or ClearControl dataset) with a pool of threads.
+    Files are copied concurrently, files larger than 'chunk_size' are split into ranges copied concurrently.
+    Files are first written with a temporary suffix and renamed once complete.
+
+    Parameters
+    ----------
+    source_path: source file or folder.
+    dest_path: destination file or folder.
+    nb_threads: number of threads copying files.
+    chunk_size: size in bytes of the ranges large files are split into.
+    resume: if True, destination files with the same size and modification time as the source are not copied again.
+    report_interval: interval in seconds between throughput reports.
+
+    Returns
+    -------
+    Number of files copied and number of bytes copied.
+
+    """
+    with asection(f"Copying from {source_path} to {dest_path} with {nb_threads} threads."):
+        files = _list_files(source_path, dest_path)
+
+        if resume:
+            to_copy = [(src, dst, size) for src, dst, size in files if not _is_complete(src, dst)]
+            if len(to_copy) < len(files):
+                aprint(f"Resuming: skipping {len(files) - len(to_copy)} files already copied.")
+        else:
+            to_copy = files
+
+        total_bytes = sum(size for _, _, size in to_copy)
+        aprint(f"Copying {len(to_copy)} files, {total_bytes / 1e9:.3f} GB.")
+
+        # largest files first, so that they do not end up copied alone at the end:
+        to_copy.sort(key=lambda file: file[2], reverse=True)
+
+        copied_bytes = 0
+        copied_lock = threading.Lock()
+
+        def _copy(file_copy: _FileCopy, offset: int, count: int) -> None:
+            nonlocal copied_bytes
+            copied = file_copy.copy(offset, count)
+            with copied_lock:
+                copied_bytes += copied
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, nb_threads), thread_name_prefix="copy") as executor:
+            futures = []
+            for src, dst, size in to_copy:
+                offsets = list(range(0, size, chunk_size)) or [0]
+                file_copy = _FileCopy(src, dst, size, len(offsets))
+                if len(offsets) > 1:
+                    file_copy.allocate()
+
+                for offset in offsets:
+                    futures.append(executor.submit(_copy, file_copy, offset, min(chunk_size, size - offset)))
+
+            not_done = futures
+            while len(not_done) > 0:
+                done, not_done = wait(not_done, timeout=report_interval, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    if future.exception() is not None:
+                        for pending in not_done:
+                            pending.cancel()
+                        raise future.exception()
+
+                throughput = copied_bytes / 1e6 / max(time.monotonic() - start, 1e-6)
+                aprint(
+                    f"Copied {copied_bytes / 1e9:.3f} / {total_bytes / 1e9:.3f} GB "
+                    + f"({100 * copied_bytes / max(1, total_bytes):.1f}%) at {throughput:.1f} MB/s"
+                )
+
+        return len(to_copy), copied_bytes
@@ -1,6 +1,10 @@
 import pytest
 
-from dexp.utils.testing.testing import cupy_only, execute_both_backends
+from dexp.utils.testing.testing import (
+    cupy_only,
+    execute_both_backends,
+    local_cluster_only,
+)
 
 
 def test_as_demo(file: str) -> None:
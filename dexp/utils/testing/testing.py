@@ -1,5 +1,5 @@
 import inspect
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Callable
 
 import pytest
@@ -56,3 +56,27 @@ def cupy_only(func: Callable) -> Callable:
         return func(*args, **kwargs)
 
     return _func
+
+
+@lru_cache(maxsize=1)
+def is_local_cluster_available() -> bool:
+    """Checks once whether a multi-process dask `LocalCluster` can be started on this host."""
+    from dask.distributed import LocalCluster
+
+    try:
+        with LocalCluster(n_workers=1, threads_per_worker=1, processes=True, dashboard_address=None):
+            return True
+    except Exception:
+        return False
+
+
+def local_cluster_only(func: Callable) -> Callable:
+    """Helper function to skip test function if a multi-process dask cluster cannot be started."""
+
+    @wraps(func)
+    def _func(*args, **kwargs):
+        if not is_local_cluster_available():
+            pytest.skip(f"Local dask cluster cannot be started. Skipping {func.__name__} test.")
+        return func(*args, **kwargs)
+
+    return _func
@@ -44,7 +44,6 @@ REQUIRED = [
     "dask-cuda",
     "distributed",
     "zarr",
-    "cachey",
     "gputil",
     "gpustat",
     "arbol",